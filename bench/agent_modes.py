@@ -0,0 +1,69 @@
+"""
+Compara los modos del agente (AGENT_MODE=code vs tools) con el mismo tráfico.
+
+Corre bench/e2e.py una vez por modo con el modelo guionado y reporta, por
+mensaje que llegó al agente (los que no resolvió el fast path): llamadas al
+LLM, tokens de entrada y de salida, y la latencia de punta a punta de esos
+mensajes. La caché de planes se desactiva para que cada mensaje llegue al LLM
+(--plan-cache la deja activa). Sale con código 1 si algún modo no llegó a
+llamar al modelo (la comparación no valdría nada) o si la corrida de e2e de
+ese modo falla (mensajes sin respuesta, errores o respuestas de respaldo).
+
+Uso:
+    python -m bench.agent_modes --rate 10 --duration 10 --llm-latency-ms 800
+"""
+import asyncio
+import json
+import os
+import sys
+from . import e2e
+
+MODES = ("code", "tools")
+
+def summarize_mode(result: dict) -> dict:
+    llm = result["dependencies"]["llm"]
+    agent_messages = result["app_stats"]["fastpath"]["misses"]
+    per_msg = lambda value: round(value / agent_messages, 2) if agent_messages else 0.0
+    latency = result["stages"]["end_to_end[agent]"]
+    return {
+        "agent_messages": agent_messages,
+        "llm_calls_per_msg": per_msg(llm["calls"]),
+        "input_tokens_per_msg": per_msg(llm["input_tokens"]),
+        "output_tokens_per_msg": per_msg(llm["output_tokens"]),
+        "p50_ms": latency["p50_ms"],
+        "p95_ms": latency["p95_ms"],
+    }
+
+def print_summary(summary: dict):
+    print(f"{'modo':>6} {'msgs':>6} {'LLM/msg':>8} {'tok in/msg':>11} {'tok out/msg':>12} {'p50':>8} {'p95':>8}")
+    for mode, s in summary.items():
+        print(f"{mode:>6} {s['agent_messages']:>6} {s['llm_calls_per_msg']:>8.2f} {s['input_tokens_per_msg']:>11.1f} "
+              f"{s['output_tokens_per_msg']:>12.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f}")
+
+def main():
+    parser = e2e.build_parser("Compara AGENT_MODE=code y AGENT_MODE=tools")
+    parser.add_argument("--plan-cache", action="store_true", help="no desactivar la caché de planes")
+    args = parser.parse_args()
+    if not args.plan_cache:
+        os.environ["PLAN_CACHE_ENABLED"] = "0"
+
+    summary = {}
+    reasons = []
+    for mode in MODES:
+        args.agent_mode = mode
+        result = asyncio.run(e2e.run(args))
+        summary[mode] = summarize_mode(result)
+        if summary[mode]["agent_messages"] and not result["dependencies"]["llm"]["calls"]:
+            reasons.append(f"{mode}: ninguna llamada al modelo con {summary[mode]['agent_messages']} mensajes al agente")
+        reasons.extend(f"{mode}: {reason}" for reason in e2e.failures(result, args))
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+    for reason in reasons:
+        print(f"FALLA: {reason}", file=sys.stderr)
+    sys.exit(1 if reasons else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+`src.app` con el modelo guionado en lugar del LLM real (la usa bench/e2e.py).
+El modo del agente sale de AGENT_MODE, como en la app real.
+
+    BENCH_LLM_LATENCY_MS=800 AGENT_MODE=tools uvicorn bench.bench_app:app --port 8000
+"""
+import os
+import httpx
+from src import app as app_module
+from src.agent import build_agent
+from src.agent_pool import AgentPool
+from src.config import AGENT_MODE, AGENT_POOL_SIZE
+from .fake_model import ScriptedModel
+
+model = ScriptedModel(latency_s=float(os.getenv("BENCH_LLM_LATENCY_MS", "0")) / 1000)
+if AGENT_MODE == "tools":
+    llm_client = httpx.AsyncClient(transport=model.transport())
+    factory = lambda: build_agent(mode="tools", client=llm_client)
+else:
+    factory = lambda: build_agent(llm=model)
+app_module._agent_pool = AgentPool(factory, size=AGENT_POOL_SIZE)
+app = app_module.app
+
+@app.get("/_bench/model")
+async def model_stats():
+    return model.stats()
@@ -0,0 +1,85 @@
+"""
+Benchmark de arranque en frío del entry point de Vercel (`api/index.py`).
+
+Cada corrida lanza un intérprete nuevo que mide:
+- import_ms: tiempo de `import api.index`
+- first_request_ms: primera invocación del handler (GET de verificación del webhook)
+- second_request_ms: segunda invocación (ya en caliente)
+- y qué módulos pesados quedaron cargados (smolagents no debería aparecer)
+
+Uso:
+    python -m bench.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["smolagents", "litellm", "openai", "transformers", "torch", "websockets"]
+
+# Script que corre en el intérprete nuevo; imprime una línea JSON con los tiempos
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import api.index as index
+t1 = time.perf_counter()
+
+def invoke():
+    event = {
+        "resource": "/webhook",
+        "httpMethod": "GET",
+        "path": "/webhook",
+        "headers": {"host": "localhost"},
+        "multiValueHeaders": {},
+        "queryStringParameters": {"mode": "subscribe", "token": "bench", "challenge": "ping"},
+        "multiValueQueryStringParameters": None,
+        "requestContext": {"resourcePath": "/webhook", "httpMethod": "GET", "identity": {"sourceIp": "127.0.0.1"}},
+        "body": None,
+        "isBase64Encoded": False,
+    }
+    start = time.perf_counter()
+    response = index.handler(event, None)
+    return (time.perf_counter() - start) * 1000, response
+
+first_ms, response = invoke()
+second_ms, _ = invoke()
+heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_request_ms": first_ms,
+    "second_request_ms": second_ms,
+    "status": response.get("statusCode"),
+    "heavy_modules_loaded": heavy,
+}))
+"""
+
+def run_once() -> dict:
+    env = dict(os.environ)
+    env["WA_VERIFY_TOKEN"] = "bench"
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + _CHILD
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"El intérprete de prueba falló:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío de api/index.py")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    for key in ("import_ms", "first_request_ms", "second_request_ms"):
+        values = [r[key] for r in results]
+        print(f"{key:>18}: mediana {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+    print(f"{'status':>18}: {sorted({r['status'] for r in results})}")
+    print(f"{'módulos pesados':>18}: {results[-1]['heavy_modules_loaded'] or 'ninguno'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Frases de usuario para los benchmarks, en español rioplatense.
+
+PHRASES mezcla comandos que resuelve el fast path con pedidos que necesitan
+al agente; LLM_PLANS es lo que el modelo guionado (fake_model.py) "decide"
+para estos últimos: frase → (herramienta, argumentos), o None si pide aclaración.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+# Comandos simples (fast path)
+FASTPATH_PHRASES = [
+    "prendé el living",
+    "apagá la cocina",
+    "prendé la pieza al 40%",
+    "poné el living en azul",
+    "subí la cocina al 80",
+    "¿está prendida la cocina?",
+    "apagá todo",
+    "modo cine",
+    "prendé el living y la cocina",
+    "apagá la luz del dormitorio",
+]
+
+# Pedidos que el parser no entiende y van al agente
+LLM_PLANS: Dict[str, Optional[Tuple[str, Dict[str, Any]]]] = {
+    "está muy oscuro acá en el living": ("turn_on_lights", {"area": "living", "brightness": 80}),
+    "me voy a dormir, dejá solo la pieza tenue": ("activate_scene", {"scene": "noche"}),
+    "ponele una luz linda a la cocina para cenar": ("turn_on_lights", {"area": "cocina", "brightness": 60, "color": "cálida"}),
+    "quedó alguna luz prendida en el living?": ("get_light_state", {"area": "living"}),
+    "bajá un poco la intensidad del cuarto": ("set_brightness", {"area": "dormitorio", "brightness": 30}),
+    "hola, qué podés hacer?": None,
+}
+
+PHRASES = FASTPATH_PHRASES + list(LLM_PLANS)
@@ -0,0 +1,302 @@
+"""
+Benchmark de punta a punta del webhook (`POST /webhook` de src/app.py), sin red.
+
+Levanta en este proceso un Home Assistant falso (fake_ha.py) y un sink de
+Graph API (fake_graph.py), arranca la app en un subproceso uvicorn con el
+modelo guionado (bench_app.py) apuntando a ellos, y le manda webhooks
+realistas a tasa fija (loadgen.py). Cada respuesta que llega al sink se
+empareja con el mensaje más antiguo sin responder de ese teléfono.
+
+Reporta p50/p95/p99/media y mensajes/s por etapa:
+- webhook_ack: hasta que el webhook responde 200
+- end_to_end: hasta que la respuesta llega a Graph API (total y por ruta:
+  fast path, agente, mensajes que no son texto)
+y el trabajo hecho contra cada dependencia (llamadas a HA, envíos, llamadas
+al LLM y tokens), más /stats de la app. Las respuestas se clasifican (ok,
+error, respaldo, descarte por admisión): un mensaje respondido con "Error ..."
+o con la respuesta de respaldo no cuenta como bien respondido.
+
+Uso:
+    python -m bench.e2e --rate 20 --duration 10 --ha-latency-ms 80 --llm-latency-ms 800
+    python -m bench.e2e --ack-first --json > result.json
+    python -m bench.e2e --max-p95-ms 1500   # sale con código 1 si hay regresión (CI)
+    python -m bench.e2e --max-error-replies 2 --max-fallback-replies 5
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List
+import httpx
+import uvicorn
+from src.admission import OVERLOADED_REPLY, RATE_LIMITED_REPLY
+from src.deadline import DEADLINE_REPLY
+from src.fastpath import parse_command
+from src.tool_agent import FALLBACK_REPLY
+from . import fake_graph, fake_ha
+from .loadgen import OutboundMessage, make_messages, run_open_loop
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values: List[float], p: float) -> float:
+    """Percentil por rango más cercano."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def summarize(values_s: List[float], elapsed_s: float) -> dict:
+    ms = [v * 1000 for v in values_s]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "mean_ms": round(statistics.fmean(ms), 1) if ms else 0.0,
+        "msgs_per_s": round(len(ms) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+    }
+
+# Respuestas de error: de las herramientas ("Error encendiendo...") o de la app
+ERROR_PREFIXES = ("Error", "Ocurrió un error", "Argumentos inválidos", "Herramienta desconocida")
+FALLBACK_REPLIES = {DEADLINE_REPLY, FALLBACK_REPLY}
+SHED_REPLIES = {OVERLOADED_REPLY, RATE_LIMITED_REPLY}
+REPLY_KINDS = ("ok", "error", "fallback", "shed")
+
+def reply_kind(body: str) -> str:
+    """ok, error (alguna línea es un error), fallback (plazo vencido, no entendió) o shed (admisión)."""
+    if body in FALLBACK_REPLIES:
+        return "fallback"
+    if body in SHED_REPLIES:
+        return "shed"
+    if any(line.startswith(ERROR_PREFIXES) for line in body.splitlines()):
+        return "error"
+    return "ok"
+
+def route_of(message: OutboundMessage) -> str:
+    if message.text is None:
+        return "non_text"
+    return "fastpath" if parse_command(message.text) is not None else "agent"
+
+async def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+async def _wait_ready(client: httpx.AsyncClient, base_url: str, timeout_s: float = 30.0):
+    deadline = time.monotonic() + timeout_s
+    params = {"mode": "subscribe", "token": "bench", "challenge": "ok"}
+    while time.monotonic() < deadline:
+        try:
+            r = await client.get(f"{base_url}/webhook", params=params)
+            if r.status_code == 200:
+                return
+        except httpx.RequestError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("La app bajo prueba no arrancó a tiempo")
+
+def _app_env(args, ha_port: int, graph_port: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "WA_VERIFY_TOKEN": "bench",
+        "WA_ACCESS_TOKEN": "bench",
+        "WA_PHONE_NUMBER_ID": "bench-phone",
+        "WA_API_BASE": f"http://127.0.0.1:{graph_port}/v20.0",
+        "HA_BASE_URL": f"http://127.0.0.1:{ha_port}",
+        "HA_TOKEN": fake_ha.FAKE_TOKEN,
+        "ALLOWED_NUMBERS": "",
+        "WEBHOOK_ACK_FIRST": "1" if args.ack_first else "0",
+        "HA_STATE_MIRROR": "1" if args.mirror else "0",
+        "HA_TRANSPORT": args.ha_transport,
+        "BENCH_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "AGENT_MODE": args.agent_mode,
+        "PROMPT_MODE": args.prompt_mode,
+    })
+    if not args.admission:
+        # Sin límites de admisión: cada mensaje enviado debe tener su respuesta real
+        env.update({"ADMISSION_SENDER_RATE_PER_S": "0", "ADMISSION_MAX_PENDING": "0", "ADMISSION_AGENT_HIGH_WATER": "0"})
+    return env
+
+async def run(args) -> dict:
+    ha = fake_ha.FakeHomeAssistant(latency_s=args.ha_latency_ms / 1000)
+    graph = fake_graph.FakeGraph(latency_s=args.graph_latency_ms / 1000)
+    ha_port, graph_port, app_port = _free_port(), _free_port(), _free_port()
+    servers = [
+        await _serve(fake_ha.create_app(ha), ha_port),
+        await _serve(fake_graph.create_app(graph), graph_port),
+    ]
+    app_url = f"http://127.0.0.1:{app_port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.bench_app:app",
+         "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"],
+        cwd=ROOT, env=_app_env(args, ha_port, graph_port),
+    )
+
+    messages = make_messages(int(args.rate * args.duration), senders=args.senders,
+                             non_text_ratio=args.non_text_ratio, seed=args.seed,
+                             run_id=f"bench{int(time.time())}")
+    routes = {m.index: route_of(m) for m in messages}
+    unanswered: Dict[str, Deque[OutboundMessage]] = defaultdict(deque)
+    replied_at: Dict[int, float] = {}
+    kinds: Dict[int, str] = {}
+    all_replied = asyncio.Event()
+
+    def on_reply(reply: fake_graph.SentMessage):
+        pending = unanswered.get(reply.to)
+        if pending:
+            index = pending.popleft().index
+            replied_at[index] = reply.received_at
+            kinds[index] = reply_kind(reply.body)
+        if len(replied_at) == len(messages):
+            all_replied.set()
+
+    graph.on_message = on_reply
+    try:
+        async with httpx.AsyncClient(timeout=60.0, limits=httpx.Limits(max_connections=200)) as client:
+            await _wait_ready(client, app_url)
+
+            async def post(payload: dict) -> int:
+                for m in payload["entry"][0]["changes"][0]["value"]["messages"]:
+                    unanswered[m["from"]].append(by_id[m["id"]])
+                r = await client.post(f"{app_url}/webhook", json=payload)
+                return r.status_code
+
+            by_id = {m.message_id: m for m in messages}
+            started = time.monotonic()
+            await run_open_loop(messages, args.rate, post, batch=args.batch)
+            try:
+                await asyncio.wait_for(all_replied.wait(), args.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+            finished = max(replied_at.values(), default=time.monotonic())
+            app_stats = (await client.get(f"{app_url}/stats")).json()
+            model_stats = (await client.get(f"{app_url}/_bench/model")).json()
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        for server in servers:
+            server.should_exit = True
+        await asyncio.sleep(0.2)
+
+    elapsed = finished - started
+    stages = {
+        "webhook_ack": summarize([m.acked_at - m.sent_at for m in messages], elapsed),
+        "end_to_end": summarize([replied_at[m.index] - m.sent_at for m in messages if m.index in replied_at], elapsed),
+    }
+    for route in ("fastpath", "agent", "non_text"):
+        values = [replied_at[m.index] - m.sent_at for m in messages
+                  if m.index in replied_at and routes[m.index] == route]
+        stages[f"end_to_end[{route}]"] = summarize(values, elapsed)
+
+    total = len(messages)
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "sent": total,
+        "answered": len(replied_at),
+        "replies": {kind: sum(1 for k in kinds.values() if k == kind) for kind in REPLY_KINDS},
+        "http_errors": sum(1 for m in messages if m.status != 200),
+        "elapsed_s": round(elapsed, 2),
+        "stages": stages,
+        "dependencies": {
+            "ha_calls": dict(ha.calls),
+            "ha_calls_per_msg": round(sum(ha.calls.values()) / total, 3) if total else 0.0,
+            "graph_sends": len(graph.messages),
+            "llm": model_stats,
+            "llm_calls_per_msg": round(model_stats.get("calls", 0) / total, 3) if total else 0.0,
+        },
+        "app_stats": app_stats,
+    }
+
+def print_report(result: dict):
+    replies = result["replies"]
+    print(f"Enviados {result['sent']}, respondidos {result['answered']} (ok {replies['ok']}, "
+          f"error {replies['error']}, respaldo {replies['fallback']}, descartados {replies['shed']}), "
+          f"errores HTTP {result['http_errors']}, {result['elapsed_s']} s")
+    print(f"{'etapa':>22} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'media':>8} {'msg/s':>8}")
+    for name, s in result["stages"].items():
+        print(f"{name:>22} {s['count']:>6} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+              f"{s['p99_ms']:>8.1f} {s['mean_ms']:>8.1f} {s['msgs_per_s']:>8.2f}")
+    deps = result["dependencies"]
+    print(f"HA: {deps['ha_calls_per_msg']} llamadas/msg {deps['ha_calls']}")
+    print(f"LLM: {deps['llm_calls_per_msg']} llamadas/msg {deps['llm']}")
+    print(f"Fast path: {result['app_stats'].get('fastpath')}")
+
+def build_parser(description: str = "Benchmark de punta a punta del webhook") -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--rate", type=float, default=20.0, help="mensajes por segundo")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos de carga")
+    parser.add_argument("--senders", type=int, default=50, help="teléfonos distintos")
+    parser.add_argument("--batch", type=int, default=1, help="mensajes por POST")
+    parser.add_argument("--non-text-ratio", type=float, default=0.02)
+    parser.add_argument("--ha-latency-ms", type=float, default=50.0)
+    parser.add_argument("--graph-latency-ms", type=float, default=100.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--agent-mode", choices=["code", "tools"], default="code", help="AGENT_MODE de la app")
+    parser.add_argument("--prompt-mode", choices=["full", "compact"], default="full", help="PROMPT_MODE de la app")
+    parser.add_argument("--ack-first", action="store_true", help="WEBHOOK_ACK_FIRST=1 en la app")
+    parser.add_argument("--mirror", action="store_true", help="HA_STATE_MIRROR=1 en la app")
+    parser.add_argument("--ha-transport", choices=["rest", "websocket"], default="rest",
+                        help="HA_TRANSPORT de la app (llamadas a servicios por REST o WebSocket)")
+    parser.add_argument("--admission", action="store_true",
+                        help="deja activo el control de admisión de la app (por defecto se desactiva)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="espera máxima de respuestas")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="imprime el resultado como JSON")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="falla (código 1) si el p95 de punta a punta lo supera")
+    parser.add_argument("--max-error-replies", type=int, default=0,
+                        help="falla (código 1) si más respuestas que esto son errores")
+    parser.add_argument("--max-fallback-replies", type=int, default=0,
+                        help="falla (código 1) si más respuestas que esto son de respaldo (plazo vencido, no entendió)")
+    return parser
+
+def failures(result: dict, args) -> List[str]:
+    """Motivos por los que la corrida no pasa (vacío si pasa)."""
+    reasons = []
+    if result["answered"] < result["sent"]:
+        reasons.append(f"{result['sent'] - result['answered']} mensajes sin respuesta")
+    if result["http_errors"]:
+        reasons.append(f"{result['http_errors']} errores HTTP")
+    replies = result["replies"]
+    if replies["error"] > args.max_error_replies:
+        reasons.append(f"{replies['error']} respuestas de error (máximo {args.max_error_replies})")
+    if replies["fallback"] > args.max_fallback_replies:
+        reasons.append(f"{replies['fallback']} respuestas de respaldo (máximo {args.max_fallback_replies})")
+    p95 = result["stages"]["end_to_end"]["p95_ms"]
+    if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+        reasons.append(f"p95 de punta a punta {p95} ms (máximo {args.max_p95_ms})")
+    return reasons
+
+def main():
+    args = build_parser().parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_report(result)
+
+    reasons = failures(result, args)
+    for reason in reasons:
+        print(f"FALLA: {reason}", file=sys.stderr)
+    sys.exit(1 if reasons else 0)
+
+if __name__ == "__main__":
+    main()
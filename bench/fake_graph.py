@@ -0,0 +1,77 @@
+"""
+Sink falso de WhatsApp Cloud API (Graph API) para pruebas y benchmarks.
+
+Acepta POST /{version}/{phone_number_id}/messages como Graph API, guarda cada
+mensaje recibido (destinatario, texto, instante de llegada) y responde con un
+wamid falso tras `latency_ms`. No envía nada a ningún lado.
+
+Uso:
+    python -m bench.fake_graph --port 8124 --latency-ms 120
+    WA_API_BASE=http://127.0.0.1:8124/v20.0 WA_ACCESS_TOKEN=fake WA_PHONE_NUMBER_ID=1 uvicorn src.app:app
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from typing import Callable, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+
+class SentMessage:
+    __slots__ = ("to", "body", "received_at")
+
+    def __init__(self, to: str, body: str, received_at: float):
+        self.to = to
+        self.body = body
+        self.received_at = received_at  # time.monotonic() al llegar el POST
+
+class FakeGraph:
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.messages: List[SentMessage] = []
+        self.on_message: Optional[Callable[[SentMessage], None]] = None
+        self._ids = itertools.count(1)
+
+    async def receive(self, payload: dict) -> dict:
+        received_at = time.monotonic()
+        to = payload.get("to")
+        body = (payload.get("text") or {}).get("body")
+        if payload.get("messaging_product") != "whatsapp" or not to or not body:
+            raise HTTPException(status_code=400, detail="payload inválido")
+        message = SentMessage(to, body, received_at)
+        self.messages.append(message)
+        if self.on_message is not None:
+            self.on_message(message)
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": f"wamid.fake-{next(self._ids)}"}],
+        }
+
+def create_app(fake: Optional[FakeGraph] = None) -> FastAPI:
+    fake = fake or FakeGraph()
+    app = FastAPI(title="Fake Graph API")
+    app.state.fake = fake
+
+    @app.post("/{version}/{phone_number_id}/messages")
+    async def send_message(version: str, phone_number_id: str, req: Request):
+        if not req.headers.get("authorization", "").startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="Falta el token")
+        return await fake.receive(await req.json())
+
+    @app.get("/_fake/messages")
+    async def messages():
+        return [{"to": m.to, "body": m.body} for m in fake.messages]
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Graph API falsa (sink de mensajes)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8124)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia simulada por envío")
+    args = parser.parse_args()
+    uvicorn.run(create_app(FakeGraph(latency_s=args.latency_ms / 1000)), host=args.host, port=args.port)
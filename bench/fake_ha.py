@@ -0,0 +1,227 @@
+"""
+Home Assistant falso para pruebas locales y benchmarks (sin red externa).
+
+Implementa lo que usa el agente:
+- REST: GET /api/states, GET /api/states/{entity_id}, POST /api/services/{domain}/{service}
+- WebSocket: /api/websocket con auth, get_states, subscribe_events, call_service
+  y los registros config/{area,device,entity}_registry/list
+- POST /_fake/drop cierra todas las conexiones WebSocket (para probar reconexión)
+- GET /_fake/stats cantidad de llamadas recibidas por tipo
+
+Cada llamada (REST o comando WebSocket) espera `latency_ms` antes de responder,
+para simular una instancia remota (p. ej. Nabu Casa).
+
+Uso:
+    python -m bench.fake_ha --port 8123 --latency-ms 80
+    HA_BASE_URL=http://127.0.0.1:8123 HA_TOKEN=fake HA_STATE_MIRROR=1 uvicorn src.app:app
+"""
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+import uvicorn
+
+FAKE_TOKEN = "fake"
+
+DEFAULT_LIGHTS = [
+    "light.living_ceiling",
+    "light.living_lamp",
+    "light.bedroom_ceiling",
+    "light.kitchen",
+]
+
+# Registros de áreas/dispositivos/entidades equivalentes al mapeo estático de mapping.py
+DEFAULT_AREAS = [
+    {"area_id": "living", "name": "Living", "aliases": ["Estar"]},
+    {"area_id": "dormitorio", "name": "Dormitorio", "aliases": []},
+    {"area_id": "cocina", "name": "Cocina", "aliases": []},
+]
+DEFAULT_DEVICES = [
+    {"id": "dev_kitchen", "area_id": "cocina"},
+]
+DEFAULT_ENTITIES = [
+    {"entity_id": "light.living_ceiling", "area_id": "living", "device_id": None},
+    {"entity_id": "light.living_lamp", "area_id": "living", "device_id": None},
+    {"entity_id": "light.bedroom_ceiling", "area_id": "dormitorio", "device_id": None},
+    {"entity_id": "light.kitchen", "area_id": None, "device_id": "dev_kitchen"},
+]
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class FakeHomeAssistant:
+    def __init__(self, lights: List[str] = DEFAULT_LIGHTS, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.calls: Counter = Counter()
+        self.states: Dict[str, dict] = {}
+        for entity_id in lights:
+            self._set(entity_id, "off", {})
+        self.registries = {
+            "config/area_registry/list": DEFAULT_AREAS,
+            "config/device_registry/list": DEFAULT_DEVICES,
+            "config/entity_registry/list": DEFAULT_ENTITIES,
+        }
+        self.sockets: Set[WebSocket] = set()
+        self._subscriptions: Dict[WebSocket, List[int]] = {}
+
+    def _set(self, entity_id: str, state: str, attributes: dict) -> dict:
+        ts = _now()
+        new_state = {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": attributes,
+            "last_changed": ts,
+            "last_updated": ts,
+        }
+        self.states[entity_id] = new_state
+        return new_state
+
+    async def delay(self, kind: str):
+        self.calls[kind] += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+    async def call_service(self, domain: str, service: str, data: dict) -> List[dict]:
+        """Aplica light.turn_on/turn_off y devuelve los estados modificados (como HA)."""
+        entity_ids = data.get("entity_id", [])
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        changed = []
+        for entity_id in entity_ids:
+            old_state = self.states.get(entity_id)
+            if old_state is None:
+                continue
+            if service == "turn_off":
+                new_state = self._set(entity_id, "off", {})
+            else:
+                attributes = dict(old_state["attributes"])
+                if "brightness_pct" in data:
+                    attributes["brightness"] = round(int(data["brightness_pct"]) * 255 / 100)
+                for key in ("rgb_color", "color_temp_kelvin"):
+                    if key in data:
+                        attributes[key] = data[key]
+                new_state = self._set(entity_id, "on", attributes)
+            changed.append(new_state)
+            await self._broadcast_state_changed(entity_id, old_state, new_state)
+        return changed
+
+    async def _broadcast_state_changed(self, entity_id: str, old_state: dict, new_state: dict):
+        event = {
+            "event_type": "state_changed",
+            "data": {"entity_id": entity_id, "old_state": old_state, "new_state": new_state},
+            "time_fired": new_state["last_updated"],
+        }
+        for ws, sub_ids in list(self._subscriptions.items()):
+            for sub_id in sub_ids:
+                try:
+                    await ws.send_json({"id": sub_id, "type": "event", "event": event})
+                except Exception:
+                    pass
+
+    async def handle_socket(self, ws: WebSocket):
+        await ws.accept()
+        await ws.send_json({"type": "auth_required", "ha_version": "fake"})
+        auth = await ws.receive_json()
+        if auth.get("access_token") != FAKE_TOKEN:
+            await ws.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+            await ws.close()
+            return
+        await ws.send_json({"type": "auth_ok", "ha_version": "fake"})
+        self.sockets.add(ws)
+        self._subscriptions[ws] = []
+        tasks = set()
+        try:
+            while True:
+                msg = await ws.receive_json()
+                # Cada comando se atiende en su propia tarea: varios pueden estar en vuelo
+                task = asyncio.create_task(self._handle_command(ws, msg))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.sockets.discard(ws)
+            self._subscriptions.pop(ws, None)
+
+    async def _handle_command(self, ws: WebSocket, msg: dict):
+        msg_id = msg.get("id")
+        msg_type = msg.get("type")
+        await self.delay(f"ws:{msg_type}")
+        try:
+            if msg_type == "get_states":
+                await ws.send_json({"id": msg_id, "type": "result", "success": True,
+                                    "result": list(self.states.values())})
+            elif msg_type in self.registries:
+                await ws.send_json({"id": msg_id, "type": "result", "success": True,
+                                    "result": self.registries[msg_type]})
+            elif msg_type == "subscribe_events":
+                self._subscriptions.setdefault(ws, []).append(msg_id)
+                await ws.send_json({"id": msg_id, "type": "result", "success": True, "result": None})
+            elif msg_type == "call_service":
+                data = dict(msg.get("service_data") or {})
+                data.update(msg.get("target") or {})
+                await self.call_service(msg.get("domain"), msg.get("service"), data)
+                await ws.send_json({"id": msg_id, "type": "result", "success": True,
+                                    "result": {"context": {"id": f"fake-{msg_id}"}}})
+            else:
+                await ws.send_json({"id": msg_id, "type": "result", "success": False,
+                                    "error": {"code": "unknown_command", "message": msg_type}})
+        except Exception:
+            pass  # el socket se cerró mientras se respondía
+
+    async def drop_sockets(self):
+        for ws in list(self.sockets):
+            try:
+                await ws.close()
+            except Exception:
+                pass
+
+def create_app(fake: Optional[FakeHomeAssistant] = None) -> FastAPI:
+    fake = fake or FakeHomeAssistant()
+    app = FastAPI(title="Fake Home Assistant")
+    app.state.fake = fake
+
+    @app.get("/api/states")
+    async def all_states():
+        await fake.delay("rest:states")
+        return list(fake.states.values())
+
+    @app.get("/api/states/{entity_id}")
+    async def get_state(entity_id: str):
+        await fake.delay("rest:state")
+        state = fake.states.get(entity_id)
+        if state is None:
+            raise HTTPException(status_code=404, detail="Entity not found.")
+        return state
+
+    @app.post("/api/services/{domain}/{service}")
+    async def call_service(domain: str, service: str, data: dict):
+        await fake.delay("rest:call_service")
+        return await fake.call_service(domain, service, data)
+
+    @app.websocket("/api/websocket")
+    async def websocket(ws: WebSocket):
+        await fake.handle_socket(ws)
+
+    @app.post("/_fake/drop")
+    async def drop():
+        await fake.drop_sockets()
+        return {"dropped": True}
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return dict(fake.calls)
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Home Assistant falso (REST + WebSocket)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia simulada por llamada")
+    args = parser.parse_args()
+    uvicorn.run(create_app(FakeHomeAssistant(latency_s=args.latency_ms / 1000)), host=args.host, port=args.port)
@@ -0,0 +1,173 @@
+"""
+Modelo guionado para `build_agent` (sin red ni API key).
+
+Lee el pedido del usuario del prompt ("Usuario: ...") y decide la herramienta
+con corpus.LLM_PLANS o, si la frase no está ahí, con el parser del fast path.
+Sirve para los dos modos del agente:
+- "code": responde en el formato de CodeAgent como lo haría un modelo real, en
+  dos pasos (llamar a la herramienta e imprimir; después final_answer). Simula
+  la latencia bloqueando, como un cliente LLM síncrono.
+- "tools": atiende `/chat/completions` a través de un `httpx.MockTransport`
+  (ver `transport()`) y devuelve todas las tool_calls en una sola respuesta.
+En ambos cuenta llamadas y tokens aproximados (4 caracteres por token).
+
+Uso:
+    from bench.fake_model import ScriptedModel
+    model = ScriptedModel(latency_s=0.8)
+    agent = build_agent(llm=model)                                           # modo code
+    agent = build_agent(mode="tools", client=httpx.AsyncClient(transport=model.transport()))
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+import httpx
+from src.fastpath import parse_command
+from src.plan_cache import normalize_utterance
+from .corpus import LLM_PLANS
+
+_USER_RE = re.compile(r"Usuario:\s*(.+)")
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):  # [{"type": "text", "text": ...}, ...]
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content or "")
+
+def _message_text(message: Any) -> str:
+    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+    return _content_text(content)
+
+def _message_role(message: Any) -> str:
+    role = message.get("role") if isinstance(message, dict) else getattr(message, "role", "")
+    return getattr(role, "value", role)
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class ScriptedModel:
+    model_id = "scripted"
+
+    def __init__(self, latency_s: float = 0.0, plans: Optional[Dict[str, Any]] = None, code_steps: int = 2):
+        self.latency_s = latency_s
+        self.code_steps = code_steps
+        self._plans = {normalize_utterance(k): v for k, v in (plans if plans is not None else LLM_PLANS).items()}
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.total_s = 0.0
+        self.last_input_token_count = 0
+        self.last_output_token_count = 0
+
+    def plan_for(self, text: str) -> Optional[Dict[str, Any]]:
+        key = normalize_utterance(text)
+        if key in self._plans:
+            plan = self._plans[key]
+            return {"tool": plan[0], "args": plan[1]} if plan else None
+        return parse_command(text)
+
+    def script(self, text: str, step: int = 1) -> str:
+        """Respuesta en formato CodeAgent para el pedido `text` en el paso `step`."""
+        plan = self.plan_for(text)
+        if plan is None:
+            return (
+                "Thought: El pedido no es claro, pido una aclaración.\n"
+                "Code:\n```py\n"
+                'final_answer("¿Qué luces querés que prenda o apague?")\n'
+                "```<end_code>"
+            )
+        if step >= self.code_steps:
+            # El estado del intérprete persiste entre pasos: `result` sigue definido
+            final = "final_answer(result)" if step > 1 else f"final_answer({self._call(plan)})"
+            return f"Thought: Ya tengo el resultado.\nCode:\n```py\n{final}\n```<end_code>"
+        return (
+            f"Thought: Uso {plan['tool']}.\n"
+            "Code:\n```py\n"
+            f"result = {self._call(plan)}\n"
+            "print(result)\n"
+            "```<end_code>"
+        )
+
+    @staticmethod
+    def _call(plan: Dict[str, Any]) -> str:
+        args = ", ".join(f"{k}={v!r}" for k, v in plan["args"].items())
+        return f"{plan['tool']}({args})"
+
+    def _count(self, prompt: str, completion: str, started: float):
+        self.last_input_token_count = _estimate_tokens(prompt)
+        self.last_output_token_count = _estimate_tokens(completion)
+        self.calls += 1
+        self.input_tokens += self.last_input_token_count
+        self.output_tokens += self.last_output_token_count
+        self.total_s += time.perf_counter() - started
+
+    def generate(self, messages: List[Any], stop_sequences: Optional[List[str]] = None, **kwargs):
+        from smolagents.models import ChatMessage
+
+        started = time.perf_counter()
+        prompt = "\n".join(_message_text(m) for m in messages)
+        requests = _USER_RE.findall(prompt)
+        step = 1 + sum(1 for m in messages if _message_role(m) == "assistant")
+        content = self.script(requests[-1].strip() if requests else "", step)
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        self._count(prompt, content, started)
+
+        message = ChatMessage(role="assistant", content=content)
+        try:
+            from smolagents.monitoring import TokenUsage
+            message.token_usage = TokenUsage(
+                input_tokens=self.last_input_token_count,
+                output_tokens=self.last_output_token_count,
+            )
+        except ImportError:
+            pass  # versiones de smolagents sin TokenUsage: usan last_*_token_count
+        return message
+
+    __call__ = generate
+
+    async def handle_chat(self, request: httpx.Request) -> httpx.Response:
+        """`/chat/completions` compatible con OpenAI, con todas las tool_calls en una respuesta."""
+        started = time.perf_counter()
+        payload = json.loads(request.content)
+        prompt = json.dumps(payload.get("messages", []), ensure_ascii=False)
+        if payload.get("tools"):
+            prompt += json.dumps(payload["tools"], ensure_ascii=False)
+        requests = _USER_RE.findall("\n".join(_message_text(m) for m in payload.get("messages", [])))
+        plan = self.plan_for(requests[-1].strip() if requests else "")
+        if plan is None:
+            message = {"role": "assistant", "content": "¿Qué luces querés que prenda o apague?"}
+        else:
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{self.calls + 1}",
+                "type": "function",
+                "function": {"name": plan["tool"], "arguments": json.dumps(plan["args"], ensure_ascii=False)},
+            }]}
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        completion = json.dumps(message, ensure_ascii=False)
+        self._count(prompt, completion, started)
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-{self.calls}",
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if plan else "stop"}],
+            "usage": {
+                "prompt_tokens": self.last_input_token_count,
+                "completion_tokens": self.last_output_token_count,
+                "total_tokens": self.last_input_token_count + self.last_output_token_count,
+            },
+        })
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle_chat)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "avg_ms": round(self.total_s / self.calls * 1000, 1) if self.calls else 0.0,
+        }
@@ -0,0 +1,97 @@
+"""
+Generador de carga: payloads de webhook de WhatsApp realistas a tasa fija.
+
+Los payloads tienen la forma que manda Meta (object, entry, changes, metadata,
+contacts y messages con id/from/timestamp/type). La carga es de lazo abierto:
+el mensaje i sale en t0 + i/rate aunque los anteriores no hayan terminado,
+así la latencia medida incluye la espera en cola cuando el servidor se satura.
+"""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
+from .corpus import PHRASES
+
+BUSINESS_NUMBER = "15550000000"
+
+class OutboundMessage:
+    __slots__ = ("index", "message_id", "phone", "text", "sent_at", "acked_at", "status")
+
+    def __init__(self, index: int, message_id: str, phone: str, text: Optional[str]):
+        self.index = index
+        self.message_id = message_id
+        self.phone = phone
+        self.text = text  # None = mensaje que no es texto (imagen)
+        self.sent_at = 0.0
+        self.acked_at = 0.0
+        self.status = 0
+
+def build_webhook_payload(messages: List[OutboundMessage], phone_number_id: str = "bench-phone") -> dict:
+    """Payload de webhook con uno o más mensajes (Meta puede agrupar varios en un POST)."""
+    timestamp = str(int(time.time()))
+    wa_messages = []
+    for m in messages:
+        msg = {"from": m.phone, "id": m.message_id, "timestamp": timestamp}
+        if m.text is None:
+            msg.update({"type": "image", "image": {"id": f"media-{m.index}", "mime_type": "image/jpeg"}})
+        else:
+            msg.update({"type": "text", "text": {"body": m.text}})
+        wa_messages.append(msg)
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "bench-waba",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": BUSINESS_NUMBER, "phone_number_id": phone_number_id},
+                    "contacts": [{"profile": {"name": f"Bench {m.phone[-4:]}"}, "wa_id": m.phone}
+                                 for m in messages],
+                    "messages": wa_messages,
+                },
+            }],
+        }],
+    }
+
+def make_messages(count: int, senders: int = 50, non_text_ratio: float = 0.02,
+                  phrases: List[str] = PHRASES, seed: int = 1, run_id: str = "bench") -> List[OutboundMessage]:
+    """Secuencia reproducible de mensajes repartidos entre `senders` teléfonos."""
+    rng = random.Random(seed)
+    phones = [f"5989{i:07d}" for i in range(senders)]
+    messages = []
+    for i in range(count):
+        text = None if rng.random() < non_text_ratio else rng.choice(phrases)
+        messages.append(OutboundMessage(i, f"wamid.{run_id}-{i}", rng.choice(phones), text))
+    return messages
+
+async def run_open_loop(messages: List[OutboundMessage], rate_per_s: float,
+                        post: Callable[[dict], Awaitable[int]], batch: int = 1):
+    """
+    Envía los mensajes en lotes de `batch` por POST a `rate_per_s` mensajes/s.
+    `post(payload)` hace el POST al webhook y retorna el status HTTP.
+    """
+    async def fire(group: List[OutboundMessage]):
+        payload = build_webhook_payload(group)
+        sent_at = time.monotonic()
+        for m in group:
+            m.sent_at = sent_at
+        try:
+            status = await post(payload)
+        except Exception as e:
+            print(f"Error enviando webhook: {e}")
+            status = -1
+        acked_at = time.monotonic()
+        for m in group:
+            m.acked_at = acked_at
+            m.status = status
+
+    interval = batch / rate_per_s
+    start = time.monotonic()
+    tasks = []
+    for n, i in enumerate(range(0, len(messages), batch)):
+        delay = start + n * interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire(messages[i:i + batch])))
+    await asyncio.gather(*tasks)
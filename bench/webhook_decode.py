@@ -0,0 +1,128 @@
+"""
+Microbenchmark de la decodificación del webhook sobre payloads de Meta capturados
+(bench/fixtures/webhooks/*.json).
+
+Compara, por fixture, el camino anterior (`req.json()` → dicts → recorrido con
+`.get` → whitelist por remitente) con `src.webhook_decoder.decode_webhook` sobre
+los bytes crudos, verifica que ambos devuelvan los mismos mensajes y reporta
+µs por payload y la mejora.
+
+Uso:
+    python -m bench.webhook_decode --iterations 20000
+    python -m bench.webhook_decode --allowed 59891234567,59898765432 --json
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from src.webhook_decoder import WebhookDecodeError, decode_webhook, group_by_sender
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "webhooks")
+DEFAULT_ALLOWED = "59891234567,59898765432,59899111222"
+
+def legacy_iter_messages(data: dict) -> Iterator[Tuple[Optional[str], str, str, Optional[str]]]:
+    """Copia del recorrido anterior de src/app.py (iter_messages_from_webhook)."""
+    if not isinstance(data, dict):
+        return
+    for entry in data.get("entry") or []:
+        if not isinstance(entry, dict):
+            continue
+        for change in entry.get("changes") or []:
+            if not isinstance(change, dict):
+                continue
+            value = change.get("value") or {}
+            if not isinstance(value, dict):
+                continue
+            for msg in value.get("messages") or []:
+                if not isinstance(msg, dict):
+                    continue
+                from_phone = msg.get("from")
+                if not from_phone:
+                    continue
+                message_id = msg.get("id")
+                msg_type = msg.get("type", "text")
+                if msg_type != "text":
+                    yield (message_id, from_phone, msg_type, None)
+                    continue
+                text_body = (msg.get("text") or {}).get("body", "")
+                if not isinstance(text_body, str) or not text_body.strip():
+                    continue
+                yield (message_id, from_phone, msg_type, text_body.strip())
+
+def legacy_decode(raw: bytes, is_allowed: Callable[[str], bool]) -> List[tuple]:
+    """Camino anterior: JSON completo, tuplas agrupadas y whitelist por remitente."""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return []
+    groups: Dict[str, List[tuple]] = {}
+    for message in legacy_iter_messages(data):
+        groups.setdefault(message[1], []).append(message)
+    return [(m[0], m[1], m[3]) for phone, msgs in groups.items() if is_allowed(phone) for m in msgs]
+
+def typed_decode(raw: bytes, is_allowed: Callable[[str], bool]) -> List[tuple]:
+    try:
+        groups = group_by_sender(decode_webhook(raw, is_allowed))
+    except WebhookDecodeError:
+        return []
+    return [(m.id, m.phone, m.text) for msgs in groups.values() for m in msgs]
+
+def time_per_call(func: Callable[[], object], iterations: int) -> float:
+    """µs por llamada (la mejor de 3 rondas)."""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - started) / iterations)
+    return best * 1e6
+
+def load_fixtures(directory: str = FIXTURES_DIR) -> Dict[str, bytes]:
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "rb") as f:
+            fixtures[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return fixtures
+
+def run(iterations: int, allowed: List[str]) -> Dict[str, dict]:
+    allowed_set = {phone.lstrip("+") for phone in allowed}
+    is_allowed = (lambda phone: phone in allowed_set) if allowed_set else (lambda phone: True)
+    results = {}
+    for name, raw in load_fixtures().items():
+        expected = legacy_decode(raw, is_allowed)
+        got = typed_decode(raw, is_allowed)
+        if got != expected:
+            raise AssertionError(f"{name}: el decoder devolvió {got}, se esperaba {expected}")
+        legacy_us = time_per_call(lambda: legacy_decode(raw, is_allowed), iterations)
+        typed_us = time_per_call(lambda: typed_decode(raw, is_allowed), iterations)
+        results[name] = {
+            "bytes": len(raw),
+            "messages": len(got),
+            "legacy_us": round(legacy_us, 2),
+            "typed_us": round(typed_us, 2),
+            "speedup": round(legacy_us / typed_us, 2) if typed_us else None,
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Decodificación del webhook: camino anterior vs webhook_decoder")
+    parser.add_argument("--iterations", type=int, default=20000, help="llamadas por ronda y fixture")
+    parser.add_argument("--allowed", default=DEFAULT_ALLOWED,
+                        help="whitelist separada por comas (vacía = todos permitidos)")
+    parser.add_argument("--json", action="store_true", help="salida JSON")
+    args = parser.parse_args()
+
+    allowed = [p.strip() for p in args.allowed.split(",") if p.strip()]
+    results = run(args.iterations, allowed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'fixture':>14} {'bytes':>6} {'msgs':>5} {'anterior µs':>12} {'decoder µs':>11} {'mejora':>7}")
+    for name, r in results.items():
+        print(f"{name:>14} {r['bytes']:>6} {r['messages']:>5} {r['legacy_us']:>12.2f} "
+              f"{r['typed_us']:>11.2f} {r['speedup']:>6.2f}x")
+
+if __name__ == "__main__":
+    main()
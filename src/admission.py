@@ -0,0 +1,78 @@
+"""
+Control de admisión del webhook: límite de tasa por remitente y descarte por carga.
+
+Antes de encolar un mensaje se decide si se admite:
+- cada teléfono tiene un token bucket (ráfaga corta permitida, tasa sostenida acotada);
+- si ya hay demasiados mensajes admitidos sin terminar (marca de agua alta),
+  el mensaje nuevo no se encola: recibe una respuesta fija barata.
+A un mismo teléfono se le avisa como mucho una vez por ventana, así un
+remitente que insiste no genera una respuesta por cada mensaje descartado.
+"""
+from typing import Dict, Optional
+from .cache import TTLCache
+from .ratelimit import TokenBucket
+
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+
+RATE_LIMITED_REPLY = "Estás mandando muchos mensajes seguidos. Esperá unos segundos y probá de nuevo."
+OVERLOADED_REPLY = "Estoy con muchos pedidos en este momento. Probá de nuevo en un minuto 🙏"
+
+class AdmissionController:
+    def __init__(self, sender_rate_per_s: float = 0.5, sender_burst: float = 5.0,
+                 max_pending: int = 100, notify_window_s: float = 60.0):
+        """
+        sender_rate_per_s <= 0 desactiva el límite por remitente;
+        max_pending <= 0 desactiva el descarte por carga.
+        """
+        self._rate = sender_rate_per_s
+        self._burst = sender_burst
+        self.max_pending = max_pending
+        self._buckets = TTLCache(max_size=10000, ttl_s=3600)
+        self._notified = TTLCache(max_size=10000, ttl_s=notify_window_s)
+        self.pending = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+
+    def _bucket(self, phone: str) -> TokenBucket:
+        bucket = self._buckets.get(phone)
+        if bucket is None:
+            bucket = TokenBucket(self._rate, self._burst)
+        self._buckets.set(phone, bucket)
+        return bucket
+
+    def check(self, phone: str) -> Optional[str]:
+        """
+        None si el mensaje se admite (y cuenta como pendiente hasta `done()`);
+        si no, el motivo: RATE_LIMITED u OVERLOADED.
+        """
+        if self.max_pending > 0 and self.pending >= self.max_pending:
+            self.shed += 1
+            return OVERLOADED
+        if self._rate > 0 and not self._bucket(phone).try_acquire():
+            self.rate_limited += 1
+            return RATE_LIMITED
+        self.pending += 1
+        self.admitted += 1
+        return None
+
+    def done(self):
+        """Un mensaje admitido terminó de procesarse."""
+        self.pending = max(0, self.pending - 1)
+
+    def should_notify(self, phone: str) -> bool:
+        """True la primera vez en la ventana: hay que avisarle al remitente."""
+        if phone in self._notified:
+            return False
+        self._notified.set(phone, True)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+        }
@@ -1,35 +1,257 @@
-from smolagents import CodeAgent, Tool, tool
-from .tools import turn_on_lights, turn_off_lights, set_brightness, get_light_state
-from .config import DEFAULT_AREA
+import asyncio
+import contextvars
+import threading
+from typing import Any, List, Optional
+from .tools import agent_tool_call
+from .metrics import mark_step, record_tokens
+from .deadline import DeadlineExceeded
+from .config import AGENT_MODE, DEFAULT_AREA, PROMPT_MODE
+from .mapping import SCENE_MAP, color_names, get_global_area_index
 
 SYSTEM_PROMPT = f"""
 Eres un agente domótico que controla luces a través de Home Assistant.
 Dispones de estas herramientas: turn_on_lights(area, brightness?, color?),
-turn_off_lights(area), set_brightness(area, brightness), get_light_state(area).
+turn_off_lights(area), set_brightness(area, brightness), get_light_state(area),
+turn_on_areas(areas, brightness?, color?), turn_off_areas(areas), activate_scene(scene).
 
 Reglas:
 - El usuario habla en español rioplatense. Interpreta frases como "prendé", "apagá", "subí al 50%", "color azul".
-- Si el usuario no especifica área, usa por defecto el área '{DEFAULT_AREA}'.
+- Si el usuario no especifica área, usa la del contexto del último pedido (si lo hay) o, si no, el área '{DEFAULT_AREA}'.
+- "Subile/bajale un poco" o "y la cocina también" se refieren al último pedido del contexto.
 - brightness es 0-100. Si el usuario dice "al 60%" mapea a brightness=60.
 - Colores aceptados: azul, rojo, verde, blanco/blanca, cálida, fría.
+- Si el pedido abarca varias áreas, usa UNA sola llamada a turn_on_areas/turn_off_areas con todas.
+  Para toda la casa ("apagá todo") usa areas=["todo"].
+- Escenas disponibles: {", ".join(SCENE_MAP)}. Usa activate_scene(scene).
+- Las herramientas que prenden o ajustan luces ya devuelven el brillo y color reales: no llames
+  get_light_state para confirmar.
 - Responde corto, confirma la acción realizada.
 - Si no entiendes, pide una aclaración concreta, pero intentá resolver con supuestos razonables.
 """
 
-TOOLS = [turn_on_lights, turn_off_lights, set_brightness, get_light_state]
+def compact_system_prompt() -> str:
+    """
+    Versión corta de SYSTEM_PROMPT. No lista las herramientas (smolagents y el
+    function calling ya mandan sus descripciones) y arma áreas, colores y escenas
+    desde mapping.py. No depende del mensaje: es idéntica en todos los pedidos,
+    así el proveedor puede reutilizar el prefijo cacheado.
+    """
+    index = get_global_area_index()
+    return (
+        "Agente domótico de luces (Home Assistant); el usuario habla en español rioplatense.\n"
+        f"Área por defecto: {index.default_area}. Áreas: {', '.join(sorted(index.areas))}.\n"
+        f"Colores: {', '.join(color_names())}. Escenas: {', '.join(SCENE_MAP)}.\n"
+        "Sin área: la del contexto, si hay; si no, la por defecto. \"Subile\", \"y la cocina también\": "
+        "relativo al último pedido del contexto.\n"
+        "brightness 0-100 (\"al 60%\" = 60). Varias áreas: una sola llamada a turn_on_areas/turn_off_areas "
+        "(toda la casa: [\"todo\"]).\n"
+        "Las herramientas devuelven el estado real: no verifiques con get_light_state.\n"
+        "Respondé corto confirmando la acción; si es ambiguo, asumí lo razonable o pedí una aclaración concreta."
+    )
 
-def build_agent(llm="openai/gpt-4o-mini"):
+def get_system_prompt(mode: Optional[str] = None) -> str:
+    """System prompt según PROMPT_MODE ("full" o "compact")."""
+    return compact_system_prompt() if (mode or PROMPT_MODE) == "compact" else SYSTEM_PROMPT
+
+def build_user_prompt(text: str, tenant=None, context=None, mode: Optional[str] = None) -> str:
+    """
+    Mensaje de usuario para el agente. Lo que cambia por pedido (el texto, el
+    contexto del remitente en slots y, con varios hogares, sus áreas) va acá,
+    después del prefijo fijo.
     """
-    llm: puedes cambiar al modelo que prefieras compatible con smolagents.
-    Requiere variables de entorno del proveedor (p. ej., OPENAI_API_KEY).
+    if (mode or PROMPT_MODE) == "compact":
+        prompt = f"Usuario: {text}"
+        if context is not None:
+            prompt += f"\n(contexto: {context.describe()})"
+        if tenant is not None:
+            prompt += f"\n(área por defecto: {tenant.default_area}; áreas: {', '.join(tenant.area_index.areas)})"
+        return prompt
+    prompt = f"Usuario: {text}\nResponde con la acción realizada y usa las herramientas si hace falta."
+    if context is not None:
+        prompt += f"\nContexto del último pedido: {context.describe()}."
+    if tenant is not None:
+        prompt += f"\nÁrea por defecto: '{tenant.default_area}'. Áreas: {', '.join(tenant.area_index.areas)}."
+    return prompt
+
+class ToolBridge:
     """
+    Une las herramientas de un CodeAgent con el mensaje en curso. smolagents
+    llama a las herramientas de forma síncrona y ejecuta el código del modelo
+    en sus propios hilos (sin los contextvars del mensaje): la implementación
+    async corre en el event loop de la app (pools HTTP, canal WebSocket) con el
+    contexto que capturó run_agent (plazo, hogar, registro de llamadas, métricas).
+    """
+    __slots__ = ("loop", "context", "cancelled")
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.context: Optional[contextvars.Context] = None
+        self.cancelled = threading.Event()
+
+    def bind(self, loop: asyncio.AbstractEventLoop, context: contextvars.Context):
+        self.loop, self.context, self.cancelled = loop, context, threading.Event()
+
+    def call(self, name: str, **args: Any) -> str:
+        if self.loop is None:
+            return asyncio.run(agent_tool_call(name, **args))  # agente usado fuera de la app
+        if self.cancelled.is_set():
+            # El mensaje ya se respondió por plazo vencido: no seguir tocando luces
+            raise DeadlineExceeded("corrida del agente cancelada")
+        # Una copia por llamada: un Context no se puede usar en dos hilos a la vez
+        future = self.context.copy().run(asyncio.run_coroutine_threadsafe, agent_tool_call(name, **args), self.loop)
+        return future.result()
+
+async def run_agent(agent, prompt: str, pool=None):
+    """
+    Corre el agente sin bloquear el event loop. StructuredToolAgent.run es async;
+    CodeAgent.run es síncrono (llamadas al LLM incluidas) y corre en un hilo: el
+    del AgentPool que prestó el agente (`pool`) o, sin pool, uno de asyncio.
+    """
+    if asyncio.iscoroutinefunction(agent.run):
+        return await agent.run(prompt)
+    bridge: Optional[ToolBridge] = getattr(agent, "tool_bridge", None)
+    if bridge is not None:
+        bridge.bind(asyncio.get_running_loop(), contextvars.copy_context())
+    try:
+        # Los dos copian el contexto: los step callbacks ven la traza del mensaje
+        if pool is not None:
+            return await pool.run_in_thread(agent, agent.run, prompt)
+        return await asyncio.to_thread(agent.run, prompt)
+    except asyncio.CancelledError:
+        if bridge is not None:
+            bridge.cancelled.set()
+        raise
+
+def build_tools(bridge: ToolBridge) -> list:
+    """
+    Herramientas smolagents de un agente, atadas a su ToolBridge. Se construyen
+    al crear el agente para no importar smolagents al arrancar (el fast path y
+    el webhook GET no lo necesitan).
+    """
+    from smolagents import tool
+
+    @tool
+    def turn_on_lights(area: str, brightness: Optional[int] = None, color: Optional[str] = None) -> str:
+        """
+        Enciende luces en un área.
+
+        Args:
+            area: Área de la casa (p. ej. 'living', 'cocina').
+            brightness: Brillo 0-100 (se escala a 0-255).
+            color: 'azul', 'rojo', 'verde', 'blanco/blanca', 'cálida', 'fría', etc.
+        """
+        return bridge.call("turn_on_lights", area=area, brightness=brightness, color=color)
+
+    @tool
+    def turn_off_lights(area: str) -> str:
+        """
+        Apaga luces en un área.
+
+        Args:
+            area: Área de la casa.
+        """
+        return bridge.call("turn_off_lights", area=area)
+
+    @tool
+    def get_light_state(area: str) -> str:
+        """
+        Devuelve estado resumido de las luces de un área.
+
+        Args:
+            area: Área de la casa.
+        """
+        return bridge.call("get_light_state", area=area)
+
+    @tool
+    def set_brightness(area: str, brightness: int) -> str:
+        """
+        Ajusta brillo de las luces del área.
+
+        Args:
+            area: Área de la casa.
+            brightness: Brillo 0-100.
+        """
+        return bridge.call("set_brightness", area=area, brightness=brightness)
+
+    @tool
+    def turn_on_areas(areas: List[str], brightness: Optional[int] = None, color: Optional[str] = None) -> str:
+        """
+        Enciende varias áreas en una sola llamada.
+
+        Args:
+            areas: Áreas a encender (["todo"] para toda la casa).
+            brightness: Brillo 0-100.
+            color: Color, como en turn_on_lights.
+        """
+        return bridge.call("turn_on_areas", areas=areas, brightness=brightness, color=color)
+
+    @tool
+    def turn_off_areas(areas: List[str]) -> str:
+        """
+        Apaga varias áreas en una sola llamada.
+
+        Args:
+            areas: Áreas a apagar (["todo"] para toda la casa).
+        """
+        return bridge.call("turn_off_areas", areas=areas)
+
+    @tool
+    def activate_scene(scene: str) -> str:
+        """
+        Activa una escena predefinida.
+
+        Args:
+            scene: Nombre de la escena (p. ej. 'noche', 'cine').
+        """
+        return bridge.call("activate_scene", scene=scene)
+
+    return [
+        turn_on_lights, turn_off_lights, set_brightness, get_light_state,
+        turn_on_areas, turn_off_areas, activate_scene,
+    ]
+
+def _step_tokens(step) -> tuple:
+    """(entrada, salida) de un paso de smolagents: `token_usage` o los contadores de versiones viejas."""
+    usage = getattr(step, "token_usage", None)
+    if usage is not None:
+        return getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0
+    return getattr(step, "input_token_count", 0) or 0, getattr(step, "output_token_count", 0) or 0
+
+def _on_step(step, *args, **kwargs):
+    """Step callback: mide cada paso del LLM y sus tokens (ver metrics.mark_step)."""
+    mark_step()
+    record_tokens(*_step_tokens(step))
+
+def build_agent(llm="openai/gpt-4o-mini", mode: Optional[str] = None, client=None):
+    """
+    llm: modelo de smolagents, o el id de LiteLLM de cualquier proveedor
+    (p. ej. "openai/gpt-4o-mini"). Requiere variables de entorno del proveedor
+    (p. ej., OPENAI_API_KEY). El agente se corre con run_agent.
+
+    mode: "code" (CodeAgent) o "tools" (una sola llamada con function calling,
+    ver tool_agent.py); por defecto AGENT_MODE. En modo "tools" el modelo es
+    LLM_MODEL y `client` permite inyectar el cliente HTTP del LLM.
+    """
+    system_prompt = get_system_prompt()
+    if (mode or AGENT_MODE) == "tools":
+        from .tool_agent import StructuredToolAgent
+        return StructuredToolAgent(system_prompt, client=client)
+
+    from smolagents import CodeAgent, LiteLLMModel
+
+    if isinstance(llm, str):
+        # temperature 0.2 para ser más determinista con comandos domóticos
+        llm = LiteLLMModel(model_id=llm, temperature=0.2)
+    bridge = ToolBridge()
     agent = CodeAgent(
-        tools=TOOLS,
-        system_prompt=SYSTEM_PROMPT,
+        tools=build_tools(bridge),
+        # Nuestras reglas van como instrucciones: el system prompt de smolagents
+        # (formato de código y herramientas) se mantiene
+        instructions=system_prompt,
         model=llm,
-        # temperature 0.2 para ser más determinista con comandos domóticos
-        temperature=0.2,
         max_steps=4,  # como mucho 4 llamadas a herramientas
+        step_callbacks=[_on_step],
     )
+    agent.tool_bridge = bridge  # lo usa run_agent
     return agent
 
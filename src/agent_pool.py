@@ -0,0 +1,105 @@
+"""
+Pool de agentes para procesar mensajes en paralelo sin compartir estado.
+
+Los agentes de smolagents guardan la memoria de la corrida en curso, así que
+dos mensajes no pueden usar el mismo agente a la vez. El pool construye hasta
+`size` agentes a partir de una fábrica (que reutiliza lo que es inmutable:
+prompt, herramientas y cliente del modelo) y presta uno por mensaje; si están
+todos ocupados, el mensaje espera a que se libere uno.
+
+CodeAgent.run es síncrono (incluida la llamada al LLM): `run_in_thread` lo
+corre en los hilos del pool, uno por agente, así `size` corridas avanzan en
+paralelo sin bloquear el event loop (ni los acks del webhook). El modo tools
+es async y no usa hilos.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+class AgentPool:
+    def __init__(self, factory: Callable[[], Any], size: int = 4):
+        self._factory = factory
+        self.size = max(1, size)
+        self._idle: List[Any] = []
+        self._built = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._orphans: Dict[int, Future] = {}  # id(agente) → corrida que siguió tras cancelarse
+
+    @property
+    def waiting(self) -> int:
+        """Mensajes esperando un agente libre."""
+        return self._waiting
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # En serverless cada invocación puede traer un event loop nuevo
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._sem = asyncio.Semaphore(self.size - self._in_use)
+            self._loop = loop
+        return self._sem
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Any]:
+        """Presta un agente libre (construyéndolo si hace falta) durante el bloque."""
+        sem = self._semaphore()
+        self._waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            if self._idle:
+                agent = self._idle.pop()
+            else:
+                agent = self._factory()
+                self._built += 1
+        except Exception:
+            sem.release()
+            raise
+        self._in_use += 1
+        try:
+            yield agent
+        finally:
+            orphan = self._orphans.pop(id(agent), None)
+            if orphan is None or orphan.done():
+                self._give_back(agent, sem)
+            else:
+                # El hilo sigue usando el agente: vuelve al pool recién cuando termine
+                loop = asyncio.get_running_loop()
+                orphan.add_done_callback(lambda _: loop.call_soon_threadsafe(self._give_back, agent, sem))
+
+    def _give_back(self, agent: Any, sem: asyncio.Semaphore):
+        self._in_use -= 1
+        self._idle.append(agent)
+        sem.release()
+
+    async def run_in_thread(self, agent: Any, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Corre `func(*args)` del agente prestado en un hilo del pool, con el
+        contexto del mensaje. Si se cancela la espera (plazo vencido), el hilo
+        no se puede interrumpir: el agente queda fuera del pool hasta que termine.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="agent")
+        future = self._executor.submit(contextvars.copy_context().run, func, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.done():
+                self._orphans[id(agent)] = future
+            raise
+
+    def close(self):
+        """Libera los hilos del pool (sin esperar corridas colgadas)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": self.size, "built": self._built, "in_use": self._in_use, "waiting": self._waiting}
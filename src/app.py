@@ -1,56 +1,94 @@
-from typing import Optional, Tuple
-from fastapi import FastAPI, Request, HTTPException
+from contextlib import asynccontextmanager
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.responses import PlainTextResponse
-from .config import WA_VERIFY_TOKEN, ALLOWED_NUMBERS, PORT
-from .whatsapp import send_whatsapp_text
-from .agent import build_agent
-import uvicorn
+from .config import (
+    WA_VERIFY_TOKEN, ALLOWED_NUMBERS, PORT, FASTPATH_ENABLED, HA_STATE_MIRROR,
+    WEBHOOK_ACK_FIRST, WORKER_CONCURRENCY, WORKER_QUEUE_SIZE,
+    DEDUP_TTL_S, AREA_DISCOVERY,
+    PLAN_CACHE_ENABLED, PLAN_CACHE_TTL_S, METRICS_SERVER_TIMING,
+    AGENT_POOL_SIZE, ADMISSION_SENDER_RATE_PER_S, ADMISSION_SENDER_BURST,
+    ADMISSION_MAX_PENDING, ADMISSION_AGENT_HIGH_WATER,
+    MESSAGE_DEADLINE_S, REPLY_RESERVE_S, CONTEXT_ENABLED, CONTEXT_IDLE_TTL_S,
+)
+from .whatsapp import send_whatsapp_text, sender
+from .http_pool import open_pools, close_pools
+from .ha_state import start_state_mirror, stop_state_mirror
+from .ha_ws import close_channels
+from .discovery import start_area_discovery, stop_area_discovery
+from .agent import build_agent, build_user_prompt, run_agent
+from .agent_pool import AgentPool
+from .fastpath import try_fast_path, fastpath_stats, uses_context
+from .plan_cache import PlanCache, replay_plan
+from .tools import record_tool_calls
+from .worker import MessageWorker
+from .dedup import MessageDeduper
+from .webhook_decoder import decode_webhook, group_by_sender
+from .conversation import ConversationContext, ConversationStore
+from .admission import AdmissionController, OVERLOADED, RATE_LIMITED, RATE_LIMITED_REPLY, OVERLOADED_REPLY
+from .state_store import get_state_store, close_state_store
+from .tenants import get_registry, use_tenant
+from .deadline import DEADLINE_REPLY, Deadline, DeadlineExceeded, use_deadline, run_with_deadline
+from .metrics import message_trace, request_trace, timed, record_error, messages_total, render_metrics
 
-app = FastAPI(title="WhatsApp → HA Agent")
-agent = build_agent()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pools HTTP compartidos (keep-alive) durante toda la vida de la app
+    open_pools()
+    if HA_STATE_MIRROR:
+        start_state_mirror()
+    if AREA_DISCOVERY:
+        start_area_discovery()
+    if WEBHOOK_ACK_FIRST:
+        message_worker.start()
+    yield
+    await message_worker.stop()
+    await stop_area_discovery()
+    await stop_state_mirror()
+    await close_channels()
+    await close_pools()
+    if _agent_pool is not None:
+        _agent_pool.close()
+    close_state_store()
+
+app = FastAPI(title="WhatsApp → HA Agent", lifespan=lifespan)
+_agent_pool: Optional[AgentPool] = None
+
+def get_agent_pool() -> AgentPool:
+    """
+    Pool de agentes, creado en el primer mensaje que lo necesite (no al importar).
+    Cada mensaje usa su propio agente: las corridas concurrentes no comparten memoria.
+    """
+    global _agent_pool
+    if _agent_pool is None:
+        _agent_pool = AgentPool(build_agent, size=AGENT_POOL_SIZE)
+    return _agent_pool
+
+# Hogares de TENANTS_FILE: se cargan y validan al arrancar (ValueError si el archivo es inválido)
+get_registry()
+
+# Dedup y caché de planes sobre el almacén de estado (en memoria o SQLite compartido)
+state_store = get_state_store()
+deduper = MessageDeduper(state_store, ttl_s=DEDUP_TTL_S)
+plan_cache = PlanCache(state_store, ttl_s=PLAN_CACHE_TTL_S)
+conversations = ConversationStore(state_store, idle_ttl_s=CONTEXT_IDLE_TTL_S)
+admission = AdmissionController(
+    sender_rate_per_s=ADMISSION_SENDER_RATE_PER_S,
+    sender_burst=ADMISSION_SENDER_BURST,
+    max_pending=ADMISSION_MAX_PENDING,
+)
 
 def is_phone_allowed(phone: str) -> bool:
-    """Verifica si el número está en la whitelist."""
+    """Verifica si el número está en la whitelist (o, con varios hogares, en alguno)."""
+    registry = get_registry()
+    if registry is not None:
+        return registry.lookup(phone) is not None
     if not ALLOWED_NUMBERS:
         return True  # Si no hay whitelist, permitir todos
     return f"+{phone}" in ALLOWED_NUMBERS or phone in ALLOWED_NUMBERS
 
-def extract_message_from_webhook(data: dict) -> Optional[Tuple[str, Optional[str]]]:
-    """
-    Extrae el número de teléfono y el texto del mensaje desde la estructura de WhatsApp.
-    Retorna (phone, text) o None si no hay mensaje válido.
-    """
-    try:
-        entry = data.get("entry", [])
-        if not entry:
-            return None
-        
-        changes = entry[0].get("changes", [])
-        if not changes:
-            return None
-        
-        value = changes[0].get("value", {})
-        messages = value.get("messages", [])
-        if not messages:
-            return None
-        
-        msg = messages[0]
-        from_phone = msg.get("from")
-        if not from_phone:
-            return None
-        
-        msg_type = msg.get("type", "text")
-        if msg_type != "text":
-            return (from_phone, None)  # Mensaje no es texto
-        
-        text_body = msg.get("text", {}).get("body", "")
-        if not text_body:
-            return None
-        
-        return (from_phone, text_body.strip())
-    except (KeyError, IndexError, TypeError):
-        return None
-
 # Verificación de webhook (GET)
 @app.get("/webhook", response_class=PlainTextResponse)
 async def verify(mode: str = "", challenge: str = "", token: str = ""):
@@ -58,56 +96,213 @@ async def verify(mode: str = "", challenge: str = "", token: str = ""):
         return challenge
     raise HTTPException(status_code=403, detail="Verification failed")
 
-# Recepción de mensajes (POST)
-@app.post("/webhook")
-async def webhook(req: Request):
-    try:
-        data = await req.json()
-    except Exception as e:
-        print(f"Error parseando JSON del webhook: {e}")
-        return {"ok": True}
-    
-    # Extraer mensaje
-    result = extract_message_from_webhook(data)
-    if not result:
-        return {"ok": True}
-    
-    from_phone, text = result
-    
-    # Validar whitelist
-    if not is_phone_allowed(from_phone):
-        return {"ok": True}
-    
+# Estadísticas de uso (fracción de mensajes resueltos por el fast path, etc.)
+@app.get("/stats")
+async def stats():
+    return {
+        "fastpath": fastpath_stats(),
+        "queue_depth": message_worker.depth,
+        "duplicates_suppressed": deduper.suppressed,
+        "plan_cache": plan_cache.stats(),
+        "whatsapp": sender.stats(),
+        "agent_pool": _agent_pool.stats() if _agent_pool is not None else None,
+        "admission": admission.stats(),
+    }
+
+# Métricas por etapa en formato Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+async def handle_message(from_phone: str, text: Optional[str], deadline: Optional[Deadline] = None):
+    """
+    Procesa un mensaje ya validado y responde por WhatsApp, dentro del plazo
+    `deadline` (creado al recibir el webhook; si no viene, empieza ahora).
+    """
+    if deadline is None:
+        deadline = Deadline(MESSAGE_DEADLINE_S)
+    registry = get_registry()
+    tenant = registry.lookup(from_phone) if registry is not None else None
+    with use_deadline(deadline), use_tenant(tenant), message_trace() as trace, timed("message"):
+        await _handle_message(from_phone, text, trace, tenant)
+
+async def _answer(text: str, trace, tenant=None,
+                  context: Optional[ConversationContext] = None) -> Tuple[str, Optional[str]]:
+    """
+    Resuelve el mensaje (fast path, caché de planes o agente) con el contexto
+    del remitente. Retorna (ruta, respuesta).
+    """
+    route = "fastpath"
+    # Solo los seguimientos ("subile", "y la cocina también") se cachean por contexto
+    scope = context.describe() if context is not None and uses_context(text) else ""
+    with timed("fastpath"):
+        answer = await try_fast_path(text, context) if FASTPATH_ENABLED else None
+    plan = plan_cache.get(text, scope) if answer is None and PLAN_CACHE_ENABLED else None
+    if plan is not None:
+        route = "plan_cache"
+        with timed("plan_cache"):
+            answer = await replay_plan(plan)
+    if answer is None and ADMISSION_AGENT_HIGH_WATER > 0 and \
+            _agent_pool is not None and _agent_pool.waiting >= ADMISSION_AGENT_HIGH_WATER:
+        # Demasiados mensajes esperando un agente: respuesta fija en lugar de sumar a la cola
+        route = "shed"
+        answer = OVERLOADED_REPLY
+    if answer is None:
+        route = "agent"
+        user_prompt = build_user_prompt(text, tenant, context)
+        pool = get_agent_pool()
+        async with pool.acquire() as agent:
+            with record_tool_calls() as calls, timed("agent"):
+                trace.mark = time.perf_counter()  # los pasos del LLM se miden desde acá
+                result = await run_agent(agent, user_prompt, pool)
+        answer = result.output if hasattr(result, "output") else str(result)
+        if PLAN_CACHE_ENABLED and not getattr(result, "failed", False):
+            plan_cache.put(text, calls, scope)
+    return route, answer
+
+async def _handle_message(from_phone: str, text: Optional[str], trace, tenant=None):
     # Si el mensaje no es texto, responder y salir
     if text is None:
+        messages_total.inc(route="non_text")
         try:
             await send_whatsapp_text(from_phone, "Solo acepto texto por ahora 🙂")
         except Exception as e:
             print(f"Error enviando respuesta de tipo no soportado: {e}")
-        return {"ok": True}
+        return
     
-    # Ejecutar agente
+    # Ejecutar fast path o agente (cancelado si solo queda la reserva para responder)
+    context = conversations.get(from_phone) if CONTEXT_ENABLED else None
+    executed: List[Dict[str, Any]] = []
     try:
-        user_prompt = f"Usuario: {text}\nResponde con la acción realizada y usa las herramientas si hace falta."
-        result = await agent.run(user_prompt)
-        answer = result.output if hasattr(result, "output") else str(result)
+        with record_tool_calls() as executed:
+            route, answer = await run_with_deadline(_answer(text, trace, tenant, context), reserve_s=REPLY_RESERVE_S)
+        messages_total.inc(route=route)
         await send_whatsapp_text(from_phone, answer or "Hecho.")
+    except DeadlineExceeded as e:
+        print(f"Plazo vencido procesando mensaje: {e}")
+        messages_total.inc(route="deadline")
+        record_error("message", e)
+        try:
+            # Con el plazo del mensaje vencido (p. ej. tras esperar en la cola) clamp_timeout
+            # cortaría el envío: la respuesta de respaldo tiene su propio plazo corto
+            with use_deadline(Deadline(REPLY_RESERVE_S)):
+                await send_whatsapp_text(from_phone, DEADLINE_REPLY)
+        except Exception as send_error:
+            print(f"Error enviando respuesta de plazo vencido: {send_error}")
     except ValueError as e:
         # Errores de validación (configuración faltante)
         print(f"Error de validación: {e}")
+        record_error("message", e)
         try:
             await send_whatsapp_text(from_phone, "Error de configuración. Revisa los logs.")
         except:
             pass
     except Exception as e:
         print(f"Error ejecutando agente: {e}")
+        record_error("message", e)
         try:
             await send_whatsapp_text(from_phone, "Ocurrió un error procesando tu mensaje. Intenta de nuevo.")
         except:
             pass
+    finally:
+        # El último pedido queda como contexto del remitente (también si se cortó a mitad)
+        if CONTEXT_ENABLED and executed:
+            conversations.update(from_phone, context, executed)
+
+async def handle_admitted(from_phone: str, text: Optional[str], deadline: Optional[Deadline] = None):
+    """Procesa un mensaje que pasó el control de admisión y libera su lugar al terminar."""
+    try:
+        await handle_message(from_phone, text, deadline)
+    finally:
+        admission.done()
+
+async def send_canned_reply(from_phone: str, text: str):
+    try:
+        await send_whatsapp_text(from_phone, text)
+    except Exception as e:
+        print(f"Error enviando respuesta de control de admisión: {e}")
+
+# Respuestas fijas enviadas en segundo plano en modo ack-first (referencias vivas hasta terminar)
+_background_replies: set = set()
+
+# Modo ack-first: los mensajes se procesan en segundo plano, en orden por teléfono
+message_worker = MessageWorker(handle_admitted, concurrency=WORKER_CONCURRENCY, queue_size=WORKER_QUEUE_SIZE)
+
+# Recepción de mensajes (POST)
+@app.post("/webhook")
+async def webhook(req: Request, response: Response):
+    with request_trace() as trace:
+        result = await _process_webhook(req)
+    if METRICS_SERVER_TIMING and trace.stages:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return result
+
+async def _process_webhook(req: Request) -> dict:
+    try:
+        with timed("parse"):
+            raw = await req.body()
+            # Mensajes de remitentes permitidos, agrupados por teléfono (estados y resto descartados sin parsear)
+            groups = group_by_sender(decode_webhook(raw, is_phone_allowed))
+    except Exception as e:
+        print(f"Error parseando JSON del webhook: {e}")
+        return {"ok": True}
+    
+    if not groups:
+        return {"ok": True}
+    
+    inline: Dict[str, List[Tuple[Optional[str], Deadline]]] = {}
+    canned: List[Tuple[str, str]] = []
+    for from_phone, messages in groups.items():
+        for message in messages:
+            text = message.text
+            # Descartar reintentos/duplicados antes de cualquier trabajo de LLM o HA
+            if deduper.is_duplicate(message.id):
+                continue
+            # Límite por remitente y descarte por carga: respuesta fija (una vez por ventana)
+            rejected = admission.check(from_phone)
+            if rejected is not None:
+                messages_total.inc(route=rejected)
+                if admission.should_notify(from_phone):
+                    canned.append((from_phone, RATE_LIMITED_REPLY if rejected == RATE_LIMITED else OVERLOADED_REPLY))
+                continue
+            # El plazo corre desde que llega el webhook (incluye la espera en la cola)
+            deadline = Deadline(MESSAGE_DEADLINE_S)
+            if WEBHOOK_ACK_FIRST and message_worker.submit(from_phone, from_phone, text, deadline):
+                continue
+            if WEBHOOK_ACK_FIRST and message_worker.pending(from_phone):
+                # Cola llena, pero el remitente tiene mensajes anteriores en la cola: procesarlo
+                # en línea lo adelantaría ("prendé" y "apagá" al revés). Se rechaza como sobrecarga
+                # y libera el lugar que le dio la admisión.
+                admission.done()
+                messages_total.inc(route=OVERLOADED)
+                if admission.should_notify(from_phone):
+                    canned.append((from_phone, OVERLOADED_REPLY))
+                continue
+            if WEBHOOK_ACK_FIRST:
+                # Cola llena: procesar en línea (contrapresión) en lugar de perder el mensaje
+                print("Cola de mensajes llena, procesando en línea")
+            inline.setdefault(from_phone, []).append((text, deadline))
+    
+    if canned and WEBHOOK_ACK_FIRST:
+        for phone, reply in canned:
+            task = asyncio.create_task(send_canned_reply(phone, reply))
+            _background_replies.add(task)
+            task.add_done_callback(_background_replies.discard)
+        canned = []
+    
+    # Remitentes distintos en paralelo; los mensajes de un mismo remitente, en orden
+    async def process_sender(from_phone: str, items: List[Tuple[Optional[str], Deadline]]):
+        for text, deadline in items:
+            await handle_admitted(from_phone, text, deadline)
     
+    if inline or canned:
+        await asyncio.gather(
+            *(process_sender(phone, items) for phone, items in inline.items()),
+            *(send_canned_reply(phone, reply) for phone, reply in canned),
+        )
     return {"ok": True}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("src.app:app", host="0.0.0.0", port=PORT, reload=True)
 
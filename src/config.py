@@ -6,6 +6,10 @@ from dotenv import load_dotenv
 if os.path.exists(".env"):
     load_dotenv()
 
+def _env_bool(name: str, default: str = "0") -> bool:
+    """Interpreta una variable de entorno como booleano (1/true/yes/on)."""
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
 # PORT is not needed in Vercel (it's serverless), but keep for local development
 PORT = int(os.getenv("PORT", "8000"))
 
@@ -13,13 +17,105 @@ PORT = int(os.getenv("PORT", "8000"))
 WA_VERIFY_TOKEN = os.getenv("WA_VERIFY_TOKEN", "")
 WA_ACCESS_TOKEN = os.getenv("WA_ACCESS_TOKEN", "")
 WA_PHONE_NUMBER_ID = os.getenv("WA_PHONE_NUMBER_ID", "")
+WA_TIMEOUT_S = float(os.getenv("WA_TIMEOUT_S", "15"))
+# URL base de Graph API (se cambia para apuntar a un sink local en los benchmarks)
+WA_API_BASE = os.getenv("WA_API_BASE", "https://graph.facebook.com/v20.0").rstrip("/")
+# Envío: tasa global del número de negocio, tasa por destinatario y reintentos
+WA_SEND_RATE_PER_S = float(os.getenv("WA_SEND_RATE_PER_S", "20"))
+WA_SEND_BURST = float(os.getenv("WA_SEND_BURST", "20"))
+WA_RECIPIENT_RATE_PER_S = float(os.getenv("WA_RECIPIENT_RATE_PER_S", "1"))
+WA_RECIPIENT_BURST = float(os.getenv("WA_RECIPIENT_BURST", "3"))
+WA_SEND_MAX_RETRIES = int(os.getenv("WA_SEND_MAX_RETRIES", "3"))
 
 # Home Assistant
 HA_BASE_URL = os.getenv("HA_BASE_URL", "").rstrip("/")
 HA_TOKEN = os.getenv("HA_TOKEN", "")
 HA_TIMEOUT_MS = int(os.getenv("HA_TIMEOUT_MS", "5000"))
+# Espejo en memoria de los estados (WebSocket de HA); útil en servidores de larga vida
+HA_STATE_MIRROR = _env_bool("HA_STATE_MIRROR")
+# Transporte de las llamadas a servicios: "rest" (un POST por llamada) o "websocket"
+# (una conexión persistente con varios comandos en vuelo; si está caída, se usa REST)
+HA_TRANSPORT = os.getenv("HA_TRANSPORT", "rest").strip().lower()
+
+# Pools HTTP compartidos (keep-alive hacia HA y Graph API)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+HTTP2_ENABLED = _env_bool("HTTP2_ENABLED")  # requiere el paquete opcional `h2`
 
 # Seguridad
 ALLOWED_NUMBERS = [x.strip() for x in os.getenv("ALLOWED_NUMBERS", "").split(",") if x.strip()]
 DEFAULT_AREA = os.getenv("DEFAULT_AREA", "living")
 
+# Varios hogares en un despliegue: JSON teléfono → HA, áreas y área por defecto (ver tenants.py)
+TENANTS_FILE = os.getenv("TENANTS_FILE", "")
+
+# Áreas: auto-descubrimiento desde los registros de HA y búsqueda aproximada de alias
+AREA_DISCOVERY = _env_bool("AREA_DISCOVERY")
+AREA_DISCOVERY_TTL_S = float(os.getenv("AREA_DISCOVERY_TTL_S", "600"))
+AREA_FUZZY_MATCH = _env_bool("AREA_FUZZY_MATCH")
+
+# Agente: "code" (CodeAgent de smolagents, varios pasos) o "tools" (una sola llamada
+# con function calling a una API compatible con OpenAI, ver tool_agent.py)
+AGENT_MODE = os.getenv("AGENT_MODE", "code").strip().lower()
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "") or os.getenv("OPENAI_API_KEY", "")
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+# Prompt del agente: "full" (texto completo) o "compact" (reglas mínimas, listas de áreas,
+# colores y escenas generadas desde mapping.py; prefijo idéntico entre mensajes)
+PROMPT_MODE = os.getenv("PROMPT_MODE", "full").strip().lower()
+# Agentes en paralelo (cada mensaje usa uno propio; si están todos ocupados, espera)
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "4"))
+
+# Control de admisión: tasa por remitente (0 = sin límite), mensajes admitidos sin
+# terminar antes de descartar con una respuesta fija (0 = sin límite) y mensajes
+# esperando un agente a partir de los cuales se responde "ocupado" sin llamar al LLM
+ADMISSION_SENDER_RATE_PER_S = float(os.getenv("ADMISSION_SENDER_RATE_PER_S", "0.5"))
+ADMISSION_SENDER_BURST = float(os.getenv("ADMISSION_SENDER_BURST", "5"))
+ADMISSION_MAX_PENDING = int(os.getenv("ADMISSION_MAX_PENDING", "100"))
+ADMISSION_AGENT_HIGH_WATER = int(os.getenv("ADMISSION_AGENT_HIGH_WATER", "16"))
+
+# Plazo por mensaje desde que llega al webhook (debajo del maxDuration de 30 s de Vercel)
+# y segundos que se reservan al final para mandar siempre una respuesta de respaldo
+MESSAGE_DEADLINE_S = float(os.getenv("MESSAGE_DEADLINE_S", "25"))
+REPLY_RESERVE_S = float(os.getenv("REPLY_RESERVE_S", "3"))
+
+# Fast path: comandos simples de luces se ejecutan sin pasar por el LLM
+FASTPATH_ENABLED = _env_bool("FASTPATH_ENABLED", "1")
+
+# Contexto por teléfono (último pedido en slots) para seguimientos como "subile un poco más";
+# vence tras CONTEXT_IDLE_TTL_S sin comandos
+CONTEXT_ENABLED = _env_bool("CONTEXT_ENABLED", "1")
+CONTEXT_IDLE_TTL_S = float(os.getenv("CONTEXT_IDLE_TTL_S", "600"))
+CONTEXT_MAX_SIZE = int(os.getenv("CONTEXT_MAX_SIZE", "10000"))
+
+# Caché de planes: frases repetidas reproducen las llamadas del agente sin LLM
+PLAN_CACHE_ENABLED = _env_bool("PLAN_CACHE_ENABLED", "1")
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "512"))
+PLAN_CACHE_TTL_S = float(os.getenv("PLAN_CACHE_TTL_S", "3600"))
+
+# Métricas por etapa (/metrics en formato Prometheus) y header Server-Timing en el webhook
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", "1")
+METRICS_SERVER_TIMING = _env_bool("METRICS_SERVER_TIMING")
+
+# Tamaño máximo del cuerpo del webhook (los POST de Meta son de pocos KB)
+WEBHOOK_MAX_BYTES = int(os.getenv("WEBHOOK_MAX_BYTES", "262144"))
+
+# Webhook ack-first: responder 200 al instante y procesar en una cola en segundo plano.
+# Solo para servidores de larga vida (en serverless el proceso se congela tras responder).
+WEBHOOK_ACK_FIRST = _env_bool("WEBHOOK_ACK_FIRST")
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "256"))
+
+# Deduplicación de mensajes por ID (reintentos/entregas dobles de Meta)
+DEDUP_TTL_S = float(os.getenv("DEDUP_TTL_S", "86400"))
+DEDUP_MAX_SIZE = int(os.getenv("DEDUP_MAX_SIZE", "10000"))
+
+# Estado compartido (dedup, contexto, caché de HA y de planes): "memory" (por proceso)
+# o "sqlite" (archivo local en modo WAL, compartido por los workers de la máquina)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").strip().lower()
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "state.db")
+# Segundos que se reutiliza un estado leído de HA (0 = sin caché); se invalida al cambiarlo
+HA_STATE_CACHE_TTL_S = float(os.getenv("HA_STATE_CACHE_TTL_S", "5"))
+
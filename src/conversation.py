@@ -0,0 +1,103 @@
+"""
+Contexto de conversación por teléfono, en slots fijos.
+
+Para entender seguimientos como "subile un poco más" o "y la cocina también"
+alcanza con saber el último pedido: áreas, acción, brillo, color y escena.
+Se guarda eso (no el historial del chat) en el almacén de estado, espacio
+NS_CONTEXT: tamaño acotado (LRU) y vencimiento por inactividad, porque cada
+comando ejecutado vuelve a guardarlo con el TTL completo. Así el contexto que
+ven el fast path y el agente ocupa siempre lo mismo, por largo que sea el chat.
+"""
+from typing import Any, Dict, List, Optional
+from .mapping import normalize_area
+from .state_store import NS_CONTEXT, StateStore
+
+ON = "on"
+OFF = "off"
+
+class ConversationContext:
+    __slots__ = ("areas", "action", "brightness", "color", "scene")
+
+    def __init__(self, areas: Optional[List[str]] = None, action: Optional[str] = None,
+                 brightness: Optional[int] = None, color: Optional[str] = None, scene: Optional[str] = None):
+        self.areas: List[str] = list(areas or [])
+        self.action = action
+        self.brightness = brightness
+        self.color = color
+        self.scene = scene
+
+    @property
+    def area(self) -> Optional[str]:
+        """Área del último pedido si fue una sola (para los pedidos sin área)."""
+        return self.areas[0] if len(self.areas) == 1 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationContext":
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def apply(self, tool: str, args: Dict[str, Any]):
+        """Actualiza los slots con una llamada a herramienta ejecutada."""
+        if tool == "activate_scene":
+            self.scene = args.get("scene")
+            self.areas, self.action, self.brightness, self.color = [], None, None, None
+            return
+        if "areas" in args:
+            raw_areas = args.get("areas")
+            raw_areas = raw_areas if isinstance(raw_areas, list) else [raw_areas]
+        else:
+            raw_areas = [args.get("area")]
+        areas = [normalize_area(a) or a for a in raw_areas if isinstance(a, str) and a]
+        same_areas = areas == self.areas
+        self.areas = areas
+        self.scene = None
+        if tool == "get_light_state":
+            if not same_areas:
+                self.action, self.brightness, self.color = None, None, None
+            return
+        if tool in ("turn_off_lights", "turn_off_areas"):
+            self.action, self.brightness, self.color = OFF, None, None
+            return
+        # turn_on_*, set_brightness: lo que no se indicó se mantiene si son las mismas áreas
+        brightness = args.get("brightness")
+        color = args.get("color")
+        self.action = ON
+        self.brightness = brightness if isinstance(brightness, int) else (self.brightness if same_areas else None)
+        self.color = color if isinstance(color, str) else (self.color if same_areas else None)
+
+    def describe(self) -> str:
+        """Slots en una línea: "áreas=living; acción=on; brillo=60; color=azul"."""
+        parts = []
+        if self.areas:
+            parts.append(f"áreas={','.join(self.areas)}")
+        if self.action:
+            parts.append(f"acción={self.action}")
+        if self.brightness is not None:
+            parts.append(f"brillo={self.brightness}")
+        if self.color:
+            parts.append(f"color={self.color}")
+        if self.scene:
+            parts.append(f"escena={self.scene}")
+        return "; ".join(parts)
+
+class ConversationStore:
+    def __init__(self, store: StateStore, idle_ttl_s: float = 600.0):
+        self._store = store
+        self._ttl_s = idle_ttl_s
+
+    def get(self, phone: str) -> Optional[ConversationContext]:
+        data = self._store.get(NS_CONTEXT, phone)
+        return ConversationContext.from_dict(data) if data else None
+
+    def update(self, phone: str, context: Optional[ConversationContext],
+               calls: List[Dict[str, Any]]) -> Optional[ConversationContext]:
+        """Aplica las llamadas ejecutadas en el mensaje y guarda el contexto (renueva el TTL)."""
+        if not calls:
+            return context
+        context = context or ConversationContext()
+        for call in calls:
+            context.apply(call.get("tool", ""), call.get("args") or {})
+        self._store.set(NS_CONTEXT, phone, context.to_dict(), self._ttl_s)
+        return context
@@ -0,0 +1,80 @@
+"""
+Plazo (deadline) por mensaje, propagado por contextvar a todo el pipeline.
+
+El webhook crea un Deadline por mensaje al recibirlo. Los clientes de HA, de
+WhatsApp y del LLM recortan su timeout a lo que queda (`clamp_timeout`), y
+`run_with_deadline` cancela el trabajo pendiente cuando solo queda la reserva
+para mandar una respuesta de respaldo: así siempre sale alguna respuesta antes
+del límite de la plataforma (p. ej. maxDuration de Vercel).
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Respuesta de respaldo cuando el mensaje no se completó dentro del plazo
+DEADLINE_REPLY = "Se me está demorando la respuesta. Probá de nuevo en un momento 🙏"
+
+class DeadlineExceeded(Exception):
+    """No queda tiempo para completar la operación dentro del plazo del mensaje."""
+
+class Deadline:
+    __slots__ = ("expires_at",)
+
+    def __init__(self, budget_s: float):
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("message_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Segundos que quedan del plazo en curso, o None si no hay plazo."""
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+def clamp_timeout(timeout: float) -> float:
+    """El menor entre `timeout` y lo que queda del plazo; DeadlineExceeded si ya venció."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("plazo del mensaje vencido")
+    return min(timeout, left)
+
+async def run_with_deadline(awaitable: Awaitable[T], reserve_s: float = 0.0) -> T:
+    """
+    Espera `awaitable` hasta que solo queden `reserve_s` segundos del plazo;
+    entonces lo cancela y lanza DeadlineExceeded. Sin plazo, espera sin límite.
+    """
+    left = remaining()
+    if left is None:
+        return await awaitable
+    budget = left - reserve_s
+    if budget <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("sin tiempo para procesar el mensaje")
+    try:
+        return await asyncio.wait_for(awaitable, budget)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("plazo del mensaje agotado") from None
@@ -0,0 +1,26 @@
+"""
+Deduplicación de mensajes entrantes por ID de mensaje de WhatsApp.
+
+Meta reintenta los webhooks que tardan en confirmarse y a veces entrega el
+mismo mensaje dos veces. Antes de cualquier trabajo de LLM o de HA se
+consulta el ID del mensaje en el almacén de estado (con TTL). Con un
+almacén compartido (SQLite) el chequeo es atómico entre workers: un mismo
+mensaje entregado a dos procesos se procesa una sola vez.
+"""
+from typing import Optional
+from .state_store import NS_DEDUP, StateStore
+
+class MessageDeduper:
+    def __init__(self, store: StateStore, ttl_s: float = 86400.0):
+        self._store = store
+        self._ttl_s = ttl_s
+        self.suppressed = 0
+
+    def is_duplicate(self, message_id: Optional[str]) -> bool:
+        """True si el ID ya se vio (y cuenta la supresión); si no, lo registra."""
+        if not message_id:
+            return False  # sin ID no se puede deduplicar
+        if self._store.add_if_absent(NS_DEDUP, message_id, 1, self._ttl_s):
+            return False
+        self.suppressed += 1
+        return True
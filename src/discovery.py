@@ -0,0 +1,139 @@
+"""
+Descubrimiento automático de áreas y luces desde Home Assistant.
+
+Lee los registros de áreas, dispositivos y entidades por la API WebSocket y
+construye un `AreaIndex` (área → luces + alias). El índice se refresca en
+segundo plano cada `AREA_DISCOVERY_TTL_S`; las herramientas solo leen el
+índice en memoria, así que no se agrega ninguna llamada a HA por mensaje.
+"""
+import asyncio
+from typing import Dict, List, Optional, Set
+from .config import HA_BASE_URL, HA_TOKEN, AREA_DISCOVERY_TTL_S, AREA_FUZZY_MATCH
+from .ha_ws import HAWebSocket
+from .mapping import AREA_ALIASES, AREA_MAP, AreaIndex, fold_text, set_area_index
+
+def build_area_index(areas: List[dict], devices: List[dict], entities: List[dict],
+                     domain: str = "light") -> AreaIndex:
+    """Construye el índice a partir de los registros de HA."""
+    device_area = {d["id"]: d.get("area_id") for d in devices if d.get("id")}
+    area_names: Dict[str, str] = {}
+    aliases: Dict[str, Set[str]] = {}
+    for area in areas:
+        area_id = area.get("area_id")
+        if not area_id:
+            continue
+        canonical = fold_text(area.get("name") or area_id).strip()
+        area_names[area_id] = canonical
+        aliases.setdefault(canonical, set()).update([area_id, *(area.get("aliases") or [])])
+
+    area_map: Dict[str, List[str]] = {}
+    prefix = f"{domain}."
+    for entity in entities:
+        entity_id = entity.get("entity_id", "")
+        if not entity_id.startswith(prefix) or entity.get("disabled_by") or entity.get("hidden_by"):
+            continue
+        # El área de la entidad tiene prioridad sobre la de su dispositivo
+        area_id = entity.get("area_id") or device_area.get(entity.get("device_id"))
+        canonical = area_names.get(area_id)
+        if canonical:
+            area_map.setdefault(canonical, []).append(entity_id)
+
+    # Conservar los nombres y alias de mapping.py (los usan el área por defecto,
+    # las escenas y el fast path) sobre el área de HA que les corresponda
+    for static_area in AREA_MAP:
+        canonical = _match_static_area(static_area, area_map, aliases)
+        if canonical is not None:
+            aliases.setdefault(canonical, set()).update([static_area, *AREA_ALIASES.get(static_area, [])])
+
+    return AreaIndex(area_map, aliases, fuzzy=AREA_FUZZY_MATCH, source="home_assistant")
+
+def _match_static_area(static_area: str, area_map: Dict[str, List[str]],
+                       aliases: Dict[str, Set[str]]) -> Optional[str]:
+    """
+    Área descubierta que corresponde a un área de mapping.py: la del mismo
+    nombre, la que tiene su nombre o un alias como area_id/alias en HA, o la
+    que comparte más luces con ella. None si no hay ninguna.
+    """
+    variants = {fold_text(v).strip() for v in [static_area, *AREA_ALIASES.get(static_area, [])]}
+    if fold_text(static_area).strip() in area_map:
+        return fold_text(static_area).strip()
+    for canonical in area_map:
+        if variants & {fold_text(a).strip() for a in aliases.get(canonical, ())}:
+            return canonical
+    static_entities = set(AREA_MAP[static_area])
+    shared = [(len(static_entities & set(entities)), canonical) for canonical, entities in area_map.items()]
+    count, canonical = max(shared, default=(0, None))
+    return canonical if count else None
+
+async def fetch_area_index(ws: HAWebSocket, timeout: float = 30.0) -> AreaIndex:
+    """Pide los tres registros en paralelo sobre la misma conexión."""
+    areas, devices, entities = await asyncio.gather(
+        ws.command({"type": "config/area_registry/list"}, timeout=timeout),
+        ws.command({"type": "config/device_registry/list"}, timeout=timeout),
+        ws.command({"type": "config/entity_registry/list"}, timeout=timeout),
+    )
+    return build_area_index(areas or [], devices or [], entities or [])
+
+class AreaIndexRefresher:
+    def __init__(self, base_url: str = HA_BASE_URL, token: str = HA_TOKEN, ttl_s: float = AREA_DISCOVERY_TTL_S):
+        if not base_url:
+            raise ValueError("HA_BASE_URL no está configurado en .env")
+        if not token:
+            raise ValueError("HA_TOKEN no está configurado en .env")
+        self._base_url = base_url
+        self._token = token
+        self._ttl_s = ttl_s
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> AreaIndex:
+        """Descarga los registros y publica el nuevo índice."""
+        ws = HAWebSocket(self._base_url, self._token)
+        try:
+            await ws.connect()
+            index = await fetch_area_index(ws)
+        finally:
+            await ws.close()
+        if not index.areas:
+            raise ValueError("Home Assistant no devolvió áreas con luces; se mantiene el índice actual")
+        set_area_index(index)
+        total = sum(len(v) for v in index.areas.values())
+        print(f"Índice de áreas actualizado desde HA: {len(index.areas)} áreas, {total} luces")
+        return index
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            delay = self._ttl_s
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error descubriendo áreas en Home Assistant: {e}")
+                delay = min(self._ttl_s, 60.0)  # reintentar antes si falló
+            await asyncio.sleep(delay)
+
+area_refresher: Optional[AreaIndexRefresher] = None
+
+def start_area_discovery():
+    """Arranca el refresco periódico del índice (se llama en el arranque de la app)."""
+    global area_refresher
+    if area_refresher is None:
+        area_refresher = AreaIndexRefresher()
+    area_refresher.start()
+
+async def stop_area_discovery():
+    if area_refresher is not None:
+        await area_refresher.stop()
@@ -0,0 +1,256 @@
+"""
+Fast path determinístico para los comandos de luces más comunes.
+
+Frases como "prendé el living al 50%", "apagá la cocina", "poné la pieza en azul",
+"apagá todo" o "modo cine" se traducen directamente a una llamada a herramienta,
+sin pasar por el LLM.
+Si el mensaje tiene cualquier palabra que el parser no reconoce, o un número
+sin marca de brillo ("%", "por ciento" o "al N" al final), no se arriesga:
+devuelve None y el mensaje sigue por el agente.
+Con el contexto del remitente (ver conversation.py) también resuelve
+seguimientos: "subile un poco más", "y la cocina también", "apagala".
+"""
+import re
+from typing import Any, Dict, Optional
+from .conversation import OFF, ConversationContext
+from .mapping import ALL_AREAS_WORDS, COLOR_MAP, SCENE_MAP, fold_text, get_default_area, normalize_area
+from .tools import run_tool_call
+
+_TOKEN_RE = re.compile(r"\d+|[a-z]+|%|\?")
+
+_ON_RE = re.compile(r"^(prend|encend)[a-z]*$")
+_OFF_RE = re.compile(r"^apag[a-z]*$")
+_SET_WORDS = {
+    "pone", "pon", "ponele", "ponelas", "ponela", "poneme",
+    "subi", "subile", "subime", "sube",
+    "baja", "bajale", "bajame",
+    "deja", "dejala", "dejalas", "ajusta", "ajustale", "activa", "activame",
+}
+_UP_WORDS = {"subi", "subile", "subime", "sube"}
+_DOWN_WORDS = {"baja", "bajale", "bajame"}
+_MORE_WORDS = {"mas"}
+_LESS_WORDS = {"menos"}
+_SMALL_WORDS = {"poco", "poquito", "toque", "toquecito"}
+_STATE_WORDS = {"esta", "estan", "estado", "como", "que"}
+
+# Cortesías que pueden cerrar la frase después de "al N" ("al 50 por favor")
+_COURTESY_WORDS = {"por", "favor", "porfa", "porfis", "che", "dale"}
+
+# Cuánto sube o baja el brillo un "más"/"menos" sin número (un "poco": la mitad)
+_RELATIVE_STEP = 20
+
+# Palabras de relleno que no cambian el significado del comando
+_FILLER = {
+    "la", "las", "el", "los", "lo", "luz", "luces", "lampara", "lamparas",
+    "de", "del", "en", "al", "a", "con", "por", "favor", "porfa", "porfis",
+    "ciento", "porciento", "%", "brillo", "color", "colores", "me", "che", "dale",
+    "y", "tambien", "escena", "modo", "un",
+}
+
+# Colores en forma plegada ("cálida" → "calida") → clave canónica de COLOR_MAP
+_COLORS = {fold_text(name): name for name in COLOR_MAP}
+_SCENES = {fold_text(name): name for name in SCENE_MAP}
+_ALL_AREAS = {w for w in ALL_AREAS_WORDS if " " not in w}
+
+# Palabras que remiten al pedido anterior ("ahora más", "también", "esa")
+_ANAPHORA_WORDS = _MORE_WORDS | _LESS_WORDS | {
+    "tambien", "ahora", "igual", "mismo", "misma", "mismas", "mismos", "otra", "otro",
+    "ese", "esa", "esos", "esas", "eso", "aca", "ahi", "alla", "ella", "ellas",
+}
+# Verbo con pronombre pegado: "apagala", "subile", "ponelas"
+_CLITIC_RE = re.compile(r"^(prend|encend|apag|pon|sub|baj|dej|ajust)[a-z]*(la|las|lo|los|le|les)$")
+
+FASTPATH_STATS = {"hits": 0, "misses": 0}
+
+def _is_brightness(tokens, i: int) -> bool:
+    """
+    El número en tokens[i] es un brillo solo con una marca explícita: "50%",
+    "50 por ciento" o "al 50" al final de la frase. "a las 8", "las 2 luces"
+    o "en 10" no lo son (horas, cantidades): esos mensajes van al agente.
+    """
+    after = tokens[i + 1:]
+    if after[:1] in (["%"], ["porciento"]) or after[:2] == ["por", "ciento"]:
+        return True
+    return i > 0 and tokens[i - 1] == "al" and all(t in _COURTESY_WORDS for t in after)
+
+def uses_context(text: str) -> bool:
+    """
+    Si el significado del mensaje depende del pedido anterior: tiene una
+    anáfora ("subile", "ahora más", "y la cocina también", "esa") o no nombra
+    ningún área ni escena. "prendé la cocina" se entiende solo y no depende.
+    """
+    tokens = _TOKEN_RE.findall(fold_text(text or ""))
+    names_target = relative = False
+    for tok in tokens:
+        if tok in _ANAPHORA_WORDS or _CLITIC_RE.match(tok):
+            return True
+        if tok in _UP_WORDS or tok in _DOWN_WORDS:
+            relative = True  # "bajá la cocina" sin número: sobre el último brillo
+        elif tok in _ALL_AREAS or tok in _SCENES or (not tok.isdigit() and normalize_area(tok) is not None):
+            names_target = True
+    if relative and not any(tok.isdigit() for tok in tokens):
+        return True
+    return not names_target
+
+def parse_command(text: str, context: Optional[ConversationContext] = None) -> Optional[Dict[str, Any]]:
+    """
+    Interpreta un comando simple de luces.
+    Retorna {"tool": nombre, "args": {...}} o None si no hay una lectura segura.
+    context: último pedido del remitente. Sin área en el texto se usan las del
+    contexto; sin acción ("y la cocina también") se repite la última; "más" y
+    "menos" sin número se resuelven sobre el último brillo.
+    """
+    if not text:
+        return None
+    tokens = _TOKEN_RE.findall(fold_text(text))
+    if not tokens:
+        return None
+
+    actions = set()
+    areas = []
+    scenes = []
+    colors = []
+    numbers = []
+    is_question = False
+    direction = 0  # +1 subir, -1 bajar (relativo)
+    more = less = small = False
+    for i, tok in enumerate(tokens):
+        if tok == "?" or tok in _STATE_WORDS:
+            is_question = True
+        elif tok.isdigit():
+            if not _is_brightness(tokens, i):
+                return None  # número sin marca de brillo: que decida el agente
+            numbers.append(int(tok))
+        elif tok in _COLORS:
+            colors.append(_COLORS[tok])
+        elif tok in _SCENES:
+            scenes.append(_SCENES[tok])
+        elif tok in _ALL_AREAS:
+            areas.append("todo")
+        elif _ON_RE.match(tok):
+            actions.add("on")
+        elif _OFF_RE.match(tok):
+            actions.add("off")
+        elif tok in _SET_WORDS:
+            actions.add("set")
+            if tok in _UP_WORDS:
+                direction = 1
+            elif tok in _DOWN_WORDS:
+                direction = -1
+        elif tok in _MORE_WORDS:
+            more = True
+        elif tok in _LESS_WORDS:
+            less = True
+        elif tok in _SMALL_WORDS:
+            small = True
+        elif tok in _FILLER:
+            continue
+        else:
+            area = normalize_area(tok)
+            if area is None:
+                return None  # palabra desconocida: que decida el agente
+            areas.append(area)
+
+    if len(colors) > 1 or len(numbers) > 1 or len(scenes) > 1:
+        return None
+    areas = list(dict.fromkeys(areas))  # sin repetidos, en orden
+    # "bajale un poco más": la palabra de acción manda sobre "más"/"menos"
+    direction = direction or (-1 if less else 1 if more else 0)
+    if (more or less) and (numbers or actions - {"set"}):
+        return None  # "20 más", "apagá más": sin lectura segura
+    if small and not direction:
+        return None  # "prendé un poco la luz": ambiguo
+    if direction:
+        actions.add("set")
+
+    if context is not None and not scenes:
+        if not areas and context.areas:
+            areas = list(context.areas)  # "apagala", "subile": las áreas del último pedido
+        if not actions and not is_question and context.action:
+            # "y la cocina también": repetir la última acción (con su brillo y color)
+            actions.add(context.action)
+            if context.action != OFF:
+                if not numbers and context.brightness is not None:
+                    numbers = [context.brightness]
+                if not colors and context.color:
+                    colors = [context.color]
+
+    # Brillo relativo sin número: sobre el último brillo de esas mismas áreas
+    if direction and not numbers and not colors and context is not None \
+            and context.brightness is not None and areas == context.areas:
+        step = _RELATIVE_STEP // 2 if small else _RELATIVE_STEP
+        numbers = [max(1, min(100, context.brightness + direction * step))]
+    multi = len(areas) > 1 or "todo" in areas
+    area = areas[0] if areas else None
+    color = colors[0] if colors else None
+    brightness = numbers[0] if numbers else None
+    if brightness is not None and not 0 <= brightness <= 100:
+        return None
+
+    # "¿está prendida la cocina?": consulta de estado (requiere área explícita)
+    if is_question:
+        if area is None or multi or numbers or colors or scenes:
+            return None
+        return {"tool": "get_light_state", "args": {"area": area}}
+
+    # "modo cine", "activá la escena noche"
+    if scenes:
+        if areas or numbers or colors or actions - {"on", "set"}:
+            return None
+        return {"tool": "activate_scene", "args": {"scene": scenes[0]}}
+
+    if len(actions) != 1:
+        return None
+    action = actions.pop()
+    area = area or get_default_area()
+
+    # Varias áreas o "todo": una sola llamada con todas las luces
+    if multi:
+        if action == "off":
+            if brightness is not None or color:
+                return None
+            return {"tool": "turn_off_areas", "args": {"areas": areas}}
+        if action == "set" and brightness is None and not color:
+            return None
+        args: Dict[str, Any] = {"areas": areas}
+        if brightness is not None:
+            args["brightness"] = brightness
+        if color:
+            args["color"] = color
+        return {"tool": "turn_on_areas", "args": args}
+
+    if action == "off":
+        if brightness is not None or color:
+            return None
+        return {"tool": "turn_off_lights", "args": {"area": area}}
+
+    if action == "set" and brightness is not None and not color:
+        return {"tool": "set_brightness", "args": {"area": area, "brightness": brightness}}
+
+    if action == "set" and not color:
+        return None  # "subí la luz" sin valor: ambiguo
+
+    args = {"area": area}
+    if brightness is not None:
+        args["brightness"] = brightness
+    if color:
+        args["color"] = color
+    return {"tool": "turn_on_lights", "args": args}
+
+async def try_fast_path(text: str, context: Optional[ConversationContext] = None) -> Optional[str]:
+    """
+    Ejecuta el comando directamente si el parser lo reconoce.
+    Retorna la respuesta para el usuario, o None si hay que usar el agente.
+    """
+    command = parse_command(text, context)
+    if command is None:
+        FASTPATH_STATS["misses"] += 1
+        return None
+    FASTPATH_STATS["hits"] += 1
+    return await run_tool_call(command["tool"], command["args"])
+
+def fastpath_stats() -> Dict[str, Any]:
+    """Aciertos/fallos del fast path y fracción de mensajes resueltos sin LLM."""
+    total = FASTPATH_STATS["hits"] + FASTPATH_STATS["misses"]
+    ratio = FASTPATH_STATS["hits"] / total if total else 0.0
+    return {**FASTPATH_STATS, "total": total, "hit_ratio": round(ratio, 4)}
@@ -1,60 +1,116 @@
+import asyncio
+from typing import Optional
 import httpx
-from .config import HA_BASE_URL, HA_TOKEN, HA_TIMEOUT_MS
+from .config import HA_BASE_URL, HA_TOKEN, HA_TIMEOUT_MS, HA_TRANSPORT
+from .http_pool import HA_POOL, get_client
+from .ha_ws import HACommandChannel, HAWebSocketClosed
+from .metrics import count, timed
+from .deadline import clamp_timeout
 
 class HAClient:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, base_url: Optional[str] = None,
+                 token: Optional[str] = None, pool: str = HA_POOL, transport: Optional[str] = None):
+        """
+        client: pool HTTP a usar. Si no se indica, se usa el pool compartido
+        `pool` (ver `http_pool`), que mantiene las conexiones abiertas.
+        base_url/token: instancia de HA (por defecto HA_BASE_URL/HA_TOKEN; cada
+        hogar de tenants.py pasa los suyos y su propio pool).
+        transport: "rest" o "websocket" para call_service (por defecto HA_TRANSPORT).
+        """
+        base_url = base_url if base_url is not None else HA_BASE_URL
+        token = token if token is not None else HA_TOKEN
         # Validar configuración al inicializar
-        if not HA_BASE_URL:
+        if not base_url:
             raise ValueError("HA_BASE_URL no está configurado en .env")
-        if not HA_TOKEN:
+        if not token:
             raise ValueError("HA_TOKEN no está configurado en .env")
-        
+
         self._headers = {
-            "Authorization": f"Bearer {HA_TOKEN}",
+            "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
         self._timeout = HA_TIMEOUT_MS / 1000.0
-        self._base_url = HA_BASE_URL.rstrip("/")
+        self._base_url = base_url.rstrip("/")
+        self._client = client
+        self._pool = pool
+        transport = transport or HA_TRANSPORT
+        if transport not in ("rest", "websocket"):
+            raise ValueError(f"HA_TRANSPORT desconocido: {transport}")
+        self._channel = HACommandChannel(base_url, token) if transport == "websocket" else None
+        self.ws_fallbacks = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is not None and not self._client.is_closed:
+            return self._client
+        return get_client(self._pool)
 
     async def call_service(self, domain: str, service: str, data: dict):
-        """Llama a un servicio de Home Assistant."""
+        """
+        Llama a un servicio de Home Assistant. Por REST retorna los estados que
+        cambiaron; por WebSocket HA no los informa y retorna una lista vacía.
+        """
+        if self._channel is not None:
+            try:
+                return await self._call_service_ws(domain, service, data)
+            except HAWebSocketClosed as e:
+                # Las llamadas de luces son idempotentes: repetirla por REST es seguro
+                self.ws_fallbacks += 1
+                print(f"WebSocket de Home Assistant no disponible, usando REST: {e}")
+        return await self._call_service_rest(domain, service, data)
+
+    async def _call_service_ws(self, domain: str, service: str, data: dict) -> list:
+        service_data = {k: v for k, v in data.items() if k != "entity_id"}
+        payload = {"type": "call_service", "domain": domain, "service": service, "service_data": service_data}
+        if "entity_id" in data:
+            payload["target"] = {"entity_id": data["entity_id"]}
+        count("ha_calls")
+        try:
+            with timed("ha"):
+                await self._channel.command(payload, timeout=clamp_timeout(self._timeout))
+        except asyncio.TimeoutError:
+            print(f"Timeout llamando servicio {domain}.{service} por WebSocket")
+            raise
+        return []
+
+    async def _call_service_rest(self, domain: str, service: str, data: dict):
         url = f"{self._base_url}/api/services/{domain}/{service}"
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
+        count("ha_calls")
+        try:
+            with timed("ha"):
+                r = await self._http().post(url, headers=self._headers, json=data, timeout=clamp_timeout(self._timeout))
+            r.raise_for_status()
+            return r.json()
+        except httpx.HTTPStatusError as e:
+            error_msg = f"Error {e.response.status_code}"
             try:
-                r = await client.post(url, headers=self._headers, json=data)
-                r.raise_for_status()
-                return r.json()
-            except httpx.HTTPStatusError as e:
-                error_msg = f"Error {e.response.status_code}"
-                try:
-                    error_body = e.response.json()
-                    error_msg += f": {error_body}"
-                except:
-                    error_msg += f": {e.response.text}"
-                print(f"Error llamando servicio {domain}.{service}: {error_msg}")
-                raise
-            except httpx.RequestError as e:
-                print(f"Error de conexión con Home Assistant: {e}")
-                raise
+                error_body = e.response.json()
+                error_msg += f": {error_body}"
+            except:
+                error_msg += f": {e.response.text}"
+            print(f"Error llamando servicio {domain}.{service}: {error_msg}")
+            raise
+        except httpx.RequestError as e:
+            print(f"Error de conexión con Home Assistant: {e}")
+            raise
 
     async def get_state(self, entity_id: str):
         """Obtiene el estado de una entidad de Home Assistant."""
         url = f"{self._base_url}/api/states/{entity_id}"
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
+        count("ha_calls")
+        try:
+            with timed("ha"):
+                r = await self._http().get(url, headers=self._headers, timeout=clamp_timeout(self._timeout))
+            r.raise_for_status()
+            return r.json()
+        except httpx.HTTPStatusError as e:
+            error_msg = f"Error {e.response.status_code}"
             try:
-                r = await client.get(url, headers=self._headers)
-                r.raise_for_status()
-                return r.json()
-            except httpx.HTTPStatusError as e:
-                error_msg = f"Error {e.response.status_code}"
-                try:
-                    error_body = e.response.json()
-                    error_msg += f": {error_body}"
-                except:
-                    error_msg += f": {e.response.text}"
-                print(f"Error obteniendo estado de {entity_id}: {error_msg}")
-                raise
-            except httpx.RequestError as e:
-                print(f"Error de conexión con Home Assistant: {e}")
-                raise
-
+                error_body = e.response.json()
+                error_msg += f": {error_body}"
+            except:
+                error_msg += f": {e.response.text}"
+            print(f"Error obteniendo estado de {entity_id}: {error_msg}")
+            raise
+        except httpx.RequestError as e:
+            print(f"Error de conexión con Home Assistant: {e}")
+            raise
@@ -0,0 +1,110 @@
+"""
+Espejo en memoria de los estados de Home Assistant.
+
+Carga una vez los estados `light.*` y los mantiene al día escuchando los
+eventos `state_changed` de la API WebSocket. Si la conexión se cae, reconecta
+con backoff y vuelve a sincronizar. Mientras no está sincronizado, `get` devuelve
+None y los llamadores consultan por REST como siempre.
+"""
+import asyncio
+from typing import Dict, Optional
+from .config import HA_BASE_URL, HA_TOKEN
+from .ha_ws import HAWebSocket
+
+class StateMirror:
+    def __init__(self, base_url: str = HA_BASE_URL, token: str = HA_TOKEN, domain: str = "light"):
+        if not base_url:
+            raise ValueError("HA_BASE_URL no está configurado en .env")
+        if not token:
+            raise ValueError("HA_TOKEN no está configurado en .env")
+        self._base_url = base_url
+        self._token = token
+        self._prefix = f"{domain}."
+        self._states: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._ws: Optional[HAWebSocket] = None
+        self.ready = False
+
+    def get(self, entity_id: str) -> Optional[dict]:
+        """Estado espejado de la entidad, o None si el espejo no está sincronizado."""
+        if not self.ready:
+            return None
+        return self._states.get(entity_id)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+    def _on_event(self, event: dict):
+        data = event.get("data", {})
+        entity_id = data.get("entity_id", "")
+        if not entity_id.startswith(self._prefix):
+            return
+        new_state = data.get("new_state")
+        if new_state is None:
+            self._states.pop(entity_id, None)  # entidad eliminada
+        else:
+            self._states[entity_id] = new_state
+
+    def _load_snapshot(self, states: list):
+        snapshot = {s["entity_id"]: s for s in states if s.get("entity_id", "").startswith(self._prefix)}
+        # Un evento recibido tras suscribirse puede ser más nuevo que la foto
+        for entity_id, current in self._states.items():
+            loaded = snapshot.get(entity_id)
+            if loaded and current.get("last_updated", "") > loaded.get("last_updated", ""):
+                snapshot[entity_id] = current
+        self._states = snapshot
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            self._states = {}
+            self._ws = HAWebSocket(self._base_url, self._token)
+            try:
+                await self._ws.connect()
+                # Suscribirse antes de cargar para no perder cambios intermedios
+                await self._ws.subscribe_events("state_changed", self._on_event, timeout=10)
+                states = await self._ws.command({"type": "get_states"}, timeout=30)
+                self._load_snapshot(states or [])
+                self.ready = True
+                backoff = 1.0
+                print(f"Espejo de estados sincronizado ({len(self._states)} entidades {self._prefix}*)")
+                await self._ws.wait_closed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error en el espejo de estados de Home Assistant: {e}")
+            finally:
+                self.ready = False
+                await self._ws.close()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+state_mirror: Optional[StateMirror] = None
+
+def start_state_mirror():
+    """Arranca el espejo global (se llama en el arranque de la app)."""
+    global state_mirror
+    if state_mirror is None:
+        state_mirror = StateMirror()
+    state_mirror.start()
+
+async def stop_state_mirror():
+    if state_mirror is not None:
+        await state_mirror.stop()
+
+def get_mirrored_state(entity_id: str) -> Optional[dict]:
+    """Estado desde memoria si el espejo está activo y sincronizado; si no, None."""
+    if state_mirror is None:
+        return None
+    return state_mirror.get(entity_id)
@@ -0,0 +1,227 @@
+"""
+Cliente mínimo de la API WebSocket de Home Assistant.
+
+Una conexión autenticada por instancia: los comandos se envían con un `id`
+incremental y las respuestas se emparejan por ese id, así que puede haber
+varios comandos en vuelo a la vez. Los eventos de las suscripciones se
+entregan a un callback.
+
+HACommandChannel mantiene una de esas conexiones abierta para mandar comandos
+(HA_TRANSPORT=websocket): reconecta sola en el siguiente comando y, mientras
+no puede conectar, falla rápido con HAWebSocketClosed para que el llamador
+use REST.
+"""
+import asyncio
+import itertools
+import json
+import time
+import weakref
+from typing import Any, Callable, Dict, Optional
+
+EventCallback = Callable[[dict], None]
+
+class HAWebSocketError(Exception):
+    """Error devuelto por Home Assistant o caída de la conexión WebSocket."""
+
+class HAWebSocketClosed(HAWebSocketError):
+    """La conexión no está disponible (no conectó o se cayó): el comando puede reintentarse por REST."""
+
+def ha_ws_url(base_url: str) -> str:
+    """Convierte la URL base de HA (http/https) en la URL de su API WebSocket."""
+    base = base_url.rstrip("/")
+    if base.startswith("https://"):
+        base = "wss://" + base[len("https://"):]
+    elif base.startswith("http://"):
+        base = "ws://" + base[len("http://"):]
+    return f"{base}/api/websocket"
+
+class HAWebSocket:
+    def __init__(self, base_url: str, token: str, open_timeout: float = 10.0):
+        self._url = ha_ws_url(base_url)
+        self._token = token
+        self._open_timeout = open_timeout
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._subscriptions: Dict[int, EventCallback] = {}
+        self._closed = asyncio.Event()
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and not self._closed.is_set()
+
+    async def connect(self):
+        """Abre la conexión y completa el handshake de autenticación."""
+        try:
+            import websockets
+        except ImportError as e:
+            raise HAWebSocketError("Falta el paquete 'websockets' (pip install websockets)") from e
+
+        self._ws = await websockets.connect(self._url, open_timeout=self._open_timeout, max_size=None)
+        try:
+            hello = json.loads(await asyncio.wait_for(self._ws.recv(), self._open_timeout))
+            if hello.get("type") != "auth_required":
+                raise HAWebSocketError(f"Respuesta inesperada de HA: {hello}")
+            await self._ws.send(json.dumps({"type": "auth", "access_token": self._token}))
+            auth = json.loads(await asyncio.wait_for(self._ws.recv(), self._open_timeout))
+            if auth.get("type") != "auth_ok":
+                raise HAWebSocketError(f"Autenticación WebSocket rechazada: {auth.get('message', auth)}")
+        except BaseException:
+            await self._ws.close()
+            self._closed.set()
+            raise
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def command(self, payload: dict, timeout: Optional[float] = None) -> Any:
+        """Envía un comando y espera su resultado (emparejado por id)."""
+        if not self.connected:
+            raise HAWebSocketClosed("WebSocket de Home Assistant no conectado")
+        msg_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = future
+        try:
+            try:
+                await self._ws.send(json.dumps({**payload, "id": msg_id}))
+            except Exception as e:
+                raise HAWebSocketClosed(f"No se pudo enviar el comando: {e}") from e
+            msg = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(msg_id, None)
+        if not msg.get("success", False):
+            error = msg.get("error") or {}
+            raise HAWebSocketError(f"{error.get('code', 'error')}: {error.get('message', msg)}")
+        return msg.get("result")
+
+    async def subscribe_events(self, event_type: str, callback: EventCallback, timeout: Optional[float] = None) -> int:
+        """Se suscribe a un tipo de evento; cada evento se pasa a `callback`."""
+        if not self.connected:
+            raise HAWebSocketError("WebSocket de Home Assistant no conectado")
+        msg_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = future
+        self._subscriptions[msg_id] = callback
+        try:
+            await self._ws.send(json.dumps({"id": msg_id, "type": "subscribe_events", "event_type": event_type}))
+            msg = await asyncio.wait_for(future, timeout)
+        except BaseException:
+            self._subscriptions.pop(msg_id, None)
+            raise
+        finally:
+            self._pending.pop(msg_id, None)
+        if not msg.get("success", False):
+            self._subscriptions.pop(msg_id, None)
+            raise HAWebSocketError(f"No se pudo suscribir a {event_type}: {msg.get('error')}")
+        return msg_id
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    async def close(self):
+        if self._ws is not None:
+            try:
+                await self._ws.close()
+            except Exception:
+                pass
+        if self._reader is not None:
+            try:
+                await self._reader
+            except BaseException:
+                pass
+        self._closed.set()
+
+    def _dispatch(self, msg: dict):
+        msg_type = msg.get("type")
+        msg_id = msg.get("id")
+        if msg_type == "result":
+            future = self._pending.get(msg_id)
+            if future is not None and not future.done():
+                future.set_result(msg)
+        elif msg_type == "event":
+            callback = self._subscriptions.get(msg_id)
+            if callback is not None:
+                try:
+                    callback(msg.get("event", {}))
+                except Exception as e:
+                    print(f"Error procesando evento de Home Assistant: {e}")
+
+    async def _read_loop(self):
+        try:
+            async for raw in self._ws:
+                data = json.loads(raw)
+                # HA puede agrupar varios mensajes en una lista
+                for msg in data if isinstance(data, list) else [data]:
+                    self._dispatch(msg)
+        except Exception as e:
+            print(f"Conexión WebSocket con Home Assistant cerrada: {e}")
+        finally:
+            self._closed.set()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(HAWebSocketClosed("Conexión WebSocket cerrada"))
+
+# Canales abiertos, para cerrarlos al apagar la app (ver close_channels)
+_channels: "weakref.WeakSet[HACommandChannel]" = weakref.WeakSet()
+
+class HACommandChannel:
+    """
+    Conexión persistente para comandos, abierta en el primer uso. Si se cae,
+    el siguiente comando reconecta; si conectar falla, durante `retry_after_s`
+    los comandos fallan al instante (HAWebSocketClosed) sin reintentar.
+    """
+    def __init__(self, base_url: str, token: str, open_timeout: float = 5.0, retry_after_s: float = 5.0):
+        self._base_url = base_url
+        self._token = token
+        self._open_timeout = open_timeout
+        self._retry_after_s = retry_after_s
+        self._ws: Optional[HAWebSocket] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._down_until = 0.0
+        self.connects = 0
+        self.failures = 0
+        _channels.add(self)
+
+    def _connection_lock(self) -> asyncio.Lock:
+        # En serverless cada invocación puede traer un event loop nuevo: la conexión vieja no sirve
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+            self._ws = None
+        return self._lock
+
+    async def _connection(self) -> HAWebSocket:
+        lock = self._connection_lock()
+        if self._ws is not None and self._ws.connected:
+            return self._ws
+        async with lock:
+            if self._ws is not None and self._ws.connected:
+                return self._ws
+            if time.monotonic() < self._down_until:
+                raise HAWebSocketClosed("WebSocket de Home Assistant caído, reintento más tarde")
+            ws = HAWebSocket(self._base_url, self._token, open_timeout=self._open_timeout)
+            try:
+                await ws.connect()
+            except Exception as e:
+                self.failures += 1
+                self._down_until = time.monotonic() + self._retry_after_s
+                raise HAWebSocketClosed(f"No se pudo conectar el WebSocket de Home Assistant: {e}") from e
+            self.connects += 1
+            self._ws = ws
+            return ws
+
+    async def command(self, payload: dict, timeout: Optional[float] = None) -> Any:
+        """Envía un comando por la conexión compartida (varios pueden estar en vuelo a la vez)."""
+        ws = await self._connection()
+        return await ws.command(payload, timeout=timeout)
+
+    async def close(self):
+        if self._ws is not None:
+            ws, self._ws = self._ws, None
+            await ws.close()
+
+async def close_channels():
+    """Cierra todas las conexiones de comandos (se llama al apagar la app)."""
+    for channel in list(_channels):
+        await channel.close()
@@ -0,0 +1,85 @@
+"""
+Pools HTTP compartidos, uno por upstream (Home Assistant, Graph API de WhatsApp y,
+en AGENT_MODE=tools, la API del LLM).
+
+Cada pool es un `httpx.AsyncClient` de larga vida con keep-alive, así las
+llamadas reutilizan la conexión TCP/TLS en lugar de hacer un handshake nuevo.
+La app los abre en el arranque (lifespan) y los cierra al apagarse; si el
+lifespan está desactivado (Vercel/Mangum) se crean perezosamente en el primer uso.
+"""
+from typing import Dict
+import httpx
+from .config import (
+    HA_TIMEOUT_MS,
+    WA_TIMEOUT_S,
+    LLM_TIMEOUT_S,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY_S,
+    HTTP2_ENABLED,
+)
+
+HA_POOL = "ha"
+WA_POOL = "whatsapp"
+LLM_POOL = "llm"
+
+_TIMEOUTS = {
+    HA_POOL: HA_TIMEOUT_MS / 1000.0,
+    WA_POOL: WA_TIMEOUT_S,
+    LLM_POOL: LLM_TIMEOUT_S,
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED
+    if http2 and not _http2_available():
+        print("HTTP2_ENABLED=1 pero falta el paquete 'h2' (pip install httpx[http2]); se usa HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+    )
+    # "ha:<hogar>" usa los timeouts de "ha" (ver tenants.py)
+    timeout = _TIMEOUTS.get(name.split(":", 1)[0], 10.0)
+    return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Devuelve el pool del upstream `name`, creándolo si no existe o fue cerrado."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _build_client(name)
+        _clients[name] = client
+    return client
+
+def get_ha_http() -> httpx.AsyncClient:
+    return get_client(HA_POOL)
+
+def get_wa_http() -> httpx.AsyncClient:
+    return get_client(WA_POOL)
+
+def get_llm_http() -> httpx.AsyncClient:
+    return get_client(LLM_POOL)
+
+def open_pools():
+    """Crea los pools por adelantado (se llama en el arranque de la app)."""
+    get_ha_http()
+    get_wa_http()
+
+async def close_pools():
+    """Cierra todas las conexiones abiertas (se llama al apagar la app)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"Error cerrando pool HTTP: {e}")
@@ -0,0 +1,80 @@
+"""
+Estados de luces tal como los devuelve Home Assistant.
+
+`POST /api/services/light/<servicio>` responde con la lista de estados que
+cambiaron. Las herramientas los usan para confirmar lo que realmente quedó
+(brillo y color reales, luces que no respondieron) y los guardan en la caché
+de estados, así una consulta de estado inmediata no vuelve a pedirlos a HA.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from .mapping import COLOR_MAP
+
+# (atributo, valor) de COLOR_MAP → primer nombre de color ("blanco" antes que "blanca")
+_COLOR_NAMES: Dict[Tuple[str, Any], str] = {}
+for _name, _params in COLOR_MAP.items():
+    for _attr, _value in _params.items():
+        _COLOR_NAMES.setdefault((_attr, tuple(_value) if isinstance(_value, list) else _value), _name)
+
+def changed_states(response: Any) -> List[dict]:
+    """
+    Estados de la respuesta de call_service: una lista, o {"changed_states": [...]}
+    si se pidió `return_response`. Ignora lo que no tenga entity_id.
+    """
+    if isinstance(response, dict):
+        response = response.get("changed_states")
+    if not isinstance(response, list):
+        return []
+    return [s for s in response if isinstance(s, dict) and s.get("entity_id")]
+
+def color_name(attributes: Dict[str, Any]) -> Optional[str]:
+    """Nombre del color actual según COLOR_MAP, o su valor crudo si no tiene nombre."""
+    mode = attributes.get("color_mode")
+    kelvin = attributes.get("color_temp_kelvin")
+    rgb = attributes.get("rgb_color")
+    # HA informa rgb_color también en modo color_temp: manda color_mode
+    if kelvin is not None and mode in (None, "color_temp"):
+        return _COLOR_NAMES.get(("color_temp_kelvin", kelvin), f"{kelvin}K")
+    if rgb:
+        rgb = tuple(rgb)
+        return _COLOR_NAMES.get(("rgb_color", rgb), "rgb({}, {}, {})".format(*rgb))
+    return None
+
+class LightState:
+    __slots__ = ("entity_id", "state", "brightness_pct", "color")
+
+    def __init__(self, entity_id: str, state: str, brightness_pct: Optional[int] = None,
+                 color: Optional[str] = None):
+        self.entity_id = entity_id
+        self.state = state
+        self.brightness_pct = brightness_pct
+        self.color = color
+
+    @classmethod
+    def from_ha(cls, raw: dict) -> "LightState":
+        attributes = raw.get("attributes") or {}
+        brightness = attributes.get("brightness")  # 0-255
+        return cls(
+            raw.get("entity_id", ""),
+            raw.get("state", "unknown"),
+            round(brightness * 100 / 255) if isinstance(brightness, (int, float)) else None,
+            color_name(attributes),
+        )
+
+    @property
+    def is_on(self) -> bool:
+        return self.state == "on"
+
+    def describe(self) -> str:
+        """"light.living => on 60% azul" (brillo y color solo si está encendida)."""
+        desc = f"{self.entity_id} => {self.state}"
+        if self.is_on:
+            if self.brightness_pct is not None:
+                desc += f" {self.brightness_pct}%"
+            if self.color:
+                desc += f" {self.color}"
+        return desc
+
+def common_value(values: List[Any]) -> Optional[Any]:
+    """El valor si todas las luces coinciden (y no es None); si no, None."""
+    distinct = set(values)
+    return distinct.pop() if len(distinct) == 1 else None
@@ -1,6 +1,15 @@
-from typing import List, Optional, Dict
+import difflib
+import hashlib
+import itertools
+import json
+import unicodedata
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterable, Iterator, List, Optional, Dict, Tuple
+from .config import AREA_FUZZY_MATCH, DEFAULT_AREA
 
-# Mapeo MVP: área → lista de entity_ids (luego puedes auto-descubrir desde HA)
+# Mapeo estático: área → lista de entity_ids (con AREA_DISCOVERY=1 se reemplaza
+# por el índice construido desde los registros de Home Assistant, ver discovery.py)
 AREA_MAP: Dict[str, List[str]] = {
     "living": ["light.living_ceiling", "light.living_lamp"],
     "dormitorio": ["light.bedroom_ceiling"],
@@ -26,27 +35,155 @@ COLOR_MAP = {
     "verde": {"rgb_color": [0, 255, 0]},
 }
 
+# Palabras que se refieren a todas las áreas ("apagá todo")
+ALL_AREAS_WORDS = {"todo", "toda", "todos", "todas", "casa", "toda la casa", "todas las luces"}
+
+# Escenas: nombre → pasos (áreas + acción). Los pasos con los mismos parámetros
+# se agrupan en una sola llamada a Home Assistant.
+SCENE_MAP: Dict[str, List[Dict[str, Any]]] = {
+    "noche": [
+        {"areas": ["living", "cocina"], "action": "off"},
+        {"areas": ["dormitorio"], "action": "on", "brightness": 20, "color": "cálida"},
+    ],
+    "cine": [
+        {"areas": ["living"], "action": "on", "brightness": 15, "color": "cálida"},
+        {"areas": ["cocina", "dormitorio"], "action": "off"},
+    ],
+    "despertar": [
+        {"areas": ["dormitorio", "cocina"], "action": "on", "brightness": 80, "color": "fría"},
+    ],
+}
+
+def fold_text(text: str) -> str:
+    """Pasa a minúsculas y quita tildes/diacríticos ("Habitación" → "habitacion")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+_versions = itertools.count(1)
+
+class AreaIndex:
+    """
+    Índice área → luces con una tabla de alias precalculada.
+    Los alias se guardan plegados (minúsculas, sin tildes), así resolver
+    un área es una búsqueda O(1) en un dict.
+    """
+    def __init__(self, areas: Dict[str, List[str]], aliases: Optional[Dict[str, Iterable[str]]] = None,
+                 fuzzy: bool = False, source: str = "static", default_area: Optional[str] = None):
+        self.areas: Dict[str, List[str]] = {name: list(entities) for name, entities in areas.items()}
+        self.fuzzy = fuzzy
+        self.source = source
+        self.version = next(_versions)
+        self._lookup: Dict[str, str] = {}
+        for canonical in self.areas:
+            self._lookup[fold_text(canonical).strip()] = canonical
+        for canonical, variants in (aliases or {}).items():
+            if canonical not in self.areas:
+                continue
+            for variant in variants:
+                self._lookup.setdefault(fold_text(variant).strip(), canonical)
+        # El área por defecto tiene que existir en el índice (si no, "prendé la luz"
+        # apuntaría a un área sin luces): se resuelve por alias o se usa la primera
+        wanted = default_area or DEFAULT_AREA
+        self.default_area = self.resolve(wanted)
+        if self.default_area is None:
+            self.default_area = next(iter(self.areas), wanted)
+            if self.areas:
+                print(f"Área por defecto '{wanted}' no existe en el índice ({source}); se usa '{self.default_area}'")
+        # Huella del contenido: igual en todos los procesos para el mismo mapeo
+        # (la usa la caché de planes compartida como parte de la clave)
+        content = json.dumps([self.areas, self._lookup], sort_keys=True)
+        self.fingerprint = hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Nombre canónico del área para un texto/alias, o None."""
+        if not text:
+            return None
+        key = fold_text(text).strip()
+        canonical = self._lookup.get(key)
+        if canonical is not None or not self.fuzzy or len(key) < 4:
+            return canonical
+        # Coincidencia aproximada opcional (errores de tipeo: "dormitoro" → "dormitorio")
+        matches = difflib.get_close_matches(key, self._lookup.keys(), n=1, cutoff=0.85)
+        return self._lookup[matches[0]] if matches else None
+
+    def entities(self, area: str) -> List[str]:
+        entities = self.areas.get(area)
+        if entities is None:
+            canonical = self.resolve(area)
+            entities = self.areas.get(canonical, []) if canonical else []
+        return entities
+
+_area_index = AreaIndex(AREA_MAP, AREA_ALIASES, fuzzy=AREA_FUZZY_MATCH)
+
+# Índice del mensaje en curso cuando hay varios hogares (ver tenants.use_tenant)
+_scoped_index: ContextVar[Optional[AreaIndex]] = ContextVar("scoped_area_index", default=None)
+
+def get_area_index() -> AreaIndex:
+    return _scoped_index.get() or _area_index
+
+def set_area_index(index: AreaIndex):
+    """Reemplaza el índice global (lo usa el refresco en segundo plano)."""
+    global _area_index
+    _area_index = index
+
+@contextmanager
+def use_area_index(index: Optional[AreaIndex]) -> Iterator[None]:
+    """Usa `index` (en lugar del global) dentro del bloque; None = el global."""
+    token = _scoped_index.set(index)
+    try:
+        yield
+    finally:
+        _scoped_index.reset(token)
+
+def get_global_area_index() -> AreaIndex:
+    """Índice global (sin el de un hogar que esté activo en el mensaje en curso)."""
+    return _area_index
+
+def color_names() -> List[str]:
+    """Un nombre por color distinto de COLOR_MAP ("blanco", no también "blanca")."""
+    names: Dict[str, str] = {}
+    for name, params in COLOR_MAP.items():
+        names.setdefault(json.dumps(params, sort_keys=True), name)
+    return list(names.values())
+
+def get_default_area() -> str:
+    """Área por defecto del hogar en curso."""
+    return get_area_index().default_area
+
 def normalize_area(text: str) -> Optional[str]:
     """
     Normaliza un texto a un área canónica usando los alias.
     Retorna el nombre canónico del área o None si no se encuentra.
     """
-    if not text:
-        return None
-    
-    t = text.lower().strip()
-    
-    # Primero verificar si ya es un área canónica
-    if t in AREA_MAP:
-        return t
-    
-    # Buscar en los alias
-    for canonical, variants in AREA_ALIASES.items():
-        if t == canonical or any(v == t for v in variants):
-            return canonical
-    
-    return None
+    return get_area_index().resolve(text)
 
 def get_entities_for_area(area: str) -> List[str]:
-    return AREA_MAP.get(area, [])
+    return get_area_index().entities(area)
+
+def resolve_areas(names: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Resuelve varios nombres/alias a áreas canónicas, sin repetir ("todo" = todas).
+    Retorna (áreas, nombres_desconocidos).
+    """
+    index = get_area_index()
+    areas: List[str] = []
+    unknown: List[str] = []
+    for name in names:
+        if fold_text(name or "").strip() in ALL_AREAS_WORDS:
+            candidates = list(index.areas)
+        else:
+            canonical = index.resolve(name)
+            if canonical is None or not index.areas.get(canonical):
+                unknown.append(name)
+                continue
+            candidates = [canonical]
+        for area in candidates:
+            if area not in areas:
+                areas.append(area)
+    return areas, unknown
+
+def get_scene(name: str) -> Optional[List[Dict[str, Any]]]:
+    """Pasos de una escena por nombre (sin distinguir tildes ni mayúsculas)."""
+    return _SCENES.get(fold_text(name or "").strip())
 
+_SCENES = {fold_text(name): steps for name, steps in SCENE_MAP.items()}
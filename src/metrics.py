@@ -0,0 +1,233 @@
+"""
+Métricas en proceso con exposición en formato Prometheus (sin dependencias).
+
+- `timed(stage)` mide una etapa (parseo del webhook, agente, herramientas,
+  llamadas a HA, envío por WhatsApp...) en el histograma `stage_seconds` y
+  cuenta los errores por etapa y tipo de excepción.
+- `message_trace()` agrupa las etapas de un mensaje: al cerrar registra cuántos
+  pasos del LLM, llamadas a herramientas y llamadas a HA hizo ese mensaje, y
+  cuántos tokens de entrada y salida gastó (`record_tokens`, por paso).
+  Las trazas anidadas (p. ej. la del request del webhook) acumulan las etapas
+  de sus hijas, y con eso se arma el header `Server-Timing`.
+
+Todo es en memoria y O(1) por observación (búsqueda binaria en los buckets),
+así que se puede dejar activado en producción.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from .config import METRICS_ENABLED
+
+PREFIX = "wa_agent"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body.replace("\n", " ") + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.buckets = sorted(buckets)
+        # por labels: [conteo por bucket (no acumulado, el último es +Inf), suma, total]
+        self._series: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _label_key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12)
+_TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+stage_seconds = Histogram("stage_seconds", "Duración de cada etapa del procesamiento", _LATENCY_BUCKETS)
+errors_total = Counter("errors_total", "Errores por etapa y tipo de excepción")
+messages_total = Counter("messages_total", "Mensajes procesados por ruta (fastpath, plan_cache, agent, non_text)")
+tool_calls_total = Counter("tool_calls_total", "Llamadas a herramientas por nombre")
+llm_steps_per_message = Histogram("llm_steps_per_message", "Pasos del LLM por mensaje", _COUNT_BUCKETS)
+tool_calls_per_message = Histogram("tool_calls_per_message", "Llamadas a herramientas por mensaje", _COUNT_BUCKETS)
+ha_calls_per_message = Histogram("ha_calls_per_message", "Llamadas HTTP a Home Assistant por mensaje", _COUNT_BUCKETS)
+llm_tokens_total = Counter("llm_tokens_total", "Tokens del LLM por tipo (input, output, cached_input)")
+llm_tokens_per_step = Histogram("llm_tokens_per_step", "Tokens por llamada al LLM", _TOKEN_BUCKETS)
+llm_tokens_per_message = Histogram("llm_tokens_per_message", "Tokens del LLM por mensaje que llegó al agente", _TOKEN_BUCKETS)
+
+REGISTRY = [
+    stage_seconds, errors_total, messages_total, tool_calls_total,
+    llm_steps_per_message, tool_calls_per_message, ha_calls_per_message,
+    llm_tokens_total, llm_tokens_per_step, llm_tokens_per_message,
+]
+
+class Trace:
+    """Tiempos y conteos acumulados de un mensaje (o de un request del webhook)."""
+    __slots__ = ("stages", "counts", "mark")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.mark = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def merge(self, other: "Trace"):
+        for stage, seconds in other.stages.items():
+            self.add(stage, seconds)
+        for name, n in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("metrics_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+def count(name: str, amount: int = 1):
+    """Suma `amount` al conteo `name` de la traza en curso (p. ej. "ha_calls")."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.counts[name] = trace.counts.get(name, 0) + amount
+
+def record_error(stage: str, error: BaseException):
+    """Cuenta el error una sola vez, en la etapa más interna donde ocurrió."""
+    if getattr(error, "_metrics_stage", None) is not None:
+        return
+    try:
+        error._metrics_stage = stage
+    except AttributeError:
+        pass
+    errors_total.inc(stage=stage, type=type(error).__name__)
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Mide la etapa `stage` (histograma + traza en curso) y cuenta sus errores."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(stage, e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(stage, elapsed)
+
+def mark_step(stage: str = "llm_step"):
+    """
+    Registra un paso del agente: el tiempo desde el paso anterior (o desde el
+    inicio de la traza) y suma uno a "llm_steps". Lo llama el step callback del agente.
+    """
+    trace = _trace.get()
+    if not METRICS_ENABLED or trace is None:
+        return
+    now = time.perf_counter()
+    elapsed = now - trace.mark
+    trace.mark = now
+    stage_seconds.observe(elapsed, stage=stage)
+    trace.add(stage, elapsed)
+    trace.counts["llm_steps"] = trace.counts.get("llm_steps", 0) + 1
+
+def record_tokens(input_tokens: int, output_tokens: int, cached_input_tokens: int = 0):
+    """Tokens de una llamada al LLM: totales, por paso y acumulados en la traza del mensaje."""
+    if not METRICS_ENABLED:
+        return
+    trace = _trace.get()
+    for kind, tokens in (("input", input_tokens), ("output", output_tokens), ("cached_input", cached_input_tokens)):
+        if kind == "cached_input" and not tokens:
+            continue
+        llm_tokens_total.inc(tokens, kind=kind)
+        llm_tokens_per_step.observe(tokens, kind=kind)
+        if trace is not None:
+            name = f"{kind}_tokens"
+            trace.counts[name] = trace.counts.get(name, 0) + tokens
+
+@contextmanager
+def message_trace() -> Iterator[Trace]:
+    """
+    Traza de un mensaje. Al cerrar registra los conteos por mensaje y suma
+    sus etapas a la traza padre (la del request), si la hay.
+    """
+    parent = _trace.get()
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+        if METRICS_ENABLED:
+            llm_steps_per_message.observe(trace.counts.get("llm_steps", 0))
+            tool_calls_per_message.observe(trace.counts.get("tool_calls", 0))
+            ha_calls_per_message.observe(trace.counts.get("ha_calls", 0))
+            if trace.counts.get("llm_steps"):
+                for kind in ("input", "output", "cached_input"):
+                    tokens = trace.counts.get(f"{kind}_tokens")
+                    if tokens is not None:
+                        llm_tokens_per_message.observe(tokens, kind=kind)
+        if parent is not None:
+            parent.merge(trace)
+
+@contextmanager
+def request_trace() -> Iterator[Trace]:
+    """Traza de un request: junta las etapas de todos sus mensajes (para Server-Timing)."""
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+def render_metrics() -> str:
+    """Todas las métricas en formato de texto de Prometheus."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
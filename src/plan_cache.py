@@ -0,0 +1,66 @@
+"""
+Caché de planes: frase normalizada → llamadas a herramientas que hizo el agente.
+
+Los usuarios repiten las mismas frases; la primera vez decide el agente y se
+guardan sus llamadas, las siguientes se reproducen directamente sin LLM.
+Los planes viven en el almacén de estado, así que con un backend compartido
+un plan aprendido por un worker lo aprovechan todos. La clave incluye la
+huella del índice de áreas en uso (ver mapping.AreaIndex): si el mapeo
+cambia, o el hogar tiene otras áreas, los planes viejos no se usan. Si la
+frase depende del contexto de conversación (ver fastpath.uses_context), la
+clave incluye también sus slots (`scope`): "subile un poco más" no significa lo
+mismo después de "prendé el living al 40%" que después de "prendé la cocina".
+Las frases que se entienden solas comparten el plan entre remitentes.
+"""
+import re
+from typing import Any, Dict, List, Optional
+from .mapping import fold_text, get_area_index
+from .state_store import NS_PLAN, StateStore
+from .tools import run_tool_call
+
+_PUNCT_RE = re.compile(r"[.,;:!¡?¿]+")
+_SPACES_RE = re.compile(r"\s+")
+
+def normalize_utterance(text: str) -> str:
+    """Minúsculas, sin tildes ni puntuación y con los espacios colapsados."""
+    return _SPACES_RE.sub(" ", _PUNCT_RE.sub(" ", fold_text(text))).strip()
+
+class PlanCache:
+    def __init__(self, store: StateStore, ttl_s: float = 3600.0):
+        self._store = store
+        self._ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str, scope: str = "") -> str:
+        key = f"{get_area_index().fingerprint}:{normalize_utterance(text)}"
+        return f"{key}|{scope}" if scope else key
+
+    def get(self, text: str, scope: str = "") -> Optional[List[Dict[str, Any]]]:
+        plan = self._store.get(NS_PLAN, self._key(text, scope))
+        if plan is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return plan
+
+    def put(self, text: str, calls: List[Dict[str, Any]], scope: str = ""):
+        """Guarda el plan solo si el agente usó herramientas (las charlas no se cachean)."""
+        if not calls:
+            return
+        self._store.set(NS_PLAN, self._key(text, scope), [dict(c) for c in calls], self._ttl_s)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": self._store.count(NS_PLAN),
+        }
+
+async def replay_plan(plan: List[Dict[str, Any]]) -> str:
+    """Ejecuta las llamadas cacheadas en orden y arma la respuesta con sus resultados."""
+    results = [await run_tool_call(call["tool"], call["args"]) for call in plan]
+    return "\n".join(results)
@@ -0,0 +1,38 @@
+"""
+Token bucket para limitar tasas (envíos a WhatsApp, mensajes por remitente).
+
+`rate_per_s` tokens se reponen por segundo hasta `capacity` (la ráfaga máxima).
+"""
+import asyncio
+import time
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, capacity: float):
+        self.rate_per_s = max(rate_per_s, 1e-9)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Consume `tokens` si hay disponibles; no espera."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Segundos hasta que haya `tokens` disponibles."""
+        self._refill()
+        missing = tokens - self._tokens
+        return max(0.0, missing / self.rate_per_s)
+
+    async def acquire(self, tokens: float = 1.0):
+        """Espera hasta poder consumir `tokens`."""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.wait_time(tokens))
@@ -0,0 +1,174 @@
+"""
+Almacén de estado compartido (dedup, contexto por teléfono, caché de HA y de planes).
+
+Todo lo que el webhook necesita recordar entre mensajes pasa por esta interfaz,
+organizado por espacio de nombres (NS_*) y con TTL por entrada:
+- MemoryStateStore: en memoria del proceso (LRU + TTL por espacio). Es lo más
+  rápido, pero cada worker tiene el suyo y se pierde al reiniciar.
+- SQLiteStateStore: archivo SQLite local en modo WAL, compartido por todos los
+  workers de uvicorn de la máquina y persistente entre reinicios.
+
+STATE_BACKEND elige la implementación (ver get_state_store). Para escalar a
+varias máquinas alcanza con otra implementación de StateStore (p. ej. Redis).
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from .cache import TTLCache
+from .config import (
+    STATE_BACKEND, STATE_SQLITE_PATH, DEDUP_MAX_SIZE, PLAN_CACHE_SIZE, CONTEXT_MAX_SIZE,
+)
+
+NS_DEDUP = "dedup"        # IDs de mensajes ya procesados
+NS_CONTEXT = "context"    # contexto de conversación por teléfono
+NS_HA_STATE = "ha_state"  # estados de entidades leídos de HA
+NS_PLAN = "plan"          # caché de planes del agente
+
+class StateStore:
+    """Interfaz: claves str, valores serializables a JSON, TTL en segundos."""
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: float):
+        raise NotImplementedError
+
+    def add_if_absent(self, namespace: str, key: str, value: Any, ttl_s: float) -> bool:
+        """Guarda la clave solo si no existe (o venció). True si la guardó. Atómico."""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def count(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class MemoryStateStore(StateStore):
+    def __init__(self, max_sizes: Optional[Dict[str, int]] = None, default_max_size: int = 10000):
+        self._max_sizes = max_sizes or {}
+        self._default_max_size = default_max_size
+        self._spaces: Dict[str, TTLCache] = {}
+
+    def _space(self, namespace: str) -> TTLCache:
+        space = self._spaces.get(namespace)
+        if space is None:
+            size = self._max_sizes.get(namespace, self._default_max_size)
+            space = self._spaces[namespace] = TTLCache(max_size=size)
+        return space
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        return self._space(namespace).get(key)
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: float):
+        self._space(namespace).set(key, value, ttl_s=ttl_s)
+
+    def add_if_absent(self, namespace: str, key: str, value: Any, ttl_s: float) -> bool:
+        space = self._space(namespace)
+        if key in space:
+            return False
+        space.set(key, value, ttl_s=ttl_s)
+        return True
+
+    def delete(self, namespace: str, key: str):
+        self._space(namespace).pop(key)
+
+    def count(self, namespace: str) -> int:
+        return len(self._space(namespace))
+
+class SQLiteStateStore(StateStore):
+    """
+    Una tabla (namespace, key) → (valor JSON, vencimiento en epoch). WAL permite
+    lecturas concurrentes desde varios procesos mientras uno escribe; con
+    synchronous=NORMAL las escrituras no esperan un fsync cada vez.
+    """
+    _PURGE_EVERY = 1000  # escrituras entre limpiezas de entradas vencidas
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), time.time() + ttl_s),
+            )
+            self._after_write()
+
+    def add_if_absent(self, namespace: str, key: str, value: Any, ttl_s: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # Inserta, o pisa solo si la entrada existente ya venció (una sola sentencia: atómico entre procesos)
+            cursor = self._conn.execute(
+                "INSERT INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+                " WHERE state.expires_at <= ?",
+                (namespace, key, json.dumps(value), now + ttl_s, now),
+            )
+            self._after_write()
+        return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM state WHERE namespace = ? AND expires_at > ?", (namespace, time.time())
+            ).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_store: Optional[StateStore] = None
+
+def get_state_store() -> StateStore:
+    """Almacén configurado por STATE_BACKEND ("memory" o "sqlite"), creado en el primer uso."""
+    global _store
+    if _store is None:
+        if STATE_BACKEND == "sqlite":
+            _store = SQLiteStateStore(STATE_SQLITE_PATH)
+        elif STATE_BACKEND == "memory":
+            _store = MemoryStateStore({
+                NS_DEDUP: DEDUP_MAX_SIZE, NS_PLAN: PLAN_CACHE_SIZE, NS_CONTEXT: CONTEXT_MAX_SIZE,
+            })
+        else:
+            raise ValueError(f"STATE_BACKEND desconocido: {STATE_BACKEND}")
+    return _store
+
+def close_state_store():
+    """Cierra el almacén (se llama al apagar la app)."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
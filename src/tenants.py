@@ -0,0 +1,141 @@
+"""
+Varios hogares (tenants) en un mismo despliegue.
+
+TENANTS_FILE apunta a un JSON con un hogar por entrada: sus teléfonos, su
+instancia de Home Assistant, sus áreas y su área por defecto:
+
+    {"tenants": [{
+        "id": "casa-perez",
+        "phones": ["+59891234567", "+59898765432"],
+        "ha_base_url": "https://perez.ui.nabu.casa",
+        "ha_token_env": "HA_TOKEN_PEREZ",          (o "ha_token": "...")
+        "default_area": "living",
+        "areas": {"living": ["light.living"], "cocina": ["light.kitchen"]},
+        "aliases": {"living": ["sala"]}
+    }]}
+
+El registro se arma una sola vez: teléfono → hogar es un dict (O(1) por
+mensaje) y cada hogar tiene su índice de áreas precalculado y su propio
+HAClient con su pool HTTP, creado en el primer uso. Sin TENANTS_FILE todo
+sigue usando la configuración global (HA_BASE_URL, AREA_MAP, DEFAULT_AREA).
+"""
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from .config import AREA_FUZZY_MATCH, TENANTS_FILE
+from .ha_client import HAClient
+from .http_pool import HA_POOL
+from .mapping import AREA_ALIASES, AREA_MAP, AreaIndex, use_area_index
+
+def normalize_phone(phone: str) -> str:
+    """Teléfono sin espacios ni '+', como llega en el webhook ("59891234567")."""
+    return phone.strip().replace(" ", "").lstrip("+")
+
+class Tenant:
+    __slots__ = ("id", "ha_base_url", "ha_token", "area_index", "_ha")
+
+    def __init__(self, tenant_id: str, ha_base_url: str, ha_token: str, area_index: AreaIndex):
+        self.id = tenant_id
+        self.ha_base_url = ha_base_url
+        self.ha_token = ha_token
+        self.area_index = area_index
+        self._ha: Optional[HAClient] = None
+
+    @property
+    def default_area(self) -> str:
+        return self.area_index.default_area
+
+    def ha(self) -> HAClient:
+        """Cliente HA del hogar (pool HTTP propio), creado en el primer uso."""
+        if self._ha is None:
+            self._ha = HAClient(base_url=self.ha_base_url, token=self.ha_token, pool=f"{HA_POOL}:{self.id}")
+        return self._ha
+
+class TenantRegistry:
+    def __init__(self, tenants: List[Tenant], phones: Dict[str, Tenant]):
+        self.tenants = tenants
+        self._by_phone = phones
+
+    def lookup(self, phone: str) -> Optional[Tenant]:
+        return self._by_phone.get(normalize_phone(phone))
+
+    def __len__(self) -> int:
+        return len(self.tenants)
+
+def _parse_tenant(raw: Dict[str, Any]) -> Tenant:
+    tenant_id = raw.get("id")
+    if not tenant_id:
+        raise ValueError("Cada tenant necesita un 'id'")
+    base_url = (raw.get("ha_base_url") or "").rstrip("/")
+    token = raw.get("ha_token") or os.getenv(raw.get("ha_token_env") or "", "")
+    if not base_url or not token:
+        raise ValueError(f"El tenant '{tenant_id}' necesita ha_base_url y ha_token (o ha_token_env)")
+    areas = raw.get("areas") or AREA_MAP
+    aliases = raw.get("aliases") or (AREA_ALIASES if "areas" not in raw else {})
+    index = AreaIndex(areas, aliases, fuzzy=AREA_FUZZY_MATCH, source=f"tenant:{tenant_id}",
+                      default_area=raw.get("default_area"))
+    return Tenant(tenant_id, base_url, token, index)
+
+def parse_tenants(data: Dict[str, Any]) -> TenantRegistry:
+    """Arma el registro desde el JSON de TENANTS_FILE (ValueError si no es válido)."""
+    if not isinstance(data, dict) or not isinstance(data.get("tenants"), list) or not data["tenants"]:
+        raise ValueError('Se espera {"tenants": [...]} con al menos un hogar')
+    tenants: List[Tenant] = []
+    phones: Dict[str, Tenant] = {}
+    for raw in data["tenants"]:
+        if not isinstance(raw, dict):
+            raise ValueError(f"Cada tenant tiene que ser un objeto: {raw!r}")
+        tenant = _parse_tenant(raw)
+        if not isinstance(raw.get("phones"), list) or not raw["phones"]:
+            raise ValueError(f"El tenant '{tenant.id}' necesita una lista 'phones'")
+        for phone in raw["phones"]:
+            key = normalize_phone(phone)
+            if key in phones:
+                raise ValueError(f"El teléfono {phone} está en dos tenants ({phones[key].id}, {tenant.id})")
+            phones[key] = tenant
+        tenants.append(tenant)
+    return TenantRegistry(tenants, phones)
+
+def load_tenants(path: str) -> TenantRegistry:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return parse_tenants(json.load(f))
+    except (OSError, ValueError) as e:  # incluye json.JSONDecodeError
+        raise ValueError(f"TENANTS_FILE inválido ({path}): {e}") from e
+
+_registry: Optional[TenantRegistry] = None
+_loaded = False
+
+def get_registry() -> Optional[TenantRegistry]:
+    """
+    Registro de TENANTS_FILE (cargado una vez), o None si no hay varios hogares.
+    La app lo carga al importarse: un archivo inválido impide arrancar en lugar
+    de fallar (y releerse) en cada webhook.
+    """
+    global _registry, _loaded
+    if not _loaded:
+        _registry = load_tenants(TENANTS_FILE) if TENANTS_FILE else None
+        _loaded = True
+    return _registry
+
+def set_registry(registry: Optional[TenantRegistry]):
+    global _registry, _loaded
+    _registry = registry
+    _loaded = True
+
+_current: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+
+def current_tenant() -> Optional[Tenant]:
+    return _current.get()
+
+@contextmanager
+def use_tenant(tenant: Optional[Tenant]) -> Iterator[Optional[Tenant]]:
+    """Hogar del mensaje en curso: las herramientas usan su HA y su índice de áreas."""
+    token = _current.set(tenant)
+    try:
+        with use_area_index(tenant.area_index if tenant is not None else None):
+            yield tenant
+    finally:
+        _current.reset(token)
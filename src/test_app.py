@@ -2,15 +2,26 @@
 App de prueba para verificar comunicación WhatsApp + LLM.
 No usa herramientas de Home Assistant, solo prueba la conexión básica.
 """
-from typing import Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+from typing import List, Optional
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import PlainTextResponse
-from smolagents import CodeAgent
+from smolagents import CodeAgent, LiteLLMModel
 from .config import WA_VERIFY_TOKEN, ALLOWED_NUMBERS, PORT
 from .whatsapp import send_whatsapp_text
+from .http_pool import open_pools, close_pools
+from .webhook_decoder import IncomingMessage, decode_webhook, group_by_sender
 import uvicorn
 
-app = FastAPI(title="WhatsApp → LLM Test")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pools HTTP compartidos (keep-alive) durante toda la vida de la app
+    open_pools()
+    yield
+    await close_pools()
+
+app = FastAPI(title="WhatsApp → LLM Test", lifespan=lifespan)
 
 # Crear agente simple sin herramientas, solo para chat
 SYSTEM_PROMPT = """
@@ -21,9 +32,8 @@ Responde de forma corta y natural a las preguntas del usuario.
 # Agente sin herramientas, solo para probar la comunicación
 test_agent = CodeAgent(
     tools=[],  # Sin herramientas, solo chat
-    system_prompt=SYSTEM_PROMPT,
-    model="openai/gpt-4o-mini",
-    temperature=0.7,
+    instructions=SYSTEM_PROMPT,
+    model=LiteLLMModel(model_id="openai/gpt-4o-mini", temperature=0.7),
     max_steps=1,  # Solo una respuesta, sin pasos adicionales
 )
 
@@ -33,42 +43,6 @@ def is_phone_allowed(phone: str) -> bool:
         return True  # Si no hay whitelist, permitir todos
     return f"+{phone}" in ALLOWED_NUMBERS or phone in ALLOWED_NUMBERS
 
-def extract_message_from_webhook(data: dict) -> Optional[Tuple[str, Optional[str]]]:
-    """
-    Extrae el número de teléfono y el texto del mensaje desde la estructura de WhatsApp.
-    Retorna (phone, text) o None si no hay mensaje válido.
-    """
-    try:
-        entry = data.get("entry", [])
-        if not entry:
-            return None
-        
-        changes = entry[0].get("changes", [])
-        if not changes:
-            return None
-        
-        value = changes[0].get("value", {})
-        messages = value.get("messages", [])
-        if not messages:
-            return None
-        
-        msg = messages[0]
-        from_phone = msg.get("from")
-        if not from_phone:
-            return None
-        
-        msg_type = msg.get("type", "text")
-        if msg_type != "text":
-            return (from_phone, None)  # Mensaje no es texto
-        
-        text_body = msg.get("text", {}).get("body", "")
-        if not text_body:
-            return None
-        
-        return (from_phone, text_body.strip())
-    except (KeyError, IndexError, TypeError):
-        return None
-
 # Verificación de webhook (GET)
 @app.get("/webhook", response_class=PlainTextResponse)
 async def verify(mode: str = "", challenge: str = "", token: str = ""):
@@ -76,39 +50,21 @@ async def verify(mode: str = "", challenge: str = "", token: str = ""):
         return challenge
     raise HTTPException(status_code=403, detail="Verification failed")
 
-# Recepción de mensajes (POST)
-@app.post("/webhook")
-async def webhook(req: Request):
-    try:
-        data = await req.json()
-    except Exception as e:
-        print(f"Error parseando JSON del webhook: {e}")
-        return {"ok": True}
-    
-    # Extraer mensaje
-    result = extract_message_from_webhook(data)
-    if not result:
-        return {"ok": True}
-    
-    from_phone, text = result
-    
-    # Validar whitelist
-    if not is_phone_allowed(from_phone):
-        print(f"Número no autorizado: {from_phone}")
-        return {"ok": True}
-    
+async def handle_message(from_phone: str, text: Optional[str]):
+    """Procesa un mensaje ya validado y responde por WhatsApp."""
     # Si el mensaje no es texto, responder y salir
     if text is None:
         try:
             await send_whatsapp_text(from_phone, "Solo acepto texto por ahora 🙂")
         except Exception as e:
             print(f"Error enviando respuesta de tipo no soportado: {e}")
-        return {"ok": True}
+        return
     
     # Ejecutar agente (solo LLM, sin herramientas)
     try:
         print(f"Mensaje recibido de {from_phone}: {text}")
-        result = await test_agent.run(text)
+        # CodeAgent.run es síncrono: en un hilo para no bloquear el event loop
+        result = await asyncio.to_thread(test_agent.run, text)
         answer = result.output if hasattr(result, "output") else str(result)
         
         print(f"Respuesta del LLM: {answer}")
@@ -128,7 +84,24 @@ async def webhook(req: Request):
             await send_whatsapp_text(from_phone, f"Ocurrió un error: {str(e)}")
         except:
             pass
+
+# Recepción de mensajes (POST)
+@app.post("/webhook")
+async def webhook(req: Request):
+    try:
+        # Mensajes de remitentes permitidos, agrupados por teléfono
+        groups = group_by_sender(decode_webhook(await req.body(), is_phone_allowed))
+    except Exception as e:
+        print(f"Error parseando JSON del webhook: {e}")
+        return {"ok": True}
+    
+    async def process_sender(from_phone: str, messages: List[IncomingMessage]):
+        for message in messages:
+            await handle_message(from_phone, message.text)
     
+    # Remitentes distintos en paralelo; los mensajes de un mismo remitente, en orden
+    if groups:
+        await asyncio.gather(*(process_sender(phone, msgs) for phone, msgs in groups.items()))
     return {"ok": True}
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+"""
+Agente de una sola llamada con function calling nativo (AGENT_MODE=tools).
+
+En lugar de escribir y ejecutar código en varios pasos como CodeAgent, el
+modelo recibe un esquema JSON compacto de las herramientas y devuelve en una
+sola respuesta todas las llamadas necesarias. Las llamadas se ejecutan en
+paralelo y la respuesta al usuario se arma con sus resultados, sin una
+segunda llamada al LLM. Habla con cualquier API compatible con OpenAI
+(`/chat/completions`) usando el pool HTTP compartido.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from .config import LLM_API_KEY, LLM_BASE_URL, LLM_MODEL, LLM_TIMEOUT_S
+from .http_pool import get_llm_http
+from .metrics import mark_step, record_tokens
+from .deadline import clamp_timeout
+from .tools import TOOL_FUNCTIONS, ToolFailure, agent_tool_call
+
+# Respuesta cuando el modelo no llamó herramientas ni devolvió texto
+FALLBACK_REPLY = "No entendí el pedido, ¿me lo repetís?"
+
+_AREA = {"type": "string"}
+_AREAS = {"type": "array", "items": {"type": "string"}}
+_BRIGHTNESS = {"type": "integer", "minimum": 0, "maximum": 100}
+_COLOR = {"type": "string"}
+
+def _tool(name: str, description: str, properties: Dict[str, Any], required: List[str]) -> dict:
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+# Esquema compacto: descripciones de una línea, sin ejemplos
+TOOL_SCHEMAS = [
+    _tool("turn_on_lights", "Enciende un área", {"area": _AREA, "brightness": _BRIGHTNESS, "color": _COLOR}, ["area"]),
+    _tool("turn_off_lights", "Apaga un área", {"area": _AREA}, ["area"]),
+    _tool("set_brightness", "Ajusta el brillo de un área", {"area": _AREA, "brightness": _BRIGHTNESS}, ["area", "brightness"]),
+    _tool("get_light_state", "Estado de las luces de un área", {"area": _AREA}, ["area"]),
+    _tool("turn_on_areas", "Enciende varias áreas (\"todo\" = toda la casa)",
+          {"areas": _AREAS, "brightness": _BRIGHTNESS, "color": _COLOR}, ["areas"]),
+    _tool("turn_off_areas", "Apaga varias áreas (\"todo\" = toda la casa)", {"areas": _AREAS}, ["areas"]),
+    _tool("activate_scene", "Activa una escena", {"scene": {"type": "string"}}, ["scene"]),
+]
+
+SINGLE_SHOT_RULES = (
+    "Emite en UNA sola respuesta todas las llamadas a herramientas necesarias; "
+    "se ejecutan en paralelo, así que no hagas dos llamadas sobre la misma área. "
+    "Si el pedido no es claro, no llames herramientas y responde con una pregunta corta."
+)
+
+class AgentResult:
+    __slots__ = ("output", "tool_calls", "usage", "failed")
+
+    def __init__(self, output: str, tool_calls: List[Dict[str, Any]], usage: Dict[str, int], failed: bool = False):
+        self.output = output
+        self.tool_calls = tool_calls
+        self.usage = usage
+        self.failed = failed  # alguna llamada no se pudo ejecutar: el plan no se cachea
+
+    def __str__(self) -> str:
+        return self.output
+
+class StructuredToolAgent:
+    def __init__(self, system_prompt: str, model: str = LLM_MODEL, client: Optional[httpx.AsyncClient] = None,
+                 temperature: float = 0.2):
+        """
+        client: cliente HTTP a usar. Si no se indica, se usa el pool compartido del LLM.
+        """
+        self.system_prompt = f"{system_prompt.strip()}\n{SINGLE_SHOT_RULES}"
+        self.model = model
+        self.temperature = temperature
+        self._client = client
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is not None and not self._client.is_closed:
+            return self._client
+        return get_llm_http()
+
+    async def _complete(self, prompt: str) -> dict:
+        if not LLM_API_KEY and self._client is None:
+            raise ValueError("LLM_API_KEY (u OPENAI_API_KEY) no está configurado en .env")
+        payload = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            "tools": TOOL_SCHEMAS,
+            "tool_choice": "auto",
+            "parallel_tool_calls": True,
+        }
+        headers = {"Authorization": f"Bearer {LLM_API_KEY}"}
+        r = await self._http().post(f"{LLM_BASE_URL}/chat/completions", json=payload,
+                                    headers=headers, timeout=clamp_timeout(LLM_TIMEOUT_S))
+        r.raise_for_status()
+        return r.json()
+
+    async def _execute(self, call: dict) -> Tuple[str, bool]:
+        """Ejecuta una tool_call. Retorna (resultado, se ejecutó)."""
+        function = call.get("function") or {}
+        name = function.get("name")
+        if name not in TOOL_FUNCTIONS:
+            return f"Herramienta desconocida: {name}", False
+        try:
+            args = json.loads(function.get("arguments") or "{}")
+        except json.JSONDecodeError:
+            return f"Argumentos inválidos para {name}", False
+        if not isinstance(args, dict):
+            return f"Argumentos inválidos para {name}", False
+        try:
+            result = await agent_tool_call(name, **args)
+            return result, not isinstance(result, ToolFailure)
+        except TypeError:
+            return f"Argumentos inválidos para {name}", False
+
+    async def run(self, prompt: str) -> AgentResult:
+        """Una llamada al LLM, herramientas en paralelo y respuesta armada con sus resultados."""
+        response = await self._complete(prompt)
+        mark_step()
+
+        usage = response.get("usage") or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        record_tokens(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cached or 0)
+        self.calls += 1
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        self.cached_prompt_tokens += cached or 0
+
+        message = ((response.get("choices") or [{}])[0]).get("message") or {}
+        tool_calls = message.get("tool_calls") or []
+        if not tool_calls:
+            return AgentResult(message.get("content") or FALLBACK_REPLY, [], usage)
+
+        results = await asyncio.gather(*(self._execute(call) for call in tool_calls))
+        failed = not all(ok for _, ok in results)
+        return AgentResult("\n".join(text for text, _ in results), tool_calls, usage, failed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+        }
@@ -1,9 +1,39 @@
-from typing import List, Optional, Tuple
-from smolagents import tool
+import asyncio
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
 from .ha_client import HAClient
-from .mapping import get_entities_for_area, COLOR_MAP
+from .ha_state import get_mirrored_state
+from .tenants import current_tenant
+from .config import HA_STATE_CACHE_TTL_S
+from .state_store import NS_HA_STATE, get_state_store
+from .metrics import count, timed, tool_calls_total
+from .light_state import LightState, changed_states, common_value
+from .mapping import get_entities_for_area, get_scene, resolve_areas, COLOR_MAP
 
-ha = HAClient()
+_ha: Optional[HAClient] = None
+
+class ToolFailure(str):
+    """
+    Respuesta de una herramienta que no hizo nada en HA. Se muestra igual que
+    cualquier respuesta, pero la llamada no se registra (ni en la caché de
+    planes ni en el contexto del remitente).
+    """
+
+def get_ha() -> HAClient:
+    """
+    Cliente HA compartido, creado en el primer uso (no al importar, para no
+    cargar nada en el arranque en frío). Usa el pool HTTP compartido de HA.
+    Con varios hogares, el cliente del hogar del mensaje en curso.
+    """
+    tenant = current_tenant()
+    if tenant is not None:
+        return tenant.ha()
+    global _ha
+    if _ha is None:
+        _ha = HAClient()
+    return _ha
 
 def _validate_area(area: str) -> Tuple[bool, str]:
     """
@@ -15,76 +45,141 @@ def _validate_area(area: str) -> Tuple[bool, str]:
         return False, f"No hay luces mapeadas para el área '{area}'."
     return True, ""
 
-@tool
-async def turn_on_lights(area: str, brightness: Optional[int] = None, color: Optional[str] = None) -> str:
+def _light_params(brightness: Optional[int] = None, color: Optional[str] = None) -> Dict[str, Any]:
+    """Parámetros de light.turn_on para un brillo (0-100) y un nombre de color."""
+    params: Dict[str, Any] = {}
+    if brightness is not None:
+        params["brightness_pct"] = max(0, min(100, int(brightness)))
+    if color:
+        cm = COLOR_MAP.get(color.lower())
+        if cm:
+            params.update(cm)
+    return params
+
+def _entities_for_areas(areas: List[str]) -> List[str]:
+    """Une las luces de varias áreas en una sola lista sin duplicados."""
+    entities: List[str] = []
+    for area in areas:
+        for e in get_entities_for_area(area):
+            if e not in entities:
+                entities.append(e)
+    return entities
+
+def _describe_on(areas: List[str], brightness: Optional[int], color: Optional[str],
+                 states: Optional[List[dict]] = None) -> str:
     """
-    Enciende luces en un área. brightness es 0-100 (se escala a 0-255).
-    color admite: 'azul','rojo','verde','blanco/blanca','cálida','fría', etc.
+    Confirmación del encendido. Con los estados que devolvió HA, informa el brillo
+    y el color reales (si todas las luces coinciden) y las luces que no quedaron prendidas.
     """
+    lights = [LightState.from_ha(s) for s in states or []]
+    on = [light for light in lights if light.is_on]
+    if on:
+        actual = common_value([light.brightness_pct for light in on])
+        brightness = actual if actual is not None else brightness
+        color = common_value([light.color for light in on]) or color
+    desc = f"Luces encendidas en {', '.join(areas)}"
+    if brightness is not None:
+        desc += f" al {max(0, min(100, int(brightness)))}%"
+    if color:
+        desc += f" color {color}"
+    failed = [light for light in lights if not light.is_on]
+    if failed:
+        desc += f" (no quedaron prendidas: {', '.join(f'{l.entity_id} {l.state}' for l in failed)})"
+    return desc
+
+def _state_key(entity_id: str) -> str:
+    tenant = current_tenant()
+    return f"{tenant.id}:{entity_id}" if tenant is not None else entity_id
+
+async def _read_state(entity_id: str) -> dict:
+    """
+    Estado de una entidad: el más nuevo entre el espejo en memoria (solo el HA
+    global) y la caché del almacén de estado (lecturas y respuestas de servicios
+    recientes); si no hay ninguno, por REST.
+    """
+    mirrored = get_mirrored_state(entity_id) if current_tenant() is None else None
+    if HA_STATE_CACHE_TTL_S <= 0:
+        return mirrored or await get_ha().get_state(entity_id)
+    store = get_state_store()
+    key = _state_key(entity_id)
+    state = store.get(NS_HA_STATE, key)
+    if mirrored and (state is None or mirrored.get("last_updated", "") >= state.get("last_updated", "")):
+        return mirrored
+    if state is None:
+        state = await get_ha().get_state(entity_id)
+        store.set(NS_HA_STATE, key, state, HA_STATE_CACHE_TTL_S)
+    return state
+
+async def _call_light(service: str, data: Dict[str, Any]) -> List[dict]:
+    """
+    Llama a light.<service> y retorna los estados que cambiaron de las luces
+    del pedido. Esos estados quedan en la caché (leer lo que se acaba de
+    escribir no va a HA); las demás luces del pedido se invalidan.
+    """
+    entity_ids = data.get("entity_id", [])
+    if isinstance(entity_ids, str):
+        entity_ids = [entity_ids]
+    states: List[dict] = []
+    try:
+        response = await get_ha().call_service("light", service, data)
+        # HA devuelve todo lo que cambió mientras tanto (sensores, otras luces):
+        # solo las luces pedidas van a la caché y al resumen
+        requested = set(entity_ids)
+        states = [state for state in changed_states(response) if state["entity_id"] in requested]
+        return states
+    finally:
+        if HA_STATE_CACHE_TTL_S > 0:
+            store = get_state_store()
+            for state in states:
+                store.set(NS_HA_STATE, _state_key(state["entity_id"]), state, HA_STATE_CACHE_TTL_S)
+            written = {state["entity_id"] for state in states}
+            for entity_id in entity_ids:
+                if entity_id not in written:
+                    store.delete(NS_HA_STATE, _state_key(entity_id))
+
+async def do_turn_on_lights(area: str, brightness: Optional[int] = None, color: Optional[str] = None) -> str:
+    """Enciende luces en un área (implementación de `turn_on_lights`)."""
     is_valid, error_msg = _validate_area(area)
     if not is_valid:
         return error_msg
     
     entities = get_entities_for_area(area)
-    data = {"entity_id": entities}
-    if brightness is not None:
-        data["brightness_pct"] = max(0, min(100, int(brightness)))
-    if color:
-        cm = COLOR_MAP.get(color.lower())
-        if cm:
-            data.update(cm)
+    data = {"entity_id": entities, **_light_params(brightness, color)}
     
     try:
-        await ha.call_service("light", "turn_on", data)
-        desc = f"Luces encendidas en {area}"
-        if brightness is not None:
-            desc += f" al {data['brightness_pct']}%"
-        if color:
-            desc += f" color {color}"
-        return desc
+        states = await _call_light("turn_on", data)
+        return _describe_on([area], brightness, color, states)
     except Exception as e:
         return f"Error encendiendo luces en {area}: {str(e)}"
 
-@tool
-async def turn_off_lights(area: str) -> str:
-    """
-    Apaga luces en un área.
-    """
+async def do_turn_off_lights(area: str) -> str:
+    """Apaga luces en un área (implementación de `turn_off_lights`)."""
     is_valid, error_msg = _validate_area(area)
     if not is_valid:
         return error_msg
     
     entities = get_entities_for_area(area)
     try:
-        await ha.call_service("light", "turn_off", {"entity_id": entities})
+        await _call_light("turn_off", {"entity_id": entities})
         return f"Luces apagadas en {area}"
     except Exception as e:
         return f"Error apagando luces en {area}: {str(e)}"
 
-@tool
-async def get_light_state(area: str) -> str:
-    """
-    Devuelve estado resumido de las luces de un área.
-    """
+async def do_get_light_state(area: str) -> str:
+    """Estado resumido de las luces de un área (implementación de `get_light_state`)."""
     is_valid, error_msg = _validate_area(area)
     if not is_valid:
         return error_msg
     
     entities = get_entities_for_area(area)
-    states = []
     try:
-        for e in entities:
-            st = await ha.get_state(e)
-            states.append(f"{e} => {st.get('state')}")
-        return "; ".join(states)
+        states = await asyncio.gather(*(_read_state(e) for e in entities))
+        return "; ".join(LightState.from_ha(st).describe() for st in states)
     except Exception as e:
         return f"Error obteniendo estado de luces en {area}: {str(e)}"
 
-@tool
-async def set_brightness(area: str, brightness: int) -> str:
-    """
-    Ajusta brillo (0-100) de las luces del área.
-    """
+async def do_set_brightness(area: str, brightness: int) -> str:
+    """Ajusta el brillo de un área (implementación de `set_brightness`)."""
     is_valid, error_msg = _validate_area(area)
     if not is_valid:
         return error_msg
@@ -92,8 +187,130 @@ async def set_brightness(area: str, brightness: int) -> str:
     entities = get_entities_for_area(area)
     brightness_pct = max(0, min(100, int(brightness)))
     try:
-        await ha.call_service("light", "turn_on", {"entity_id": entities, "brightness_pct": brightness_pct})
-        return f"Brillo en {area} ajustado a {brightness_pct}%"
+        states = await _call_light("turn_on", {"entity_id": entities, "brightness_pct": brightness_pct})
+        actual = common_value([LightState.from_ha(s).brightness_pct for s in states])
+        return f"Brillo en {area} ajustado a {actual if actual is not None else brightness_pct}%"
     except Exception as e:
         return f"Error ajustando brillo en {area}: {str(e)}"
 
+
+async def do_turn_on_areas(areas: List[str], brightness: Optional[int] = None, color: Optional[str] = None) -> str:
+    """Enciende varias áreas (o "todo") con una sola llamada a Home Assistant."""
+    resolved, unknown = resolve_areas(areas)
+    if not resolved:
+        return f"No hay luces mapeadas para: {', '.join(areas)}."
+    
+    data = {"entity_id": _entities_for_areas(resolved), **_light_params(brightness, color)}
+    try:
+        states = await _call_light("turn_on", data)
+        desc = _describe_on(resolved, brightness, color, states)
+        if unknown:
+            desc += f" (sin luces mapeadas: {', '.join(unknown)})"
+        return desc
+    except Exception as e:
+        return f"Error encendiendo luces en {', '.join(resolved)}: {str(e)}"
+
+async def do_turn_off_areas(areas: List[str]) -> str:
+    """Apaga varias áreas (o "todo") con una sola llamada a Home Assistant."""
+    resolved, unknown = resolve_areas(areas)
+    if not resolved:
+        return f"No hay luces mapeadas para: {', '.join(areas)}."
+    
+    try:
+        await _call_light("turn_off", {"entity_id": _entities_for_areas(resolved)})
+        desc = f"Luces apagadas en {', '.join(resolved)}"
+        if unknown:
+            desc += f" (sin luces mapeadas: {', '.join(unknown)})"
+        return desc
+    except Exception as e:
+        return f"Error apagando luces en {', '.join(resolved)}: {str(e)}"
+
+async def do_activate_scene(scene: str) -> str:
+    """
+    Activa una escena de SCENE_MAP. Los pasos con el mismo servicio y parámetros
+    se unen en una llamada; las llamadas resultantes se hacen en paralelo.
+    """
+    steps = get_scene(scene)
+    if not steps:
+        return f"No conozco la escena '{scene}'."
+    
+    groups: Dict[Tuple[str, str], Tuple[Dict[str, Any], List[str]]] = {}
+    applied: List[str] = []
+    missing: List[str] = []
+    for step in steps:
+        areas, unknown = resolve_areas(step.get("areas", []))
+        applied.extend(a for a in areas if a not in applied)
+        missing.extend(a for a in unknown if a not in missing)
+        if step.get("action") == "off":
+            service, params = "turn_off", {}
+        else:
+            service, params = "turn_on", _light_params(step.get("brightness"), step.get("color"))
+        key = (service, json.dumps(params, sort_keys=True))
+        _, entities = groups.setdefault(key, (params, []))
+        entities.extend(e for e in _entities_for_areas(areas) if e not in entities)
+    
+    calls = [(service, {"entity_id": entities, **params})
+             for (service, _), (params, entities) in groups.items() if entities]
+    if not calls:
+        return ToolFailure(f"No hay luces mapeadas para la escena {scene}: {', '.join(missing)}.")
+    results = await asyncio.gather(
+        *(_call_light(service, data) for service, data in calls),
+        return_exceptions=True,
+    )
+    errors = [str(r) for r in results if isinstance(r, Exception)]
+    if errors:
+        return ToolFailure(f"Error activando la escena {scene}: {'; '.join(errors)}")
+    if missing:
+        return f"Escena {scene} activada en {', '.join(applied)} (sin luces mapeadas: {', '.join(missing)})"
+    return f"Escena {scene} activada"
+
+# Implementaciones por nombre de herramienta: las usan el fast path y cualquier
+# código que quiera ejecutar una llamada sin pasar por el agente.
+TOOL_FUNCTIONS: Dict[str, Callable[..., Awaitable[str]]] = {
+    "turn_on_lights": do_turn_on_lights,
+    "turn_off_lights": do_turn_off_lights,
+    "set_brightness": do_set_brightness,
+    "get_light_state": do_get_light_state,
+    "turn_on_areas": do_turn_on_areas,
+    "turn_off_areas": do_turn_off_areas,
+    "activate_scene": do_activate_scene,
+}
+
+# Llamadas ejecutadas dentro de los bloques record_tool_calls activos (anidables)
+_recorders: ContextVar[Tuple[List[Dict[str, Any]], ...]] = ContextVar("tool_call_recorders", default=())
+
+@contextmanager
+def record_tool_calls() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Registra las llamadas {tool, args} que se ejecuten dentro del bloque (del
+    agente, del fast path o de un plan cacheado). Los bloques se pueden anidar:
+    cada uno ve las llamadas hechas mientras estuvo abierto.
+    """
+    calls: List[Dict[str, Any]] = []
+    token = _recorders.set(_recorders.get() + (calls,))
+    try:
+        yield calls
+    finally:
+        _recorders.reset(token)
+
+async def run_tool_call(name: str, args: Dict[str, Any]) -> str:
+    """Ejecuta una llamada a herramienta {nombre, args} sin pasar por el LLM."""
+    func = TOOL_FUNCTIONS.get(name)
+    if func is None:
+        raise ValueError(f"Herramienta desconocida: {name}")
+    tool_calls_total.inc(tool=name)
+    count("tool_calls")
+    with timed("tool"):
+        result = await func(**args)
+    # Se registra recién cuando se ejecutó: una llamada con argumentos inválidos
+    # (TypeError) o que falló no debe terminar en la caché de planes ni en el contexto
+    recorders = _recorders.get()
+    if recorders and not isinstance(result, ToolFailure):
+        call = {"tool": name, "args": {k: v for k, v in args.items() if v is not None}}
+        for calls in recorders:
+            calls.append(call)
+    return result
+
+async def agent_tool_call(name: str, **args: Any) -> str:
+    """Punto de entrada común de las herramientas del agente."""
+    return await run_tool_call(name, args)
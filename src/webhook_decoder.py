@@ -0,0 +1,117 @@
+"""
+Decodificación del webhook de WhatsApp Cloud API, compartida por app y test_app.
+
+Trabaja sobre los bytes crudos del POST y descarta lo que no hay que procesar
+antes de armar el árbol JSON completo:
+- cuerpos más grandes que WEBHOOK_MAX_BYTES;
+- notificaciones sin "messages" (estados sent/delivered/read, la mayoría del
+  tráfico de Meta): se descartan con una búsqueda de bytes, sin parsear;
+- payloads cuyos remitentes no están en la whitelist: los "from" se leen con
+  una regex sobre los bytes (dentro de un texto las comillas van escapadas,
+  así que no hay falsos positivos); si ninguno está permitido, no se parsea,
+  y la búsqueda se corta en el primero que sí lo esté.
+Lo que pasa se parsea una vez (con orjson si está instalado) y se convierte
+en registros IncomingMessage con slots.
+"""
+import json
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+from .config import WEBHOOK_MAX_BYTES
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _JSONError = orjson.JSONDecodeError
+except ImportError:  # opcional: json de la librería estándar también acepta bytes
+    _loads = json.loads
+    _JSONError = ValueError
+
+_MESSAGES_KEY = b'"messages"'
+_FROM_RE = re.compile(rb'"from"\s*:\s*"([^"\\]+)"')
+
+class WebhookDecodeError(ValueError):
+    """El cuerpo del webhook no es un JSON válido o es demasiado grande."""
+
+class IncomingMessage:
+    __slots__ = ("id", "phone", "type", "text")
+
+    def __init__(self, message_id: Optional[str], phone: str, msg_type: str, text: Optional[str]):
+        self.id = message_id
+        self.phone = phone
+        self.type = msg_type
+        self.text = text  # None si el mensaje no es texto
+
+    def __repr__(self) -> str:
+        return f"IncomingMessage({self.id!r}, {self.phone!r}, {self.type!r}, {self.text!r})"
+
+def decode_webhook(raw: bytes, is_allowed: Optional[Callable[[str], bool]] = None) -> List[IncomingMessage]:
+    """
+    Mensajes de un POST del webhook (todas las entries y changes; Meta puede
+    agrupar varios), en orden de llegada. Los `statuses` se ignoran, igual que
+    los textos vacíos y, si se pasa `is_allowed`, los remitentes no permitidos
+    (se evalúa una vez por teléfono distinto).
+    Lanza WebhookDecodeError si el cuerpo no es JSON o supera WEBHOOK_MAX_BYTES.
+    """
+    if len(raw) > WEBHOOK_MAX_BYTES:
+        raise WebhookDecodeError(f"Webhook de {len(raw)} bytes (máximo {WEBHOOK_MAX_BYTES})")
+    if _MESSAGES_KEY not in raw:
+        return []
+    verdicts: Dict[str, bool] = {}  # is_allowed por teléfono (no por mensaje)
+    if is_allowed is not None:
+        # Basta con un remitente permitido para tener que parsear
+        for match in _FROM_RE.finditer(raw):
+            phone = match.group(1).decode("utf-8", "replace")
+            if phone not in verdicts:
+                verdicts[phone] = is_allowed(phone)
+                if verdicts[phone]:
+                    break
+        else:
+            return []
+    try:
+        data = _loads(raw)
+    except _JSONError as e:
+        raise WebhookDecodeError(f"JSON inválido: {e}") from None
+    if type(data) is not dict:
+        return []
+
+    out: List[IncomingMessage] = []
+    for entry in data.get("entry") or ():
+        if type(entry) is not dict:
+            continue
+        for change in entry.get("changes") or ():
+            if type(change) is not dict:
+                continue
+            value = change.get("value")
+            if type(value) is not dict:
+                continue
+            for msg in value.get("messages") or ():
+                if type(msg) is not dict:
+                    continue
+                phone = msg.get("from")
+                if not phone or type(phone) is not str:
+                    continue
+                if is_allowed is not None:
+                    allowed = verdicts.get(phone)
+                    if allowed is None:
+                        allowed = verdicts[phone] = is_allowed(phone)
+                    if not allowed:
+                        continue
+                msg_type = msg.get("type", "text")
+                if msg_type != "text":
+                    out.append(IncomingMessage(msg.get("id"), phone, msg_type, None))
+                    continue
+                text = msg.get("text")
+                body = text.get("body") if type(text) is dict else None
+                if type(body) is not str:
+                    continue
+                body = body.strip()
+                if body:
+                    out.append(IncomingMessage(msg.get("id"), phone, msg_type, body))
+    return out
+
+def group_by_sender(messages: Iterable[IncomingMessage]) -> Dict[str, List[IncomingMessage]]:
+    """Agrupa los mensajes por teléfono manteniendo el orden de llegada."""
+    groups: Dict[str, List[IncomingMessage]] = {}
+    for message in messages:
+        groups.setdefault(message.phone, []).append(message)
+    return groups
@@ -1,60 +1,229 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
 import httpx
-from .config import WA_ACCESS_TOKEN, WA_PHONE_NUMBER_ID
+from .config import (
+    WA_ACCESS_TOKEN, WA_PHONE_NUMBER_ID, WA_TIMEOUT_S, WA_API_BASE,
+    WA_SEND_RATE_PER_S, WA_SEND_BURST, WA_RECIPIENT_RATE_PER_S, WA_RECIPIENT_BURST,
+    WA_SEND_MAX_RETRIES,
+)
+from .http_pool import get_wa_http
+from .cache import TTLCache
+from .ratelimit import TokenBucket
+from .metrics import timed
+from .deadline import clamp_timeout, remaining
 
-WA_BASE = "https://graph.facebook.com/v20.0"
+WA_BASE = WA_API_BASE
 
-async def send_whatsapp_text(to_phone: str, text: str):
+# Límite de caracteres por mensaje de texto
+WA_MAX_CHARS = 4000
+
+# Enviar un mensaje no es idempotente: solo se reintenta lo que seguro no se
+# entregó. 429 (throttling) y respuestas con Retry-After explícito rechazan el
+# pedido; un 5xx o un timeout de lectura pueden llegar con el mensaje ya enviado.
+_RETRY_STATUS = {429}
+# Errores antes de mandar el pedido (no hubo conexión)
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def split_message(text: str, limit: int = WA_MAX_CHARS) -> List[str]:
+    """
+    Parte un texto largo en fragmentos de hasta `limit` caracteres, cortando
+    preferentemente en párrafos, líneas o espacios (en ese orden).
+    """
+    chunks = []
+    rest = text
+    while len(rest) > limit:
+        window = rest[:limit]
+        cut = -1
+        for sep in ("\n\n", "\n", " "):
+            cut = window.rfind(sep)
+            if cut > limit // 2:
+                break
+        if cut <= 0:
+            cut = limit  # sin separador razonable: corte duro
+        chunks.append(rest[:cut].rstrip())
+        rest = rest[cut:].lstrip()
+    if rest:
+        chunks.append(rest)
+    return chunks
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+def _backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Backoff exponencial con jitter completo."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _fits_deadline(delay: float) -> bool:
+    """True si tras esperar `delay` todavía queda plazo para otro intento."""
+    left = remaining()
+    return left is None or delay < left
+
+class OutboundSender:
+    """
+    Pipeline de envío: token bucket global (throughput del número de negocio)
+    y uno por destinatario, orden garantizado por destinatario y reintentos
+    con backoff que respetan `Retry-After`.
+    """
+    def __init__(self):
+        self._global = TokenBucket(WA_SEND_RATE_PER_S, WA_SEND_BURST)
+        self._recipients = TTLCache(max_size=10000, ttl_s=3600)
+        self._locks = TTLCache(max_size=10000, ttl_s=3600)
+        self.pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+        self.delivered = 0  # mensajes completos (todos sus fragmentos) entregados
+        self._latency_total_s = 0.0
+        self._latency_max_s = 0.0
+
+    def _recipient_bucket(self, to_phone: str) -> TokenBucket:
+        bucket = self._recipients.get(to_phone)
+        if bucket is None:
+            bucket = TokenBucket(WA_RECIPIENT_RATE_PER_S, WA_RECIPIENT_BURST)
+        self._recipients.set(to_phone, bucket)
+        return bucket
+
+    def _recipient_lock(self, to_phone: str) -> asyncio.Lock:
+        lock = self._locks.get(to_phone)
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks.set(to_phone, lock)
+        return lock
+
+    async def _post(self, client: httpx.AsyncClient, url: str, headers: Dict[str, str], payload: dict) -> dict:
+        attempt = 0
+        while True:
+            try:
+                r = await client.post(url, headers=headers, json=payload, timeout=clamp_timeout(WA_TIMEOUT_S))
+                retry_after = _retry_after(r) if r.status_code >= 400 else None
+                if (r.status_code in _RETRY_STATUS or retry_after is not None) and attempt < WA_SEND_MAX_RETRIES:
+                    if r.status_code == 429:
+                        self.throttled += 1
+                    delay = retry_after if retry_after is not None else _backoff(attempt)
+                    if not _fits_deadline(delay):
+                        r.raise_for_status()  # no hay tiempo para reintentar dentro del plazo
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    self.retries += 1
+                    continue
+                r.raise_for_status()
+                return r.json()
+            except _RETRY_ERRORS:
+                delay = _backoff(attempt)
+                if attempt >= WA_SEND_MAX_RETRIES or not _fits_deadline(delay):
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                self.retries += 1
+
+    async def send(self, client: httpx.AsyncClient, url: str, headers: Dict[str, str],
+                   to_phone: str, text: str) -> dict:
+        """Envía `text` (partido en fragmentos si hace falta) en orden a `to_phone`."""
+        chunks = split_message(text)
+        started = time.monotonic()
+        unsent = len(chunks)
+        self.pending += unsent
+        result: dict = {}
+        try:
+            async with self._recipient_lock(to_phone):
+                bucket = self._recipient_bucket(to_phone)
+                for chunk in chunks:
+                    await bucket.acquire()
+                    await self._global.acquire()
+                    payload = {
+                        "messaging_product": "whatsapp",
+                        "to": to_phone,
+                        "type": "text",
+                        "text": {"body": chunk}
+                    }
+                    try:
+                        result = await self._post(client, url, headers, payload)
+                    except Exception:
+                        self.failed += 1
+                        raise
+                    finally:
+                        unsent -= 1
+                        self.pending -= 1
+                    self.sent += 1
+        finally:
+            self.pending -= unsent
+        elapsed = time.monotonic() - started
+        self.delivered += 1
+        self._latency_total_s += elapsed
+        self._latency_max_s = max(self._latency_max_s, elapsed)
+        return result
+
+    def stats(self) -> dict:
+        delivered = max(1, self.delivered)
+        return {
+            "queue_depth": self.pending,
+            "delivered": self.delivered,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "avg_delivery_ms": round(self._latency_total_s / delivered * 1000, 1),
+            "max_delivery_ms": round(self._latency_max_s * 1000, 1),
+        }
+
+sender = OutboundSender()
+
+async def send_whatsapp_text(to_phone: str, text: str, client: Optional[httpx.AsyncClient] = None):
     """
     Envía un mensaje de texto por WhatsApp Cloud API.
-    
+
     Args:
         to_phone: número de teléfono (sin +, ej: "59891234567")
-        text: mensaje a enviar (se trunca a 4000 caracteres)
-    
+        text: mensaje a enviar (si supera 4000 caracteres se envía en varios mensajes, en orden)
+        client: pool HTTP a usar (por defecto, el pool compartido de Graph API)
+
     Returns:
-        dict: respuesta JSON de la API de WhatsApp
-        
+        dict: respuesta JSON de la API de WhatsApp (del último fragmento)
+
     Raises:
         ValueError: si faltan credenciales de configuración
-        httpx.HTTPStatusError: si la API retorna un error HTTP
+        httpx.HTTPStatusError: si la API retorna un error HTTP (tras agotar los reintentos)
     """
     # Validar configuración
     if not WA_ACCESS_TOKEN:
         raise ValueError("WA_ACCESS_TOKEN no está configurado en .env")
     if not WA_PHONE_NUMBER_ID:
         raise ValueError("WA_PHONE_NUMBER_ID no está configurado en .env")
-    
+
     # Validar entrada
     if not to_phone or not text:
         raise ValueError("to_phone y text son requeridos")
-    
+
     url = f"{WA_BASE}/{WA_PHONE_NUMBER_ID}/messages"
     headers = {
         "Authorization": f"Bearer {WA_ACCESS_TOKEN}",
         "Content-Type": "application/json"
     }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to_phone,
-        "type": "text",
-        "text": {"body": text[:4000]}
-    }
-    
-    async with httpx.AsyncClient(timeout=15) as client:
-        try:
-            r = await client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            return r.json()
-        except httpx.HTTPStatusError as e:
-            error_detail = f"Error {e.response.status_code}"
-            try:
-                error_body = e.response.json()
-                error_detail += f": {error_body}"
-            except:
-                error_detail += f": {e.response.text}"
-            print(f"Error enviando WhatsApp a {to_phone}: {error_detail}")
-            raise
-        except httpx.RequestError as e:
-            print(f"Error de conexión enviando WhatsApp a {to_phone}: {e}")
-            raise
 
+    if client is None:
+        client = get_wa_http()
+
+    try:
+        with timed("whatsapp"):
+            return await sender.send(client, url, headers, to_phone, text)
+    except httpx.HTTPStatusError as e:
+        error_detail = f"Error {e.response.status_code}"
+        try:
+            error_body = e.response.json()
+            error_detail += f": {error_body}"
+        except:
+            error_detail += f": {e.response.text}"
+        print(f"Error enviando WhatsApp a {to_phone}: {error_detail}")
+        raise
+    except httpx.RequestError as e:
+        print(f"Error de conexión enviando WhatsApp a {to_phone}: {e}")
+        raise
@@ -0,0 +1,88 @@
+"""
+Cola de trabajo en proceso para el modo "ack-first" del webhook.
+
+El webhook encola el mensaje y responde 200 de inmediato; un pool de workers
+lo procesa después. Los mensajes se reparten en N colas (una por worker)
+según el teléfono del remitente, así los mensajes de un mismo número se
+procesan en orden y nunca hay más de N en curso a la vez. `pending(key)`
+dice si un remitente tiene mensajes encolados o en curso: con la cola llena,
+procesar en línea un mensaje nuevo de ese remitente lo adelantaría a los
+anteriores.
+"""
+import asyncio
+import math
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+Handler = Callable[..., Awaitable[Any]]
+
+class MessageWorker:
+    def __init__(self, handler: Handler, concurrency: int = 8, queue_size: int = 256):
+        self._handler = handler
+        self._concurrency = max(1, concurrency)
+        self._shard_size = max(1, math.ceil(queue_size / self._concurrency))
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[str, int] = {}  # key → mensajes encolados o en curso
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        """Mensajes encolados pendientes de procesar."""
+        return sum(q.qsize() for q in self._queues)
+
+    def pending(self, key: str) -> int:
+        """Mensajes de `key` encolados o en curso."""
+        return self._pending.get(key, 0)
+
+    def start(self):
+        if self.started:
+            return
+        self._queues = [asyncio.Queue(maxsize=self._shard_size) for _ in range(self._concurrency)]
+        self._tasks = [asyncio.create_task(self._run(q)) for q in self._queues]
+
+    def submit(self, key: str, *args: Any) -> bool:
+        """
+        Encola `handler(*args)` en el shard de `key` (el teléfono).
+        Retorna False si la cola está llena.
+        """
+        self.start()
+        queue = self._queues[hash(key) % self._concurrency]
+        try:
+            queue.put_nowait((key, args))
+        except asyncio.QueueFull:
+            return False
+        self._pending[key] = self._pending.get(key, 0) + 1
+        return True
+
+    async def stop(self, drain_timeout: Optional[float] = 10.0):
+        """Espera (hasta `drain_timeout`) a que se vacíen las colas y detiene los workers."""
+        if not self.started:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Apagando con {self.depth} mensajes sin procesar en la cola")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+        self._pending = {}
+
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            key, args = await queue.get()
+            try:
+                await self._handler(*args)
+            except Exception as e:
+                print(f"Error procesando mensaje en segundo plano: {e}")
+            finally:
+                left = self._pending.get(key, 1) - 1
+                if left > 0:
+                    self._pending[key] = left
+                else:
+                    self._pending.pop(key, None)
+                queue.task_done()
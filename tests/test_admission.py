@@ -0,0 +1,47 @@
+import asyncio
+import time
+from src import app as app_module
+from src.admission import OVERLOADED, OVERLOADED_REPLY, RATE_LIMITED, AdmissionController
+from src.metrics import message_trace
+from src.ratelimit import TokenBucket
+
+def test_token_bucket_rafaga_y_reposicion():
+    bucket = TokenBucket(rate_per_s=20, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0 < bucket.wait_time() <= 0.05
+    time.sleep(0.06)
+    assert bucket.try_acquire()
+
+def test_limite_por_remitente():
+    admission = AdmissionController(sender_rate_per_s=0.01, sender_burst=2, max_pending=0)
+    assert [admission.check("a") for _ in range(3)] == [None, None, RATE_LIMITED]
+    assert admission.check("b") is None  # cada teléfono tiene su propio bucket
+    assert admission.stats()["rate_limited"] == 1
+
+def test_descarte_por_marca_de_agua():
+    admission = AdmissionController(sender_rate_per_s=0, max_pending=2)
+    assert admission.check("a") is None and admission.check("b") is None
+    assert admission.check("c") == OVERLOADED
+    admission.done()
+    assert admission.check("c") is None
+    assert (admission.pending, admission.shed) == (2, 1)
+
+def test_aviso_una_vez_por_ventana():
+    admission = AdmissionController(notify_window_s=60)
+    assert admission.should_notify("a")
+    assert not admission.should_notify("a")
+    assert admission.should_notify("b")
+
+class BusyPool:
+    waiting = 3
+
+def test_agentes_saturados_responden_ocupado_sin_llm(monkeypatch):
+    monkeypatch.setattr(app_module, "_agent_pool", BusyPool())
+    monkeypatch.setattr(app_module, "ADMISSION_AGENT_HIGH_WATER", 3)
+
+    async def run():
+        with message_trace() as trace:
+            return await app_module._answer("dejá la cocina lindo para cenar", trace)
+
+    assert asyncio.run(run()) == ("shed", OVERLOADED_REPLY)
@@ -0,0 +1,27 @@
+import asyncio
+from bench.fake_model import ScriptedModel
+from src import tools
+from src.agent import build_agent, run_agent
+from src.tools import record_tool_calls
+
+def test_code_agent_corre_en_un_hilo_y_llama_herramientas(monkeypatch):
+    loop_of_tool = []
+
+    async def fake_turn_on(area, brightness=None, color=None):
+        loop_of_tool.append(asyncio.get_running_loop())
+        return f"Luces encendidas en {area} al {brightness}%"
+
+    monkeypatch.setitem(tools.TOOL_FUNCTIONS, "turn_on_lights", fake_turn_on)
+    model = ScriptedModel()
+    agent = build_agent(llm=model, mode="code")
+
+    async def scenario():
+        with record_tool_calls() as calls:
+            result = await run_agent(agent, "Usuario: está muy oscuro acá en el living")
+        return asyncio.get_running_loop(), calls, result
+
+    loop, calls, result = asyncio.run(scenario())
+    assert str(result) == "Luces encendidas en living al 80%"
+    assert calls == [{"tool": "turn_on_lights", "args": {"area": "living", "brightness": 80}}]
+    assert loop_of_tool == [loop]  # la herramienta corrió en el loop de la app
+    assert model.calls == 2
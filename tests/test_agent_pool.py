@@ -0,0 +1,64 @@
+import asyncio
+import threading
+from src.agent_pool import AgentPool
+
+class SlowAgent:
+    """Agente síncrono que se queda en run hasta que le dan paso."""
+    def __init__(self):
+        self.release = threading.Event()
+
+    def run(self, prompt):
+        self.release.wait(5)
+        return prompt
+
+def _pool(size):
+    built = []
+
+    def factory():
+        built.append(SlowAgent())
+        return built[-1]
+
+    return AgentPool(factory, size=size), built
+
+async def _run(pool, prompt):
+    async with pool.acquire() as agent:
+        return await pool.run_in_thread(agent, agent.run, prompt)
+
+def test_corridas_sincronas_en_paralelo_sin_bloquear_el_loop():
+    pool, built = _pool(2)
+
+    async def scenario():
+        runs = [asyncio.create_task(_run(pool, p)) for p in ("a", "b")]
+        await asyncio.sleep(0.05)  # el loop sigue libre con las dos corridas en curso
+        assert pool.stats()["in_use"] == 2
+        for agent in built:
+            agent.release.set()
+        return await asyncio.gather(*runs)
+
+    try:
+        assert asyncio.run(scenario()) == ["a", "b"]
+    finally:
+        pool.close()
+
+def test_agente_cancelado_vuelve_al_pool_cuando_termina_el_hilo():
+    pool, built = _pool(1)
+
+    async def scenario():
+        with_deadline = asyncio.create_task(asyncio.wait_for(_run(pool, "a"), 0.05))
+        try:
+            await with_deadline
+        except asyncio.TimeoutError:
+            pass
+        # El hilo sigue usando el agente: el siguiente mensaje espera
+        assert pool.stats()["in_use"] == 1
+        next_run = asyncio.create_task(_run(pool, "b"))
+        await asyncio.sleep(0.05)
+        assert not next_run.done() and pool.waiting == 1
+        built[0].release.set()
+        return await next_run
+
+    try:
+        assert asyncio.run(scenario()) == "b"
+        assert len(built) == 1 and pool.stats()["in_use"] == 0
+    finally:
+        pool.close()
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+from bench.cold_start import HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import json, sys
+import api.index as index
+event = {
+    "resource": "/webhook", "httpMethod": "GET", "path": "/webhook",
+    "headers": {"host": "localhost"}, "multiValueHeaders": {},
+    "queryStringParameters": {"mode": "subscribe", "token": "secreto", "challenge": "ping"},
+    "multiValueQueryStringParameters": None,
+    "requestContext": {"resourcePath": "/webhook", "httpMethod": "GET", "identity": {"sourceIp": "127.0.0.1"}},
+    "body": None, "isBase64Encoded": False,
+}
+response = index.handler(event, None)
+print(json.dumps({"body": response["body"], "loaded": [m for m in sys.argv[1:] if m in sys.modules]}))
+"""
+
+def test_entry_point_no_carga_modulos_pesados():
+    env = {**os.environ, "WA_VERIFY_TOKEN": "secreto"}
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD, *HEAVY_MODULES, "uvicorn"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60, check=True,
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    assert result["body"] == "ping"  # la verificación del webhook responde sin el agente
+    assert result["loaded"] == []
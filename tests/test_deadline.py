@@ -0,0 +1,89 @@
+import asyncio
+import httpx
+import pytest
+from src import app as app_module
+from src.agent import ToolBridge
+from src.agent_pool import AgentPool
+from src.deadline import (
+    DEADLINE_REPLY, Deadline, DeadlineExceeded, clamp_timeout, remaining, run_with_deadline, use_deadline,
+)
+from src.ha_client import HAClient
+
+def test_clamp_timeout():
+    assert clamp_timeout(10.0) == 10.0  # sin plazo
+    with use_deadline(Deadline(1.0)):
+        assert 0.9 < clamp_timeout(10.0) <= 1.0
+        assert clamp_timeout(0.5) == 0.5
+    with use_deadline(Deadline(0.0)), pytest.raises(DeadlineExceeded):
+        clamp_timeout(10.0)
+    assert remaining() is None
+
+def test_run_with_deadline_cancela_al_llegar_a_la_reserva():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        with use_deadline(Deadline(0.2)):
+            await run_with_deadline(slow(), reserve_s=0.15)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert cancelled == [True]
+
+def test_ha_con_plazo_vencido_no_hace_la_llamada():
+    requests = []
+    transport = httpx.MockTransport(lambda request: requests.append(request) or httpx.Response(200, json=[]))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            ha = HAClient(client=client, base_url="http://ha.local", token="t", transport="rest")
+            with use_deadline(Deadline(0.0)):
+                await ha.call_service("light", "turn_on", {"entity_id": ["light.kitchen"]})
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert requests == []
+
+def test_herramientas_del_code_agent_se_cortan_tras_cancelar():
+    bridge = ToolBridge()
+
+    async def scenario():
+        bridge.bind(asyncio.get_running_loop(), None)
+        bridge.cancelled.set()  # run_agent lo marca al cancelarse la corrida
+        with pytest.raises(DeadlineExceeded):
+            bridge.call("turn_on_lights", area="cocina")
+
+    asyncio.run(scenario())
+
+class SlowAgent:
+    def __init__(self):
+        self.cancelled = False
+
+    async def run(self, prompt):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+def test_agente_lento_se_cancela_y_se_responde_por_plazo(monkeypatch):
+    agent = SlowAgent()
+    sent = []
+
+    async def fake_send(phone, text):
+        clamp_timeout(10.0)
+        sent.append(text)
+
+    monkeypatch.setattr(app_module, "_agent_pool", AgentPool(lambda: agent, size=1))
+    monkeypatch.setattr(app_module, "send_whatsapp_text", fake_send)
+    monkeypatch.setattr(app_module, "REPLY_RESERVE_S", 0.1)
+    monkeypatch.setattr(app_module, "PLAN_CACHE_ENABLED", False)
+    asyncio.run(app_module.handle_message("59891234567", "dejá la cocina lindo para cenar", Deadline(0.3)))
+    assert agent.cancelled
+    assert sent == [DEADLINE_REPLY]
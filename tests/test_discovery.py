@@ -0,0 +1,44 @@
+from bench.fake_ha import DEFAULT_AREAS, DEFAULT_DEVICES, DEFAULT_ENTITIES
+from src.discovery import build_area_index
+from src.fastpath import parse_command
+from src.mapping import AreaIndex, resolve_areas, use_area_index
+
+# Los mismos registros, pero con los nombres que pone HA en inglés
+RENAMED_AREAS = [
+    {"area_id": "living_room", "name": "Living Room", "aliases": []},
+    {"area_id": "bedroom", "name": "Bedroom", "aliases": []},
+    {"area_id": "cocina", "name": "Kitchen", "aliases": []},
+]
+RENAMED_DEVICES = [{"id": "dev_kitchen", "area_id": "cocina"}]
+RENAMED_ENTITIES = [
+    {"entity_id": "light.living_ceiling", "area_id": "living_room", "device_id": None},
+    {"entity_id": "light.living_lamp", "area_id": "living_room", "device_id": None},
+    {"entity_id": "light.bedroom_ceiling", "area_id": "bedroom", "device_id": None},
+    {"entity_id": "light.kitchen", "area_id": None, "device_id": "dev_kitchen"},
+]
+
+def test_registros_equivalentes_al_mapeo_estatico():
+    index = build_area_index(DEFAULT_AREAS, DEFAULT_DEVICES, DEFAULT_ENTITIES)
+    assert index.areas == {
+        "living": ["light.living_ceiling", "light.living_lamp"],
+        "dormitorio": ["light.bedroom_ceiling"],
+        "cocina": ["light.kitchen"],
+    }
+    assert index.default_area == "living"
+    assert index.resolve("pieza") == "dormitorio"
+
+def test_areas_con_otro_nombre_conservan_los_alias_estaticos():
+    index = build_area_index(RENAMED_AREAS, RENAMED_DEVICES, RENAMED_ENTITIES)
+    assert set(index.areas) == {"living room", "bedroom", "kitchen"}
+    assert index.default_area == "living room"
+    assert index.resolve("living") == "living room"      # luces compartidas
+    assert index.resolve("pieza") == "bedroom"
+    assert index.resolve("cocina") == "kitchen"          # area_id
+    with use_area_index(index):
+        assert resolve_areas(["living", "dormitorio"]) == (["living room", "bedroom"], [])
+        assert parse_command("prendé la luz") == {"tool": "turn_on_lights", "args": {"area": "living room"}}
+        assert parse_command("prendé el living") == {"tool": "turn_on_lights", "args": {"area": "living room"}}
+
+def test_area_por_defecto_inexistente_usa_la_primera():
+    index = AreaIndex({"salon": ["light.salon"]}, default_area="living")
+    assert index.default_area == "salon"
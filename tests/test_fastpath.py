@@ -0,0 +1,42 @@
+import pytest
+from src.fastpath import parse_command, uses_context
+
+@pytest.mark.parametrize("text", [
+    "prendé la cocina a las 8",
+    "prendé la cocina a las 20",
+    "prendé las 2 luces del living",
+    "prendé 1 luz de la cocina",
+    "prendé la cocina en 10",
+    "prendé la cocina al 10 en 5",
+    "subile 20",
+])
+def test_numero_sin_marca_de_brillo_va_al_agente(text):
+    assert parse_command(text) is None
+
+@pytest.mark.parametrize("text, brightness", [
+    ("prendé el living al 50%", 50),
+    ("prendé el living a 50%", 50),
+    ("prendé el living al 50 por ciento", 50),
+    ("prendé el living al 50", 50),
+    ("prendé el living al 50 por favor", 50),
+])
+def test_numero_con_marca_de_brillo(text, brightness):
+    command = parse_command(text)
+    assert command == {"tool": "turn_on_lights", "args": {"area": "living", "brightness": brightness}}
+
+@pytest.mark.parametrize("text, expected", [
+    ("prendé la cocina", False),
+    ("dejá la cocina lindo para cenar", False),
+    ("apagá todo", False),
+    ("modo cine", False),
+    ("subí la cocina al 50%", False),
+    ("subile un poco más", True),
+    ("y la cocina también", True),
+    ("apagala", True),
+    ("ahora más", True),
+    ("esa en azul", True),
+    ("bajá la cocina", True),
+    ("prendé la luz", True),
+])
+def test_uses_context(text, expected):
+    assert uses_context(text) is expected
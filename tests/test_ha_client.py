@@ -0,0 +1,54 @@
+import asyncio
+import httpx
+import uvicorn
+from bench.fake_ha import FAKE_TOKEN, FakeHomeAssistant, create_app
+from src.ha_client import HAClient
+from tests.test_ha_state import _free_port, _until
+
+def test_service_call_por_websocket():
+    async def scenario():
+        fake = FakeHomeAssistant()
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=port,
+                                               log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve())
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            await _until(lambda: server.started)
+            async with httpx.AsyncClient() as client:
+                ha = HAClient(client=client, base_url=base_url, token=FAKE_TOKEN, transport="websocket")
+                await asyncio.gather(*(
+                    ha.call_service("light", "turn_on", {"entity_id": [entity_id], "brightness_pct": 50})
+                    for entity_id in ("light.kitchen", "light.living_lamp")
+                ))
+                await ha._channel.close()
+            assert fake.states["light.kitchen"]["state"] == "on"
+            assert fake.calls["rest:call_service"] == 0
+            assert ha._channel.connects == 1 and ha.ws_fallbacks == 0  # una conexión, dos comandos en vuelo
+        finally:
+            server.should_exit = True
+            await serving
+
+    asyncio.run(scenario())
+
+def test_websocket_caido_usa_rest_y_no_reintenta_conectar():
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        return httpx.Response(200, json=[{"entity_id": "light.kitchen", "state": "on", "attributes": {}}])
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            # Nadie escucha en ese puerto: el WebSocket no conecta, REST (simulado) sí responde
+            ha = HAClient(client=client, base_url=f"http://127.0.0.1:{_free_port()}", token="t",
+                          transport="websocket")
+            first = await ha.call_service("light", "turn_on", {"entity_id": ["light.kitchen"]})
+            second = await ha.call_service("light", "turn_off", {"entity_id": ["light.kitchen"]})
+            return ha, first, second
+
+    ha, first, second = asyncio.run(scenario())
+    assert first[0]["entity_id"] == "light.kitchen" and second
+    assert requests == ["/api/services/light/turn_on", "/api/services/light/turn_off"]
+    assert ha.ws_fallbacks == 2
+    assert ha._channel.failures == 1  # el segundo comando falló rápido, sin volver a conectar
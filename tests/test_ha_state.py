@@ -0,0 +1,47 @@
+import asyncio
+import socket
+import time
+import uvicorn
+from bench.fake_ha import FAKE_TOKEN, FakeHomeAssistant, create_app
+from src.ha_state import StateMirror
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _until(condition, timeout_s: float = 10.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "timeout esperando la condición"
+        await asyncio.sleep(0.02)
+
+def test_espejo_se_resincroniza_tras_reconectar():
+    async def scenario():
+        fake = FakeHomeAssistant()
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=port,
+                                               log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve())
+        mirror = StateMirror(f"http://127.0.0.1:{port}", FAKE_TOKEN)
+        try:
+            await _until(lambda: server.started)
+            mirror.start()
+            await _until(lambda: mirror.ready)
+            assert mirror.get("light.kitchen")["state"] == "off"
+
+            await fake.drop_sockets()
+            await _until(lambda: not mirror.ready)
+            # Cambio mientras el socket está caído: no llega ningún evento
+            fake._set("light.kitchen", "on", {"brightness": 128})
+
+            await _until(lambda: mirror.ready)
+            assert mirror.get("light.kitchen")["state"] == "on"
+            assert mirror.get("light.kitchen")["attributes"] == {"brightness": 128}
+            assert fake.calls["ws:get_states"] == 2
+        finally:
+            await mirror.stop()
+            server.should_exit = True
+            await serving
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+from src import app as app_module
+from src.metrics import (
+    Counter, Histogram, count, errors_total, message_trace, record_tokens, request_trace, timed,
+)
+
+def test_histograma_en_formato_prometheus():
+    histogram = Histogram("test_seconds", "Prueba", (0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, stage="x")
+    assert histogram.render() == [
+        "# HELP wa_agent_test_seconds Prueba",
+        "# TYPE wa_agent_test_seconds histogram",
+        'wa_agent_test_seconds_bucket{stage="x",le="0.1"} 2',
+        'wa_agent_test_seconds_bucket{stage="x",le="1"} 3',
+        'wa_agent_test_seconds_bucket{stage="x",le="+Inf"} 4',
+        'wa_agent_test_seconds_sum{stage="x"} 3.650000',
+        'wa_agent_test_seconds_count{stage="x"} 4',
+    ]
+
+def test_counter_con_labels():
+    counter = Counter("test_total", "Prueba")
+    counter.inc(route="agent")
+    counter.inc(2, route="agent")
+    assert counter.render()[-1] == 'wa_agent_test_total{route="agent"} 3'
+
+def test_error_se_cuenta_en_la_etapa_mas_interna():
+    before = dict(errors_total._values)
+    with pytest.raises(ValueError):
+        with timed("test_outer"), timed("test_inner"):
+            raise ValueError("falla")
+    new = {key: value for key, value in errors_total._values.items() if value != before.get(key)}
+    assert new == {(("stage", "test_inner"), ("type", "ValueError")): 1.0}
+
+def test_trazas_de_mensajes_se_suman_al_request():
+    with request_trace() as request:
+        for _ in range(2):
+            with message_trace() as trace:
+                with timed("test_stage"):
+                    count("ha_calls")
+                record_tokens(100, 20)
+            assert trace.counts == {"ha_calls": 1, "input_tokens": 100, "output_tokens": 20}
+    assert request.counts == {"ha_calls": 2, "input_tokens": 200, "output_tokens": 40}
+    assert request.server_timing().startswith("test_stage;dur=")
+
+def test_endpoint_metrics():
+    with timed("test_endpoint"):
+        pass
+    response = TestClient(app_module.app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'wa_agent_stage_seconds_count{stage="test_endpoint"} 1' in response.text
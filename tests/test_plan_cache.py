@@ -0,0 +1,108 @@
+import asyncio
+import json
+import httpx
+import pytest
+from src import app as app_module
+from src import tools
+from src.agent_pool import AgentPool
+from src.conversation import ConversationContext
+from src.mapping import AreaIndex, use_area_index
+from src.metrics import message_trace
+from src.plan_cache import PlanCache, normalize_utterance
+from src.state_store import MemoryStateStore
+from src.tool_agent import StructuredToolAgent
+
+TEXT = "dejá la cocina lindo para cenar"
+
+def _completion(*calls):
+    tool_calls = [
+        {"id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+        for i, (name, args) in enumerate(calls)
+    ]
+    return {
+        "choices": [{"message": {"role": "assistant", "content": None, "tool_calls": tool_calls}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+    }
+
+@pytest.fixture
+def app_with_model(monkeypatch):
+    """src.app con un LLM que devuelve las tool_calls indicadas y luces falsas."""
+    executed = []
+
+    async def fake_turn_on(area, brightness=None, color=None):
+        executed.append(area)
+        return f"Luces encendidas en {area}"
+
+    monkeypatch.setitem(tools.TOOL_FUNCTIONS, "turn_on_lights", fake_turn_on)
+    monkeypatch.setattr(app_module, "plan_cache", PlanCache(MemoryStateStore()))
+
+    def use(*calls):
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json=_completion(*calls)))
+        client = httpx.AsyncClient(transport=transport)
+        pool = AgentPool(lambda: StructuredToolAgent("Sos un agente de luces.", client=client), size=1)
+        monkeypatch.setattr(app_module, "_agent_pool", pool)
+        return executed
+
+    return use
+
+def _answer(text, context=None):
+    async def run():
+        with message_trace() as trace:
+            return await app_module._answer(text, trace, context=context)
+    return asyncio.run(run())
+
+def test_plan_exitoso_se_cachea(app_with_model):
+    app_with_model(("turn_on_lights", {"area": "cocina", "brightness": 60}))
+    assert _answer(TEXT) == ("agent", "Luces encendidas en cocina")
+    assert app_module.plan_cache.get(TEXT) == [{"tool": "turn_on_lights", "args": {"area": "cocina", "brightness": 60}}]
+
+def test_llamada_fallida_no_se_cachea(app_with_model):
+    executed = app_with_model(
+        ("turn_on_lights", {"area": "living"}),
+        ("turn_on_lights", {"area": "cocina", "transition": 2}),
+    )
+    route, answer = _answer(TEXT)
+    assert route == "agent"
+    assert "Argumentos inválidos para turn_on_lights" in answer
+    assert executed == ["living"]
+    assert app_module.plan_cache.get(TEXT) is None
+
+def test_frase_sin_contexto_comparte_plan_entre_remitentes(app_with_model, monkeypatch):
+    monkeypatch.setattr(app_module, "FASTPATH_ENABLED", False)
+    executed = app_with_model(("turn_on_lights", {"area": "cocina"}))
+    first = ConversationContext(["living"], "on", brightness=40)
+    second = ConversationContext(["dormitorio"], "off")
+    assert _answer("prendé la cocina", first) == ("agent", "Luces encendidas en cocina")
+    assert _answer("prendé la cocina", second) == ("plan_cache", "Luces encendidas en cocina")
+    assert executed == ["cocina", "cocina"]
+
+def test_seguimiento_se_cachea_por_contexto(app_with_model):
+    app_with_model(("turn_on_lights", {"area": "living", "brightness": 60}))
+    living = ConversationContext(["living"], "on", brightness=40)
+    kitchen = ConversationContext(["cocina"], "on", brightness=40)
+    assert _answer("y ahora dejala más linda", living)[0] == "agent"
+    assert _answer("y ahora dejala más linda", living)[0] == "plan_cache"
+    assert _answer("y ahora dejala más linda", kitchen)[0] == "agent"
+
+def test_frase_repetida_se_reproduce_sin_llm(app_with_model):
+    executed = app_with_model(("turn_on_lights", {"area": "cocina", "brightness": 60}))
+    assert _answer(TEXT)[0] == "agent"
+    app_with_model()  # si la frase llegara al LLM, no habría ninguna llamada
+    route, answer = _answer("Dejá la cocina, lindo para cenar!")
+    assert (route, answer) == ("plan_cache", "Luces encendidas en cocina")
+    assert executed == ["cocina", "cocina"]
+
+def test_sin_llamadas_no_se_cachea():
+    cache = PlanCache(MemoryStateStore())
+    cache.put(TEXT, [])
+    assert cache.get(TEXT) is None
+
+def test_otro_indice_de_areas_no_usa_planes_viejos():
+    cache = PlanCache(MemoryStateStore())
+    cache.put(TEXT, [{"tool": "turn_on_lights", "args": {"area": "cocina"}}])
+    with use_area_index(AreaIndex({"cocina": ["light.otra_cocina"]})):
+        assert cache.get(TEXT) is None
+    assert cache.get(TEXT) is not None
+
+def test_normalize_utterance():
+    assert normalize_utterance("  ¡Prendé   la COCINA, por favor! ") == "prende la cocina por favor"
@@ -0,0 +1,41 @@
+import asyncio
+import httpx
+from src.agent import SYSTEM_PROMPT, build_user_prompt, compact_system_prompt, get_system_prompt
+from src.conversation import ConversationContext
+from src.mapping import AreaIndex, use_area_index
+from src.metrics import message_trace
+from src.tool_agent import StructuredToolAgent
+
+def test_prompt_compacto_es_un_prefijo_fijo():
+    prompt = compact_system_prompt()
+    # El hogar del mensaje en curso no cambia el prefijo (va en el mensaje de usuario)
+    with use_area_index(AreaIndex({"quincho": ["light.quincho"]}, default_area="quincho")):
+        assert compact_system_prompt() == prompt
+    assert "Áreas: cocina, dormitorio, living." in prompt
+    assert "noche" in prompt and "azul" in prompt
+    assert len(prompt) < len(SYSTEM_PROMPT)
+    assert get_system_prompt("compact") == prompt and get_system_prompt("full") == SYSTEM_PROMPT
+
+def test_mensaje_compacto_lleva_lo_variable():
+    context = ConversationContext(["living"], "on", brightness=60)
+    assert build_user_prompt("subile", context=context, mode="compact") == (
+        "Usuario: subile\n(contexto: áreas=living; acción=on; brillo=60)"
+    )
+    assert build_user_prompt("subile", mode="compact") == "Usuario: subile"
+
+def test_tokens_por_mensaje_incluyen_los_cacheados():
+    usage = {"prompt_tokens": 900, "completion_tokens": 30, "prompt_tokens_details": {"cached_tokens": 768}}
+    response = {"choices": [{"message": {"role": "assistant", "content": "Hola"}}], "usage": usage}
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=response)))
+    agent = StructuredToolAgent(compact_system_prompt(), client=client)
+
+    async def run():
+        with message_trace() as trace:
+            result = await agent.run("Usuario: hola")
+        await client.aclose()
+        return trace, result
+
+    trace, result = asyncio.run(run())
+    assert result.output == "Hola"
+    assert trace.counts == {"llm_steps": 1, "input_tokens": 900, "output_tokens": 30, "cached_input_tokens": 768}
+    assert agent.stats()["cached_prompt_tokens"] == 768
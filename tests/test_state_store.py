@@ -0,0 +1,56 @@
+import time
+import pytest
+from src.state_store import NS_DEDUP, NS_PLAN, MemoryStateStore, SQLiteStateStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemoryStateStore() if request.param == "memory" else SQLiteStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+def test_get_set_delete(store):
+    store.set(NS_PLAN, "clave", [{"tool": "turn_on_lights", "args": {"area": "cocina"}}], 60)
+    assert store.get(NS_PLAN, "clave") == [{"tool": "turn_on_lights", "args": {"area": "cocina"}}]
+    assert store.get(NS_DEDUP, "clave") is None  # otro espacio de nombres
+    assert store.count(NS_PLAN) == 1
+    store.delete(NS_PLAN, "clave")
+    assert store.get(NS_PLAN, "clave") is None
+    assert store.count(NS_PLAN) == 0
+
+def test_ttl(store):
+    store.set(NS_PLAN, "corta", 1, 0.05)
+    store.set(NS_PLAN, "larga", 2, 60)
+    time.sleep(0.1)
+    assert store.get(NS_PLAN, "corta") is None
+    assert store.get(NS_PLAN, "larga") == 2
+    assert store.count(NS_PLAN) == 1
+
+def test_add_if_absent(store):
+    assert store.add_if_absent(NS_DEDUP, "wamid.1", 1, 60)
+    assert not store.add_if_absent(NS_DEDUP, "wamid.1", 2, 60)
+    assert store.get(NS_DEDUP, "wamid.1") == 1  # no pisó el valor
+
+def test_add_if_absent_tras_vencer(store):
+    assert store.add_if_absent(NS_DEDUP, "wamid.1", 1, 0.05)
+    time.sleep(0.1)
+    assert store.add_if_absent(NS_DEDUP, "wamid.1", 2, 60)
+    assert store.get(NS_DEDUP, "wamid.1") == 2
+
+def test_memoria_acotada_por_espacio():
+    store = MemoryStateStore({NS_DEDUP: 2})
+    for i in range(3):
+        store.set(NS_DEDUP, f"wamid.{i}", 1, 60)
+    assert store.count(NS_DEDUP) == 2
+    assert store.get(NS_DEDUP, "wamid.0") is None  # el más viejo sale primero (LRU)
+
+def test_sqlite_compartido_entre_procesos(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SQLiteStateStore(path), SQLiteStateStore(path)
+    try:
+        first.set(NS_PLAN, "clave", {"a": 1}, 60)
+        assert second.get(NS_PLAN, "clave") == {"a": 1}
+        assert first.add_if_absent(NS_DEDUP, "wamid.1", 1, 60)
+        assert not second.add_if_absent(NS_DEDUP, "wamid.1", 1, 60)
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import pytest
+from src import app as app_module
+from src import tenants
+from src.tenants import load_tenants, parse_tenants
+
+TENANT = {
+    "id": "casa-perez",
+    "phones": ["+59891234567"],
+    "ha_base_url": "https://perez.example",
+    "ha_token": "token-perez",
+    "areas": {"salon": ["light.salon"]},
+}
+
+@pytest.fixture
+def tenants_file(tmp_path):
+    def write(content):
+        path = tmp_path / "tenants.json"
+        path.write_text(content if isinstance(content, str) else json.dumps(content), encoding="utf-8")
+        return str(path)
+    return write
+
+@pytest.mark.parametrize("content", [
+    '{"tenants": [',                                            # JSON cortado
+    {"hogares": [TENANT]},                                      # sin "tenants"
+    {"tenants": []},
+    {"tenants": ["casa-perez"]},
+    {"tenants": [{**TENANT, "phones": "+59891234567"}]},
+    {"tenants": [{k: v for k, v in TENANT.items() if k != "ha_token"}]},
+])
+def test_archivo_invalido_falla_con_la_ruta(tenants_file, content):
+    path = tenants_file(content)
+    with pytest.raises(ValueError, match="TENANTS_FILE inválido"):
+        load_tenants(path)
+
+def test_get_registry_falla_al_cargar_un_archivo_invalido(tenants_file, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANTS_FILE", tenants_file("no es json"))
+    monkeypatch.setattr(tenants, "_loaded", False)
+    monkeypatch.setattr(tenants, "_registry", None)
+    with pytest.raises(ValueError, match="TENANTS_FILE inválido"):
+        tenants.get_registry()
+
+def test_archivo_inexistente(tmp_path):
+    with pytest.raises(ValueError, match="TENANTS_FILE inválido"):
+        load_tenants(str(tmp_path / "no-existe.json"))
+
+class FakeHA:
+    def __init__(self):
+        self.calls = []
+
+    async def call_service(self, domain, service, data):
+        self.calls.append((service, data["entity_id"]))
+        return []
+
+@pytest.fixture
+def two_homes(monkeypatch):
+    registry = parse_tenants({"tenants": [
+        TENANT,
+        {**TENANT, "id": "casa-gomez", "phones": ["598 9876 5432"], "default_area": "quincho",
+         "areas": {"quincho": ["light.quincho"], "salon": ["light.salon_gomez"]}},
+    ]})
+    for tenant in registry.tenants:
+        tenant._ha = FakeHA()
+    monkeypatch.setattr(tenants, "_registry", registry)
+    monkeypatch.setattr(tenants, "_loaded", True)
+    return registry
+
+def test_lookup_normaliza_el_telefono(two_homes):
+    assert two_homes.lookup("59891234567").id == "casa-perez"
+    assert two_homes.lookup("+598 98765432").id == "casa-gomez"
+    assert two_homes.lookup("59800000000") is None
+    assert not app_module.is_phone_allowed("59800000000")
+
+def test_mensaje_usa_el_ha_y_las_areas_de_su_hogar(two_homes, monkeypatch):
+    sent = []
+
+    async def fake_send(phone, text):
+        sent.append((phone, text))
+
+    monkeypatch.setattr(app_module, "send_whatsapp_text", fake_send)
+    monkeypatch.setattr(app_module, "CONTEXT_ENABLED", False)
+    perez, gomez = two_homes.tenants
+
+    async def scenario():
+        await app_module.handle_message("59891234567", "prendé el salon")
+        await app_module.handle_message("59898765432", "prendé el salon")
+        await app_module.handle_message("59898765432", "prendé la luz")  # área por defecto del hogar
+
+    asyncio.run(scenario())
+    assert perez.ha().calls == [("turn_on", ["light.salon"])]
+    assert gomez.ha().calls == [("turn_on", ["light.salon_gomez"]), ("turn_on", ["light.quincho"])]
+    assert [text for _, text in sent] == [
+        "Luces encendidas en salon", "Luces encendidas en salon", "Luces encendidas en quincho",
+    ]
@@ -0,0 +1,58 @@
+import asyncio
+from src import tools
+from src.mapping import AreaIndex, use_area_index
+from src.state_store import NS_HA_STATE, MemoryStateStore
+from src.tools import ToolFailure, record_tool_calls
+
+class FakeHA:
+    """call_service que, como HA, devuelve todo lo que cambió mientras tanto."""
+    def __init__(self, changed=()):
+        self.changed = list(changed)
+        self.calls = []
+
+    async def call_service(self, domain, service, data):
+        self.calls.append((service, data["entity_id"]))
+        return self.changed
+
+def _light(entity_id, brightness):
+    return {"entity_id": entity_id, "state": "on", "attributes": {"brightness": brightness}}
+
+def test_call_light_solo_devuelve_y_cachea_las_luces_pedidas(monkeypatch):
+    store = MemoryStateStore()
+    monkeypatch.setattr(tools, "get_state_store", lambda: store)
+    monkeypatch.setattr(tools, "get_ha", lambda: FakeHA([
+        _light("light.kitchen", 128),
+        _light("light.bedroom", 255),  # otra luz que cambió en paralelo
+        {"entity_id": "sensor.temperature", "state": "21.5", "attributes": {}},
+    ]))
+
+    answer = asyncio.run(tools.do_set_brightness("cocina", 50))
+
+    assert answer == "Brillo en cocina ajustado a 50%"
+    assert store.get(NS_HA_STATE, tools._state_key("light.kitchen"))["attributes"] == {"brightness": 128}
+    assert store.get(NS_HA_STATE, tools._state_key("light.bedroom")) is None
+    assert store.get(NS_HA_STATE, tools._state_key("sensor.temperature")) is None
+
+def _activate(index, scene):
+    async def run():
+        with use_area_index(index), record_tool_calls() as calls:
+            return await tools.run_tool_call("activate_scene", {"scene": scene}), calls
+    return asyncio.run(run())
+
+def test_escena_sin_areas_resueltas_no_se_da_por_activada(monkeypatch):
+    ha = FakeHA()
+    monkeypatch.setattr(tools, "get_ha", lambda: ha)
+    answer, calls = _activate(AreaIndex({"salon": ["light.salon"]}), "noche")
+    assert isinstance(answer, ToolFailure)
+    assert answer == "No hay luces mapeadas para la escena noche: living, cocina, dormitorio."
+    assert ha.calls == [] and calls == []
+
+def test_escena_parcial_informa_las_areas_faltantes(monkeypatch):
+    ha = FakeHA()
+    monkeypatch.setattr(tools, "get_ha", lambda: ha)
+    monkeypatch.setattr(tools, "HA_STATE_CACHE_TTL_S", 0)
+    index = AreaIndex({"living": ["light.living"], "cocina": ["light.kitchen"]})
+    answer, calls = _activate(index, "noche")
+    assert answer == "Escena noche activada en living, cocina (sin luces mapeadas: dormitorio)"
+    assert ha.calls == [("turn_off", ["light.living", "light.kitchen"])]
+    assert calls == [{"tool": "activate_scene", "args": {"scene": "noche"}}]
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import pytest
+from src import app as app_module
+from src.admission import RATE_LIMITED_REPLY, AdmissionController
+from src.deadline import DEADLINE_REPLY, Deadline, clamp_timeout
+from src.dedup import MessageDeduper
+from src.state_store import MemoryStateStore, SQLiteStateStore
+from src.worker import MessageWorker
+
+PHONE = "59891234567"
+
+class FakeRequest:
+    def __init__(self, payload):
+        self._raw = json.dumps(payload).encode()
+
+    async def body(self):
+        return self._raw
+
+def _payload(*messages):
+    """Webhook de WhatsApp con mensajes de texto (id, teléfono, texto)."""
+    return {"object": "whatsapp_business_account", "entry": [{"changes": [{"field": "messages", "value": {
+        "messaging_product": "whatsapp",
+        "messages": [
+            {"from": phone, "id": message_id, "type": "text", "text": {"body": text}}
+            for message_id, phone, text in messages
+        ],
+    }}]}]}
+
+@pytest.fixture
+def webhook_app(monkeypatch):
+    """src.app sin WhatsApp: las respuestas fijas quedan en `replies`."""
+    replies = []
+
+    async def fake_send(phone, text):
+        replies.append((phone, text))
+
+    monkeypatch.setattr(app_module, "deduper", MessageDeduper(MemoryStateStore()))
+    monkeypatch.setattr(app_module, "send_canned_reply", fake_send)
+    monkeypatch.setattr(app_module, "is_phone_allowed", lambda phone: True)
+    return replies
+
+def test_rechazo_por_cola_llena_libera_el_lugar_de_admision(webhook_app, monkeypatch):
+    admission = AdmissionController(sender_rate_per_s=0, max_pending=5)
+    monkeypatch.setattr(app_module, "admission", admission)
+    monkeypatch.setattr(app_module, "WEBHOOK_ACK_FIRST", True)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(phone, text, deadline):
+            try:
+                await release.wait()
+            finally:
+                admission.done()
+
+        worker = MessageWorker(handler, concurrency=1, queue_size=1)
+        monkeypatch.setattr(app_module, "message_worker", worker)
+        for i in range(4):
+            await app_module._process_webhook(FakeRequest(_payload((f"m{i}", PHONE, "prendé la cocina"))))
+            await asyncio.sleep(0)  # el worker toma el primero; la cola (1 lugar) se llena con el segundo
+        release.set()
+        await worker.stop()
+
+    asyncio.run(scenario())
+    assert admission.pending == 0
+    assert admission.admitted == 4
+    assert webhook_app == [(PHONE, app_module.OVERLOADED_REPLY)]
+
+def test_mensaje_vencido_en_la_cola_recibe_la_respuesta_de_respaldo(monkeypatch):
+    sent = []
+
+    async def fake_send(phone, text):
+        clamp_timeout(10.0)  # como el envío real: falla si no queda plazo
+        sent.append((phone, text))
+
+    monkeypatch.setattr(app_module, "send_whatsapp_text", fake_send)
+    expired = Deadline(0.0)
+    asyncio.run(app_module.handle_message(PHONE, "prendé la cocina", expired))
+    assert sent == [(PHONE, DEADLINE_REPLY)]
+
+def test_reentrega_del_mismo_mensaje_se_procesa_una_vez(webhook_app, monkeypatch):
+    handled = []
+
+    async def fake_handle(phone, text, deadline=None):
+        handled.append((phone, text))
+
+    monkeypatch.setattr(app_module, "handle_admitted", fake_handle)
+    monkeypatch.setattr(app_module, "admission", AdmissionController(sender_rate_per_s=0))
+    monkeypatch.setattr(app_module, "WEBHOOK_ACK_FIRST", False)
+
+    async def scenario():
+        await app_module._process_webhook(FakeRequest(_payload(("wamid.1", PHONE, "prendé la cocina"))))
+        # Meta reintenta el mismo webhook, y en otro lote llega el mismo ID junto a uno nuevo
+        await app_module._process_webhook(FakeRequest(_payload(("wamid.1", PHONE, "prendé la cocina"))))
+        await app_module._process_webhook(FakeRequest(_payload(
+            ("wamid.1", PHONE, "prendé la cocina"), ("wamid.2", PHONE, "apagá la cocina"),
+        )))
+
+    asyncio.run(scenario())
+    assert handled == [(PHONE, "prendé la cocina"), (PHONE, "apagá la cocina")]
+    assert app_module.deduper.suppressed == 2
+
+def test_dedup_compartido_entre_workers(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SQLiteStateStore(path), SQLiteStateStore(path)
+    try:
+        assert not MessageDeduper(first).is_duplicate("wamid.1")
+        assert MessageDeduper(second).is_duplicate("wamid.1")  # otro proceso, mismo archivo
+        assert not MessageDeduper(second).is_duplicate(None)     # sin ID no se deduplica
+    finally:
+        first.close()
+        second.close()
+
+def test_webhook_responde_una_vez_al_remitente_limitado(webhook_app, monkeypatch):
+    handled = []
+
+    async def fake_handle(phone, text, deadline=None):
+        handled.append(text)
+        app_module.admission.done()
+
+    monkeypatch.setattr(app_module, "handle_admitted", fake_handle)
+    monkeypatch.setattr(app_module, "admission", AdmissionController(sender_rate_per_s=0.01, sender_burst=1))
+    monkeypatch.setattr(app_module, "WEBHOOK_ACK_FIRST", False)
+    payload = _payload(*((f"wamid.{i}", PHONE, f"mensaje {i}") for i in range(4)))
+    asyncio.run(app_module._process_webhook(FakeRequest(payload)))
+    assert handled == ["mensaje 0"]
+    assert webhook_app == [(PHONE, RATE_LIMITED_REPLY)]
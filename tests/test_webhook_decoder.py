@@ -0,0 +1,60 @@
+import pytest
+from bench.webhook_decode import load_fixtures
+from src import webhook_decoder
+from src.webhook_decoder import WebhookDecodeError, decode_webhook, group_by_sender
+
+FIXTURES = load_fixtures()
+ALLOWED = {"59891234567", "59898765432", "59899111222"}
+
+def _whitelist(calls):
+    def is_allowed(phone):
+        calls.append(phone)
+        return phone in ALLOWED
+    return is_allowed
+
+def _summary(messages):
+    return [(m.phone, m.type, m.text) for m in messages]
+
+def test_texto_simple():
+    messages = decode_webhook(FIXTURES["text_single"])
+    assert _summary(messages) == [("59891234567", "text", "prendé el living al 50%")]
+    assert messages[0].id
+
+def test_lote_de_textos_en_orden():
+    calls = []
+    messages = decode_webhook(FIXTURES["text_batch"], _whitelist(calls))
+    assert _summary(messages) == [
+        ("59891234567", "text", "apagá la cocina"),
+        ("59898765432", "text", "modo cine"),
+        ("59891234567", "text", "subile un poco más"),
+        ("59899111222", "text", "poné el dormitorio en azul"),
+        ("59899111222", "text", "¿está prendida la cocina?"),
+    ]
+    assert sorted(calls) == sorted(ALLOWED)  # una consulta por teléfono, no por mensaje
+
+def test_imagen_sin_texto():
+    assert _summary(decode_webhook(FIXTURES["image"])) == [("59891234567", "image", None)]
+
+def test_estados_no_consultan_la_whitelist():
+    calls = []
+    assert decode_webhook(FIXTURES["statuses"], _whitelist(calls)) == []
+    assert calls == []
+
+def test_remitente_no_permitido():
+    # El "from" escapado dentro del texto no cuenta como remitente
+    assert len(decode_webhook(FIXTURES["unauthorized"])) == 1
+    assert decode_webhook(FIXTURES["unauthorized"], lambda phone: phone == "59891234567") == []
+
+def test_json_invalido():
+    with pytest.raises(WebhookDecodeError):
+        decode_webhook(FIXTURES["malformed"])
+
+def test_cuerpo_demasiado_grande(monkeypatch):
+    monkeypatch.setattr(webhook_decoder, "WEBHOOK_MAX_BYTES", 16)
+    with pytest.raises(WebhookDecodeError):
+        decode_webhook(FIXTURES["text_single"])
+
+def test_agrupar_por_remitente_conserva_el_orden():
+    groups = group_by_sender(decode_webhook(FIXTURES["text_batch"]))
+    assert list(groups) == ["59891234567", "59898765432", "59899111222"]
+    assert [m.text for m in groups["59891234567"]] == ["apagá la cocina", "subile un poco más"]
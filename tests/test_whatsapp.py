@@ -0,0 +1,85 @@
+import asyncio
+import json
+import httpx
+import pytest
+from src import whatsapp
+from src.whatsapp import OutboundSender, split_message
+
+URL = "https://graph.example/123/messages"
+
+@pytest.mark.parametrize("text, limit, expected", [
+    ("", 10, []),
+    ("0123456789", 10, ["0123456789"]),                   # justo en el límite: un solo mensaje
+    ("01234567890", 10, ["0123456789", "0"]),             # sin separadores: corte duro
+    ("uno dos tres cuatro", 10, ["uno dos", "tres", "cuatro"]),
+    ("primero\n\nsegundo", 12, ["primero", "segundo"]),   # el párrafo antes que la línea
+    ("primero\n\nsegundo tercero", 20, ["primero\n\nsegundo", "tercero"]),  # párrafo muy al principio: espacio
+    ("ab cdefghijkl", 10, ["ab", "cdefghijkl"]),          # cualquier separador antes que un corte duro
+])
+def test_split_message(text, limit, expected):
+    chunks = split_message(text, limit)
+    assert chunks == expected
+    assert all(len(chunk) <= limit for chunk in chunks)
+
+def _post(*outcomes):
+    """Manda un mensaje contra respuestas (status, headers) o excepciones, en orden."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        outcome = outcomes[len(requests) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        status, headers = outcome
+        return httpx.Response(status, headers=headers, json={"messages": [{"id": "wamid.1"}]})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await OutboundSender()._post(client, URL, {}, {"text": {"body": "hola"}})
+
+    try:
+        return asyncio.run(run()), len(requests)
+    except Exception as e:
+        return e, len(requests)
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(whatsapp, "_backoff", lambda attempt: 0.0)
+
+@pytest.mark.parametrize("outcomes, attempts", [
+    ([(429, {}), (200, {})], 2),
+    ([(503, {"Retry-After": "0"}), (200, {})], 2),
+    ([httpx.ConnectError("refused"), (200, {})], 2),
+])
+def test_reintenta_lo_que_no_se_entrego(outcomes, attempts):
+    result, sent = _post(*outcomes)
+    assert result == {"messages": [{"id": "wamid.1"}]}
+    assert sent == attempts
+
+@pytest.mark.parametrize("outcome, error", [
+    ((500, {}), httpx.HTTPStatusError),
+    ((503, {}), httpx.HTTPStatusError),
+    (httpx.ReadTimeout("sin respuesta"), httpx.ReadTimeout),
+])
+def test_no_reintenta_lo_que_pudo_entregarse(outcome, error):
+    result, sent = _post(outcome, (200, {}))
+    assert isinstance(result, error)
+    assert sent == 1
+
+def test_mensaje_largo_sale_en_fragmentos_en_orden():
+    bodies = []
+
+    def handler(request):
+        bodies.append(json.loads(request.content)["text"]["body"])
+        return httpx.Response(200, json={"messages": [{"id": f"wamid.{len(bodies)}"}]})
+
+    sender = OutboundSender()
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await sender.send(client, URL, {}, "59891234567", "a" * 4000 + " " + "b" * 10)
+
+    assert asyncio.run(run()) == {"messages": [{"id": "wamid.2"}]}
+    assert bodies == ["a" * 4000, "b" * 10]
+    stats = sender.stats()
+    assert (stats["sent"], stats["delivered"], stats["queue_depth"]) == (2, 1, 0)
@@ -0,0 +1,24 @@
+import asyncio
+from src.worker import MessageWorker
+
+def test_pending_por_remitente_hasta_terminar():
+    async def scenario():
+        release = asyncio.Event()
+        done = []
+
+        async def handler(phone, text):
+            await release.wait()
+            done.append((phone, text))
+
+        worker = MessageWorker(handler, concurrency=1, queue_size=2)
+        assert worker.submit("a", "a", "prendé")
+        assert worker.submit("a", "a", "apagá")
+        assert not worker.submit("b", "b", "hola")  # cola llena
+        assert worker.pending("a") == 2 and worker.pending("b") == 0
+
+        release.set()
+        await worker.stop()
+        assert done == [("a", "prendé"), ("a", "apagá")]
+        assert worker.pending("a") == 0
+
+    asyncio.run(scenario())